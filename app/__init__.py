@@ -1,14 +1,40 @@
 # app/__init__.py
 import os
-from flask import Flask
+import time
 
 def create_app():
-    app = Flask(__name__)
+    """
+    创建 Flask 应用并注册路由。
+    这里只做不访问磁盘的轻量工作，数据目录、默认密码等初始化由 app.startup 在后台线程中完成，
+    调度器由 app.leader 在选为 leader 的 worker 中启动。
+    """
+    from app import startup
+    started = time.perf_counter()
 
-    # --- 新增部分：为 Session 设置 Secret Key ---
-    # 这是让登录功能正常工作的关键。
-    # 为了安全，这个密钥应该是一个长且随机的字符串。
-    # 我们使用环境变量，并提供一个默认值。
-    app.secret_key = os.environ.get('SECRET_KEY', 'a-very-secure-and-random-secret-key-for-alist-monitor')
+    with startup.timed('flask'):
+        from flask import Flask
+        # 静态文件由 pages 蓝图提供 (预压缩、带指纹的长期缓存，见 app/assets.py)
+        app = Flask(__name__, static_folder=None)
 
+        # --- 新增部分：为 Session 设置 Secret Key ---
+        # 这是让登录功能正常工作的关键。
+        # 为了安全，这个密钥应该是一个长且随机的字符串。
+        # 我们使用环境变量，并提供一个默认值。
+        app.secret_key = os.environ.get('SECRET_KEY', 'a-very-secure-and-random-secret-key-for-alist-monitor')
+
+    # --- 注册蓝图 ---
+    with startup.timed('blueprints'):
+        from app import leader
+        from app.api import api
+        from app.pages import pages
+        app.register_blueprint(api, url_prefix='/api')
+        app.register_blueprint(pages)
+
+    # gunicorn 部署时由 gunicorn.conf.py 的 post_fork 钩子启动选主和初始化线程；
+    # 其它方式运行 (如本地调试) 时在处理第一个请求时启动
+    app.before_request(leader.start_election)
+    app.before_request(startup.start_deferred)
+
+    startup.record('create_app', started)
+    startup.log_breakdown(f"应用创建完成 (进程 {os.getpid()})", ('flask', 'blueprints', 'create_app'))
     return app
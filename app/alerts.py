@@ -0,0 +1,192 @@
+# app/alerts.py
+import json
+import time
+import logging
+from app import db
+from app.config import load_config
+
+logger = logging.getLogger(__name__)
+
+# --- 存储告警状态机 ---
+# 每个存储 (以及每个 Alist 实例本身的连通性) 保存一条持久化状态：
+#   ok --(连续失败达到阈值)--> failing --(连续正常达到阈值)--> ok
+# 只有在状态转换时才产生告警/恢复事件；在短时间内频繁转换 (抖动) 时暂停通知，
+# 等状态稳定后再补发。notified 表示用户当前被告知的状态是否为"异常"。
+# 定时监控任务本身执行出错也作为一项观察 (TASK_KEY)，与存储使用同样的阈值、抖动抑制和重复提醒。
+
+DEFAULT_FAILURE_THRESHOLD = 1
+DEFAULT_RECOVERY_THRESHOLD = 1
+DEFAULT_REMINDER_INTERVAL = 0      # 秒，0 表示不重复提醒
+DEFAULT_FLAP_WINDOW = 3600         # 秒
+DEFAULT_FLAP_THRESHOLD = 4         # 窗口内的状态转换次数达到该值即视为抖动
+
+STATE_OK = 'ok'
+STATE_FAILING = 'failing'
+
+EVENT_FAILING = 'failing'
+EVENT_RECOVERED = 'recovered'
+EVENT_REMINDER = 'reminder'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS storage_alert_state (
+    storage_key TEXT PRIMARY KEY,
+    instance TEXT,
+    name TEXT NOT NULL,
+    state TEXT NOT NULL,
+    status TEXT,
+    consecutive_failures INTEGER NOT NULL DEFAULT 0,
+    consecutive_successes INTEGER NOT NULL DEFAULT 0,
+    state_since REAL NOT NULL,
+    notified INTEGER NOT NULL DEFAULT 0,
+    last_alert_at REAL,
+    transitions TEXT NOT NULL DEFAULT '[]',
+    updated_at REAL NOT NULL
+);
+"""
+
+def storage_key(instance, name):
+    """状态表的键：单实例时直接使用挂载路径，多实例时加上实例名前缀"""
+    if not instance or instance == 'default':
+        return name
+    return f"{instance}:{name}"
+
+def instance_key(instance):
+    return f"@instance:{instance}"
+
+TASK_KEY = '@task'
+TASK_NAME = '监控任务'
+
+def _observations(result):
+    """把一次检查结果展开为 (key, instance, name, is_failing, status) 列表"""
+    observations = []
+    for r in result.get('instances', []):
+        observations.append((instance_key(r['name']), r['name'], f"Alist 实例 {r['name']}",
+                             not r.get('success'), '正常' if r.get('success') else r.get('message')))
+    for s in result.get('storages', []):
+        key = storage_key(s.instance, s.name)
+        observations.append((key, s.instance, key, s.status not in ['work', 'disabled'], s.status))
+    return observations
+
+def _load_settings(config):
+    return {
+        'failure_threshold': max(1, int(config.get('ALERT_FAILURE_THRESHOLD', DEFAULT_FAILURE_THRESHOLD))),
+        'recovery_threshold': max(1, int(config.get('ALERT_RECOVERY_THRESHOLD', DEFAULT_RECOVERY_THRESHOLD))),
+        'reminder_interval': float(config.get('ALERT_REMINDER_INTERVAL', DEFAULT_REMINDER_INTERVAL)),
+        'flap_window': float(config.get('ALERT_FLAP_WINDOW', DEFAULT_FLAP_WINDOW)),
+        'flap_threshold': int(config.get('ALERT_FLAP_THRESHOLD', DEFAULT_FLAP_THRESHOLD)),
+    }
+
+def _advance(row, is_failing, status, settings, now):
+    """根据一次观察推进单个存储的状态，返回事件类型或 None (会就地修改 row)"""
+    if is_failing:
+        row['consecutive_failures'] += 1
+        row['consecutive_successes'] = 0
+    else:
+        row['consecutive_successes'] += 1
+        row['consecutive_failures'] = 0
+    row['status'] = status
+
+    transitions = [t for t in row['transitions'] if now - t < settings['flap_window']]
+    if row['state'] == STATE_OK and row['consecutive_failures'] >= settings['failure_threshold']:
+        row['state'], row['state_since'] = STATE_FAILING, now
+        transitions.append(now)
+    elif row['state'] == STATE_FAILING and row['consecutive_successes'] >= settings['recovery_threshold']:
+        row['state'], row['state_since'] = STATE_OK, now
+        transitions.append(now)
+    row['transitions'] = transitions
+
+    flapping = settings['flap_threshold'] > 0 and len(transitions) >= settings['flap_threshold']
+    if flapping:
+        return None
+    if row['state'] == STATE_FAILING and not row['notified']:
+        row['notified'], row['last_alert_at'] = True, now
+        return EVENT_FAILING
+    if row['state'] == STATE_OK and row['notified']:
+        row['notified'] = False
+        return EVENT_RECOVERED
+    if (row['state'] == STATE_FAILING and settings['reminder_interval'] > 0
+            and now - (row['last_alert_at'] or 0) >= settings['reminder_interval']):
+        row['last_alert_at'] = now
+        return EVENT_REMINDER
+    return None
+
+def _apply(conn, observations, settings, now):
+    """推进并保存每个观察对应的状态，返回 (事件列表, 推进前的状态)"""
+    rows = {r['storage_key']: dict(r) for r in conn.execute('SELECT * FROM storage_alert_state')}
+    events = []
+    for key, instance, name, is_failing, status in observations:
+        row = rows.get(key)
+        if row is None:
+            row = {'storage_key': key, 'instance': instance, 'name': name, 'state': STATE_OK,
+                   'consecutive_failures': 0, 'consecutive_successes': 0, 'state_since': now,
+                   'notified': False, 'last_alert_at': None, 'transitions': []}
+        else:
+            row = dict(row, transitions=json.loads(row['transitions']), notified=bool(row['notified']))
+        event = _advance(row, is_failing, status, settings, now)
+        if event:
+            events.append({'event': event, 'key': key, 'instance': instance, 'name': name,
+                           'status': status, 'since': row['state_since']})
+        conn.execute(
+            'INSERT OR REPLACE INTO storage_alert_state (storage_key, instance, name, state, status, '
+            'consecutive_failures, consecutive_successes, state_since, notified, last_alert_at, transitions, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (key, instance, name, row['state'], status, row['consecutive_failures'], row['consecutive_successes'],
+             row['state_since'], int(row['notified']), row['last_alert_at'], json.dumps(row['transitions']), now)
+        )
+    return events, rows
+
+def evaluate(result, now=None):
+    """
+    用一次检查结果更新所有存储的状态 (同时记录监控任务执行成功)，返回需要通知的事件列表：
+    [{'event': 'failing'|'recovered'|'reminder', 'key', 'instance', 'name', 'status', 'since'}]
+    """
+    now = now or time.time()
+    settings = _load_settings(load_config())
+    db.ensure_schema('storage_alert_state', _SCHEMA)
+    observations = _observations(result) + [(TASK_KEY, None, TASK_NAME, False, '正常')]
+    with db.transaction() as conn:
+        events, rows = _apply(conn, observations, settings, now)
+        seen = {o[0] for o in observations}
+        # 已从 Alist 中删除的存储：仅在其所属实例本次获取成功时清理，避免实例故障时误删
+        ok_instances = {r['name'] for r in result.get('instances', []) if r.get('success')}
+        for key, row in rows.items():
+            if key not in seen and not key.startswith('@') and row['instance'] in ok_instances:
+                conn.execute('DELETE FROM storage_alert_state WHERE storage_key = ?', (key,))
+    return events
+
+def evaluate_task_error(error, now=None):
+    """定时监控任务执行出错时调用：只推进监控任务本身的状态，返回需要通知的事件列表 (格式同 evaluate)"""
+    now = now or time.time()
+    settings = _load_settings(load_config())
+    db.ensure_schema('storage_alert_state', _SCHEMA)
+    with db.transaction() as conn:
+        events, _ = _apply(conn, [(TASK_KEY, None, TASK_NAME, True, f"执行出错: {error}")], settings, now)
+    return events
+
+def load_alert_states():
+    """返回所有存储的当前告警状态"""
+    db.ensure_schema('storage_alert_state', _SCHEMA)
+    rows = db.get_connection().execute(
+        'SELECT storage_key, instance, name, state, status, consecutive_failures, consecutive_successes, '
+        'state_since, notified, last_alert_at FROM storage_alert_state ORDER BY storage_key'
+    ).fetchall()
+    return [dict(r, notified=bool(r['notified'])) for r in rows]
+
+def format_events(events):
+    """把事件列表格式化为 (异常详情, 恢复详情)，没有对应事件时为空字符串"""
+    failing = [e for e in events if e['event'] in (EVENT_FAILING, EVENT_REMINDER)]
+    recovered = [e for e in events if e['event'] == EVENT_RECOVERED]
+    failing_details = ''
+    if failing:
+        lines = [f"发现{len(failing)}项异常:"]
+        for e in failing:
+            suffix = ' (持续异常)' if e['event'] == EVENT_REMINDER else ''
+            lines.append(f" - {e['name']} 状态: {e['status'] or '未知'}{suffix}")
+        failing_details = "\n".join(lines)
+    recovered_details = ''
+    if recovered:
+        lines = [f"{len(recovered)}项已恢复正常:"]
+        for e in recovered:
+            lines.append(f" - {e['name']} 状态: {e['status'] or '未知'}")
+        recovered_details = "\n".join(lines)
+    return failing_details, recovered_details
@@ -1,22 +1,58 @@
 # app/api.py
-from flask import Blueprint, request, jsonify, session, current_app
+from flask import Blueprint, request, jsonify, session, Response, g
 from app.monitor import (
-    get_storage_status, get_storage_list, send_notification
+    get_storage_status, get_storage_list, send_notification, summarize_result
 )
+from app import auth, events, httpcache, leader, logs, polling, snapshot, storages, tracing
 from app.config import (
-    load_config, save_config, load_monitor_status, save_monitor_status,
-    get_password, save_password, verify_password,
-    load_notifications, save_notifications, add_notification_record
+    load_config, save_config, load_monitor_status,
+    get_password, save_password, get_config_version
 )
-from .monitor import monitor_task 
+from app.state import compare_and_set_monitor_status, increment_check_count
+from app.notifications import add_notification_record, query_notifications, clear_notifications, notifications_version
+from app.alerts import load_alert_states
+from app.dispatch import get_delivery, ensure_workers
+from app.history import record_check, get_uptime, get_timeline, get_mttr
+import json
+import time
 import logging
 from functools import wraps
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime, timezone
 
 api = Blueprint('api', __name__)
 logger = logging.getLogger(__name__)
 
+# 每个 worker 进程处理第一个请求时启动通知发送线程，接管其它进程遗留在队列中的消息
+api.before_app_request(ensure_workers)
+
+# 开启 TRACE_ENABLED 时记录每个接口请求的耗时分解 (见 app/tracing.py)
+api.before_request(tracing.start_request)
+api.after_request(tracing.finish_request)
+api.teardown_request(tracing.clear_request)
+
+def _bearer_token():
+    header = request.headers.get('Authorization', '')
+    return header[7:].strip() if header[:7].lower() == 'bearer ' else None
+
 def login_required(f):
+    # 登录会话，或 Authorization: Bearer <API 令牌>；GET 请求需要 read 权限，其它请求需要 control 权限
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'logged_in' in session: return f(*args, **kwargs)
+        token = _bearer_token()
+        if token is None: return jsonify({"success": False, "message": "请先登录"}), 401
+        claims = auth.verify_token(token)
+        if claims is None: return jsonify({"success": False, "message": "API 令牌无效、已过期或已撤销"}), 401
+        required = auth.SCOPE_READ if request.method in ('GET', 'HEAD') else auth.SCOPE_CONTROL
+        if not auth.scope_allows(claims['scope'], required):
+            return jsonify({"success": False, "message": f"API 令牌没有 {required} 权限"}), 403
+        g.api_token = claims
+        return f(*args, **kwargs)
+    return decorated_function
+
+def session_required(f):
+    # 修改密码、配置和管理令牌只允许通过登录会话访问
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'logged_in' not in session: return jsonify({"success": False, "message": "请先登录"}), 401
@@ -31,8 +67,13 @@ def login():
     username, password = data.get('username'), data.get('password')
     if not username or not password: return jsonify({"success": False, "message": "用户名和密码不能为空"}), 400
     stored_password = get_password()
-    if not stored_password: return jsonify({"success": False, "message": "系统错误，请联系管理员"}), 500
-    if username == 'admin' and verify_password(password, stored_password):
+    # 默认密码由 app.startup 在后台初始化，首次启动的最初几百毫秒内可能还没有写入
+    if not stored_password: return jsonify({"success": False, "message": "服务正在初始化，请稍后重试"}), 503
+    if username != 'admin': return jsonify({"success": False, "message": "用户名或密码错误"}), 401
+    try: password_ok = auth.check_password(password, stored_password)
+    except auth.LoginBusy as e: return jsonify({"success": False, "message": str(e)}), 429
+    except FutureTimeoutError: return jsonify({"success": False, "message": "登录超时，请稍后重试"}), 503
+    if password_ok:
         session['logged_in'] = True
         return jsonify({"success": True, "message": "登录成功", "redirect": "/"})
     else: return jsonify({"success": False, "message": "用户名或密码错误"}), 401
@@ -43,13 +84,16 @@ def logout():
     return jsonify({"success": True, "message": "已成功退出"})
 
 @api.route('/change_password', methods=['POST'])
-@login_required
+@session_required
 def change_password():
     if not request.is_json: return jsonify({"success": False, "message": "请求必须是JSON格式"}), 415
     data = request.get_json()
     old_password, new_password = data.get('old_password'), data.get('new_password')
     if not old_password or not new_password: return jsonify({"success": False, "message": "新旧密码均不能为空"}), 400
-    if not verify_password(old_password, get_password()): return jsonify({"success": False, "message": "旧密码错误"}), 400
+    try: password_ok = auth.check_password(old_password, get_password())
+    except auth.LoginBusy as e: return jsonify({"success": False, "message": str(e)}), 429
+    except FutureTimeoutError: return jsonify({"success": False, "message": "校验超时，请稍后重试"}), 503
+    if not password_ok: return jsonify({"success": False, "message": "旧密码错误"}), 400
     if len(new_password) < 8: return jsonify({"success": False, "message": "新密码长度至少需要8个字符"}), 400
     if save_password(new_password):
         session.pop('logged_in', None)
@@ -57,12 +101,15 @@ def change_password():
     else: return jsonify({"success": False, "message": "密码修改失败，请稍后重试"}), 500
 
 @api.route('/config', methods=['GET', 'POST'])
-@login_required
+@session_required
 def config_management():
     if request.method == 'GET':
-        config_data = load_config()
-        config_data.pop('password', None)
-        return jsonify(config_data)
+        def build_body():
+            config_data = load_config()
+            config_data.pop('password', None)
+            return json.dumps(config_data, ensure_ascii=False)
+        version, modified_at = get_config_version()
+        return httpcache.conditional_response('config', version, build_body, last_modified=modified_at)
     if not request.is_json: return jsonify({"success": False, "message": "请求必须是JSON格式"}), 415
     new_data = request.get_json()
     if new_data.get('password'):
@@ -82,46 +129,166 @@ def config_management():
         if save_config(current_config): return jsonify({"success": True, "message": "配置保存成功"})
         else: return jsonify({"success": False, "message": "配置保存失败"}), 500
 
+def _set_monitor_status(status_to_save, expected_version):
+    """
+    以 expected_version (客户端从 GET /api/monitor_status 读取到的 version) 做比较并设置，
+    避免覆盖其它页面或脚本在此之后的启动/停止；返回写入后的状态，version 已变化时返回 None。
+    未提供 version 的旧调用方式以当前版本为准 (后写入的生效)。
+    """
+    if expected_version is None:
+        expected_version = load_monitor_status()['version']
+    if not compare_and_set_monitor_status({'version': expected_version}, status_to_save):
+        return None
+    return dict(status_to_save, version=expected_version + 1)
+
+def _monitor_status_conflict():
+    return jsonify({"success": False, "message": "监控状态已被其它请求修改，请刷新后重试",
+                    "status": load_monitor_status()}), 409
+
 @api.route('/monitor_status', methods=['GET', 'POST'])
 @login_required
 def monitor_status_endpoint():
-    scheduler = current_app.scheduler
+    # 只修改共享的期望状态，由调度器 leader 添加/移除任务 (本进程就是 leader 时立即生效)
     if request.method == 'POST':
         data = request.get_json(force=True, silent=True) or {}
         is_monitoring = data.get('is_monitoring')
+        expected_version = data.get('version')
+        if expected_version is not None and (isinstance(expected_version, bool) or not isinstance(expected_version, int)):
+            return jsonify({"success": False, "message": "version 无效"}), 400
         if is_monitoring is True:
             interval, start_time_str = data.get('interval'), data.get('start_time')
             if not interval or not start_time_str: return jsonify({"success": False, "message": "启动监控缺少参数"}), 400
             try:
-                scheduler.add_job(func=monitor_task, trigger='interval', seconds=int(interval), id='alist_monitor_job', replace_existing=True)
                 status_to_save = {'is_monitoring': True, 'start_time': start_time_str, 'check_count': 0, 'interval': int(interval)}
-                save_monitor_status(status_to_save)
+                status_to_save = _set_monitor_status(status_to_save, expected_version)
+                if status_to_save is None: return _monitor_status_conflict()
+                leader.reconcile()
+                events.publish(events.EVENT_MONITOR_STATUS, status_to_save)
                 return jsonify({"success": True, "message": "监控已在后台启动", "status": status_to_save})
             except Exception as e: return jsonify({"success": False, "message": f"启动监控失败: {e}"}), 500
         elif is_monitoring is False:
-            try: scheduler.remove_job('alist_monitor_job')
-            except Exception: pass
             status_to_save = {'is_monitoring': False, 'start_time': None, 'check_count': 0, 'interval': None}
-            save_monitor_status(status_to_save)
+            status_to_save = _set_monitor_status(status_to_save, expected_version)
+            if status_to_save is None: return _monitor_status_conflict()
+            leader.reconcile()
+            events.publish(events.EVENT_MONITOR_STATUS, status_to_save)
             return jsonify({"success": True, "message": "监控已在后台停止", "status": status_to_save})
         else: return jsonify({"success": False, "message": "请求无效"}), 400
-    else: return jsonify(load_monitor_status())
+    else:
+        status = load_monitor_status()
+        status['scheduler_leader'] = leader.get_leader_info()
+        status['skipped_runs'] = leader.get_run_stats()
+        schedule = polling.get_schedule_info(status)
+        status['effective_interval'] = schedule['effective_interval'] if schedule else None
+        status['poll_reason'] = schedule['reason'] if schedule else None
+        status['next_check_at'] = schedule['next_check_at'] if schedule else None
+        return jsonify(status)
+
+def _storage_response(cache_key, result):
+    # 响应体按快照缓存和压缩：ETag 由快照版本和检查时间 (每个快照不同) 生成；
+    # 快照年龄和是否命中快照每次都不同，仍放在响应体中 (不影响 ETag)，同时通过响应头返回，304 响应也能拿到
+    snapshot_age, cached = result.pop('snapshot_age', None), result.pop('cached', None)
+    last_checked = result.get('last_checked')
+    modified_at = datetime.fromisoformat(last_checked).timestamp() if last_checked else None
+    fields, headers = {}, {}
+    if snapshot_age is not None:
+        fields['snapshot_age'] = snapshot_age
+        headers['X-Snapshot-Age'] = str(snapshot_age)
+    if cached is not None:
+        fields['cached'] = cached
+        headers['X-Snapshot-Cached'] = 'true' if cached else 'false'
+    version = f"{result.get('version')}@{last_checked}" if last_checked else result.get('message')
+    since = request.args.get('since', type=int)
+    if since is None:
+        build_body = lambda: storages.result_to_json(result)
+    else:
+        # 增量模式：只返回 since 版本之后新增、删除或状态变化的存储，无法计算增量时返回全部 (full 为 true)
+        cache_key = f"{cache_key}?since={since}"
+        def build_body():
+            changes = snapshot.changes_since(result, since)
+            if changes is None:
+                return storages.result_to_json(dict(result, since=since, full=True))
+            return storages.delta_to_json(result, since, *changes)
+    return httpcache.conditional_response(
+        cache_key, version, build_body, last_modified=modified_at, headers=headers, fields=fields
+    )
 
 @api.route('/storage_status', methods=['GET'])
 @login_required
-def storage_status(): return jsonify(get_storage_status())
+def storage_status(): return _storage_response('storage_status', get_storage_status())
 
 @api.route('/storage_list', methods=['GET'])
 @login_required
-def storage_list(): return jsonify(get_storage_list())
+def storage_list(): return _storage_response('storage_list', get_storage_list())
     
+@api.route('/alerts', methods=['GET'])
+@login_required
+def alert_states(): return jsonify(load_alert_states())
+
+# --- API 令牌接口 (仅登录会话可用) ---
+@api.route('/tokens', methods=['GET'])
+@session_required
+def list_api_tokens(): return jsonify({"success": True, "tokens": auth.list_tokens()})
+
+@api.route('/tokens', methods=['POST'])
+@session_required
+def create_api_token():
+    data = request.get_json(force=True, silent=True) or {}
+    name = (data.get('name') or '').strip()
+    if not name: return jsonify({"success": False, "message": "令牌名称不能为空"}), 400
+    try:
+        token, info = auth.issue_token(name, data.get('scope', auth.SCOPE_READ),
+                                       data.get('expires_in', auth.DEFAULT_TOKEN_TTL))
+    except (TypeError, ValueError) as e: return jsonify({"success": False, "message": f"参数无效: {e}"}), 400
+    return jsonify({"success": True, "message": "令牌已创建，请妥善保存 (只显示一次)", "token": token, "info": info})
+
+@api.route('/tokens/<jti>', methods=['DELETE'])
+@session_required
+def revoke_api_token(jti):
+    if not auth.revoke_token(jti): return jsonify({"success": False, "message": "令牌不存在或已撤销"}), 404
+    return jsonify({"success": True, "message": "令牌已撤销"})
+
+# --- 事件推送接口 (SSE) ---
+@api.route('/events', methods=['GET'])
+@login_required
+def event_stream():
+    # 浏览器重连时通过 Last-Event-ID 请求头告知最后收到的事件
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try: last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError: last_event_id = None
+    return Response(events.stream(last_event_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- 检查历史接口 ---
+def _history_range():
+    days = request.args.get('days', default=1, type=float)
+    end = time.time()
+    return end - days * 86400, end
+
+@api.route('/history/uptime', methods=['GET'])
+@login_required
+def history_uptime():
+    start, end = _history_range()
+    return jsonify({"success": True, "start": start, "end": end,
+                    "storages": get_uptime(request.args.get('storage'), start, end)})
+
+@api.route('/history/timeline', methods=['GET'])
+@login_required
+def history_timeline():
+    storage = request.args.get('storage')
+    if not storage: return jsonify({"success": False, "message": "缺少 storage 参数"}), 400
+    start, end = _history_range()
+    return jsonify({"success": True, "storage": storage, "start": start, "end": end,
+                    "timeline": get_timeline(storage, start, end), "mttr": get_mttr(storage, start, end)})
+
 @api.route('/check_storage', methods=['POST'])
 @login_required
 def check_storage():
     status = load_monitor_status()
     if status.get('is_monitoring'):
-        status['check_count'] = status.get('check_count', 0) + 1
-        save_monitor_status(status)
+        status['check_count'] = increment_check_count(status['version'])
+        if status['check_count'] is not None:
+            events.publish(events.EVENT_MONITOR_STATUS, status)
     config = load_config()
     data = request.get_json()
     config_changed = False
@@ -130,20 +297,28 @@ def check_storage():
     if data.get('api_key') and data['api_key'] != config.get('ALIST_TOKEN'):
         config['ALIST_TOKEN'], config_changed = data['api_key'], True
     if config_changed: save_config(config)
-    result = get_storage_status()
+    result = get_storage_status(force=True)
+    record_check(result)
+    events.publish(events.EVENT_STORAGE_STATUS, summarize_result(result))
     add_notification_record({
         "message": f"手动检查完成: {result.get('status', '未知')}",
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "type": "success" if result.get('status') == '正常' else "warning"
     })
-    return jsonify({"success": result.get('success', False), "message": "检查完成", "data": result})
+    head = {"success": result.get('success', False), "message": "检查完成"}
+    return Response(storages.wrap_result_json(head, 'data', result), mimetype='application/json')
 
 # --- 新的通知接口 ---
+def _notify_response(accepted, message, delivery_ids):
+    # delivery_id 为第一个渠道的投递 ID (兼容只有一个渠道时的调用方)，delivery_ids 为所有渠道的投递 ID
+    return jsonify({"success": accepted, "message": message,
+                    "delivery_id": delivery_ids[0] if delivery_ids else None, "delivery_ids": delivery_ids})
+
 @api.route('/notify/test', methods=['POST'])
 @login_required
 def notify_test():
-    result, message = send_notification('test')
-    return jsonify({"success": result, "message": message})
+    accepted, message, delivery_ids = send_notification('test')
+    return _notify_response(accepted, message, delivery_ids)
 
 @api.route('/notify/start', methods=['POST'])
 @login_required
@@ -156,8 +331,8 @@ def notify_start():
         .astimezone(timezone(datetime.now().astimezone().utcoffset()))\
         .strftime('%Y-%m-%d %H:%M:%S')
 
-    send_notification('start', data={'start_time': start_time_local, 'interval': interval})
-    return jsonify({"success": True})
+    accepted, message, delivery_ids = send_notification('start', data={'start_time': start_time_local, 'interval': interval})
+    return _notify_response(accepted, message, delivery_ids)
 
 @api.route('/notify/stop', methods=['POST'])
 @login_required
@@ -166,17 +341,77 @@ def notify_stop():
     duration = data.get('duration')
     stop_time_local = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
-    send_notification('stop', data={'stop_time': stop_time_local, 'duration': duration})
-    return jsonify({"success": True})
+    accepted, message, delivery_ids = send_notification('stop', data={'stop_time': stop_time_local, 'duration': duration})
+    return _notify_response(accepted, message, delivery_ids)
+
+@api.route('/notify/deliveries/<int:delivery_id>', methods=['GET'])
+@login_required
+def notify_delivery_status(delivery_id):
+    delivery = get_delivery(delivery_id)
+    if delivery is None: return jsonify({"success": False, "message": "投递记录不存在"}), 404
+    return jsonify({"success": True, "delivery": delivery})
 
-# --- 通知记录接口 (无改动) ---
+# --- 通知记录接口 ---
 @api.route('/notifications', methods=['GET'])
 @login_required
 def get_notifications():
-    return jsonify(load_notifications())
+    # 支持参数: limit, cursor (上一页的 X-Next-Cursor), type (可逗号分隔多个), since/until (ISO 时间或时间戳)
+    args = request.args
+    types = [t for t in args.get('type', '').split(',') if t]
+    # 先取版本再查询：数据未变化时直接返回 304，不执行查询
+    version, modified_at = notifications_version()
+    def build_body():
+        records, next_cursor = query_notifications(
+            limit=args.get('limit', type=int), cursor=args.get('cursor', type=int),
+            types=types, since=args.get('since'), until=args.get('until')
+        )
+        headers = {'X-Next-Cursor': str(next_cursor)} if next_cursor is not None else None
+        return json.dumps(records, ensure_ascii=False), headers
+    try:
+        return httpcache.conditional_response(
+            f"notifications?{request.query_string.decode()}", version, build_body, last_modified=modified_at
+        )
+    except ValueError as e: return jsonify({"success": False, "message": f"参数无效: {e}"}), 400
 
 @api.route('/notifications', methods=['DELETE'])
 @login_required
 def clear_notifications_endpoint():
-    save_notifications([])
-    return jsonify({"success": True, "message": "通知记录已清除"})
\ No newline at end of file
+    clear_notifications()
+    return jsonify({"success": True, "message": "通知记录已清除"})
+
+# --- 性能诊断接口 (仅登录会话可用) ---
+@api.route('/admin/traces', methods=['GET'])
+@session_required
+def slow_traces():
+    settings = tracing.get_settings()
+    return jsonify({
+        "success": True, "enabled": settings['enabled'], "slow_ms": settings['slow_ms'],
+        "traces": tracing.recent_traces(min(request.args.get('limit', default=50, type=int), 500))
+    })
+
+@api.route('/admin/profile', methods=['POST'])
+@session_required
+def sample_profile():
+    # 阻塞 seconds 秒采集本 worker 的调用栈后返回汇总结果
+    data = request.get_json(force=True, silent=True) or {}
+    try: seconds = float(data.get('seconds', 5))
+    except (TypeError, ValueError): return jsonify({"success": False, "message": "seconds 必须是数字"}), 400
+    try: profile = tracing.sample_profile(seconds, include_idle=bool(data.get('include_idle', False)))
+    except tracing.ProfilerBusy as e: return jsonify({"success": False, "message": str(e)}), 409
+    return jsonify({"success": True, "profile": profile})
+
+@api.route('/admin/logs', methods=['GET'])
+@session_required
+def get_logs():
+    # 所有 worker 最近的日志 (最多约 1 秒的延迟)；支持参数: limit, cursor, level (最低级别), logger, pid, q (消息包含的文本)
+    args = request.args
+    try:
+        records, next_cursor = logs.query_logs(
+            limit=args.get('limit', type=int), cursor=args.get('cursor', type=int), level=args.get('level'),
+            logger_name=args.get('logger'), pid=args.get('pid', type=int), search=args.get('q')
+        )
+    except ValueError as e: return jsonify({"success": False, "message": f"参数无效: {e}"}), 400
+    response = jsonify({"success": True, "logs": records})
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
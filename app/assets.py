@@ -0,0 +1,134 @@
+# app/assets.py
+import os
+import gzip
+import hashlib
+import logging
+import mimetypes
+import threading
+from flask import current_app, render_template, request, Response
+from app import httpcache
+
+logger = logging.getLogger(__name__)
+
+# --- 静态资源与页面 ---
+# 部署中没有反向代理，页面和静态资源都由 gunicorn 直接提供：
+# - 每个进程启动时 (app.startup 的后台线程) 读取 app/static 下的所有文件，按内容摘要生成带指纹的文件名
+#   (js/index.js -> js/index.<摘要>.js)，并预先压缩为 gzip (安装了 brotli 时还有 br)；
+# - 带指纹的地址内容永远不变，响应头 Cache-Control: immutable，浏览器在一年内不再请求；
+#   不带指纹的原地址仍然可用，每次都需要用 ETag 重新验证；
+# - 页面模板中通过 asset_url() 引用带指纹的地址，渲染结果和压缩结果缓存在进程内，
+#   重复打开页面时浏览器只需带 If-None-Match 请求页面本身 (304)。
+# 调试模式 (app.debug) 下不使用指纹和页面缓存，修改模板和静态文件后刷新即可生效。
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+TEXT_MIMETYPES = ('application/javascript', 'application/json', 'image/svg+xml')
+
+class Asset:
+    __slots__ = ('path', 'fingerprinted', 'mimetype', 'etag', 'raw', 'encoded')
+
+    def __init__(self, path, raw, mimetype, fingerprinted=None):
+        self.path = path
+        self.raw = raw
+        self.mimetype = mimetype
+        digest = hashlib.sha256(raw).hexdigest()
+        self.etag = digest[:20]
+        if fingerprinted is None:
+            stem, ext = os.path.splitext(path)
+            fingerprinted = f"{stem}.{digest[:12]}{ext}"
+        self.fingerprinted = fingerprinted
+        self.encoded = _precompress(raw, mimetype)
+
+def _precompress(raw, mimetype):
+    """预先压缩文本类内容 (图片等已压缩的格式不再压缩)，只保留比原始内容小的结果"""
+    if len(raw) < httpcache.COMPRESS_MIN_SIZE or not (mimetype.startswith('text/') or mimetype in TEXT_MIMETYPES):
+        return {}
+    encoded = {'gzip': gzip.compress(raw, compresslevel=GZIP_LEVEL)}
+    if httpcache.brotli is not None:
+        encoded['br'] = httpcache.brotli.compress(raw, quality=BROTLI_QUALITY)
+    return {encoding: body for encoding, body in encoded.items() if len(body) < len(raw)}
+
+def _guess_mimetype(path):
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    # 部分系统的 mimetypes 把 .js 识别为 text/javascript 或缺少映射，统一使用标准类型
+    return 'application/javascript' if path.endswith('.js') else mimetype
+
+# --- 静态资源清单 (每个进程构建一次) ---
+
+_manifest = None   # 相对路径或带指纹的相对路径 -> Asset
+_manifest_lock = threading.Lock()
+
+def build_manifest():
+    """读取并预压缩所有静态文件 (幂等，由启动线程调用，第一次请求静态资源时也会触发)"""
+    global _manifest
+    if _manifest is not None:
+        return _manifest
+    with _manifest_lock:
+        if _manifest is not None:
+            return _manifest
+        manifest = {}
+        for root, _, files in os.walk(STATIC_DIR):
+            for filename in sorted(files):
+                full_path = os.path.join(root, filename)
+                path = os.path.relpath(full_path, STATIC_DIR).replace(os.sep, '/')
+                with open(full_path, 'rb') as f:
+                    asset = Asset(path, f.read(), _guess_mimetype(path))
+                manifest[path] = manifest[asset.fingerprinted] = asset
+        _manifest = manifest
+        logger.info(f"静态资源清单已生成: {len(manifest) // 2} 个文件")
+    return _manifest
+
+def asset_url(path):
+    """模板中引用静态资源的地址 (带内容指纹)"""
+    if current_app.debug:
+        return f"/static/{path}"
+    asset = build_manifest().get(path)
+    return f"/static/{asset.fingerprinted if asset else path}"
+
+def _asset_response(asset, cache_control):
+    # 强 ETag 必须随内容编码变化 (RFC 9110)：未压缩为摘要本身，压缩后的内容加上编码后缀；
+    # 客户端持有任一编码的 ETag 时内容都未变化，返回 304
+    encoding = httpcache.choose_encoding()
+    body = asset.encoded.get(encoding)
+    etag = asset.etag if body is None else f"{asset.etag}-{encoding}"
+    variants = [asset.etag] + [f"{asset.etag}-{name}" for name in asset.encoded]
+    if any(request.if_none_match.contains(variant) for variant in variants):
+        response = Response(status=304)
+    else:
+        response = Response(body if body is not None else asset.raw, mimetype=asset.mimetype)
+        if body is not None:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    return response
+
+def static_response(path):
+    """返回静态资源的响应，不在清单中 (启动后新增或不存在) 时返回 None"""
+    asset = None if current_app.debug else build_manifest().get(path)
+    if asset is None:
+        return None
+    if path == asset.fingerprinted:
+        return _asset_response(asset, f'public, max-age={IMMUTABLE_MAX_AGE}, immutable')
+    return _asset_response(asset, 'no-cache')
+
+# --- 页面缓存 ---
+
+_pages = {}    # 模板名 -> Asset
+_pages_lock = threading.Lock()
+
+def page_response(template):
+    """返回渲染后的页面，同一进程中每个模板只渲染和压缩一次 (页面不包含与用户相关的内容)"""
+    if current_app.debug:
+        return render_template(template)
+    page = _pages.get(template)
+    if page is None:
+        with _pages_lock:
+            page = _pages.get(template)
+            if page is None:
+                html = render_template(template).encode('utf-8')
+                page = _pages[template] = Asset(template, html, 'text/html', fingerprinted=template)
+    # 页面中的资源地址会随部署变化，浏览器每次都需要重新验证 (未变化时为 304)
+    return _asset_response(page, 'no-cache')
@@ -0,0 +1,209 @@
+# app/auth.py
+import os
+import hmac
+import json
+import time
+import uuid
+import base64
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app import db, tracing
+from app.config import DATA_DIR, load_config, verify_password
+
+logger = logging.getLogger(__name__)
+
+# --- 无状态 API 令牌 ---
+# 供脚本调用的令牌格式为 am1.<载荷>.<签名>，载荷是 base64url 编码的 JSON
+# (jti 令牌 ID、scope 权限、iat 签发时间、exp 过期时间)，签名为 HMAC-SHA256。
+# 校验只需要一次 HMAC 计算，不读取 config.json、不运行 bcrypt。
+# - 签名密钥随机生成后保存在 /data/api_token.key，所有 worker 共用，删除该文件即可让所有令牌失效；
+# - scope 为 read (只读接口) 或 control (还可以启动/停止监控、手动检查、发送通知)；
+# - 签发的令牌记录在共享数据库中，撤销后写入 revoked_at，各进程最多每秒刷新一次撤销列表。
+
+TOKEN_PREFIX = 'am1'
+KEY_PATH = os.path.join(DATA_DIR, 'api_token.key')
+
+SCOPE_READ = 'read'
+SCOPE_CONTROL = 'control'
+SCOPES = (SCOPE_READ, SCOPE_CONTROL)
+
+DEFAULT_TOKEN_TTL = 30 * 86400      # 秒
+REVOCATION_REFRESH_INTERVAL = 1.0   # 秒
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS api_tokens (
+    jti TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    revoked_at REAL
+);
+"""
+
+def _ensure_schema():
+    db.ensure_schema('auth', _SCHEMA)
+
+_key = None
+_key_lock = threading.Lock()
+
+def _signing_key():
+    """读取签名密钥，不存在时生成 (O_EXCL 保证多个 worker 同时启动时只有一个写入)"""
+    global _key
+    if _key is not None:
+        return _key
+    with _key_lock:
+        if _key is None:
+            os.makedirs(DATA_DIR, exist_ok=True)
+            try:
+                fd = os.open(KEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                pass
+            else:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(base64.urlsafe_b64encode(os.urandom(32)).decode())
+            # 另一个进程刚创建文件、尚未写完时可能读到空内容
+            for _ in range(50):
+                with open(KEY_PATH) as f:
+                    content = f.read().strip()
+                if content:
+                    break
+                time.sleep(0.01)
+            else:
+                raise RuntimeError(f"API 令牌密钥文件 {KEY_PATH} 为空")
+            _key = content.encode()
+    return _key
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def _sign(payload):
+    return _b64encode(hmac.new(_signing_key(), f"{TOKEN_PREFIX}.{payload}".encode(), hashlib.sha256).digest())
+
+def issue_token(name, scope, ttl=DEFAULT_TOKEN_TTL):
+    """签发令牌，返回 (令牌字符串, 令牌信息)；令牌只在签发时返回一次"""
+    if scope not in SCOPES:
+        raise ValueError(f"scope 必须是 {' / '.join(SCOPES)}")
+    ttl = float(ttl)
+    if ttl <= 0:
+        raise ValueError("有效期必须大于 0")
+    _ensure_schema()
+    now = time.time()
+    info = {'jti': uuid.uuid4().hex, 'name': name, 'scope': scope, 'created_at': now, 'expires_at': now + ttl}
+    db.get_connection().execute(
+        'INSERT INTO api_tokens (jti, name, scope, created_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+        (info['jti'], name, scope, now, info['expires_at'])
+    )
+    payload = _b64encode(json.dumps(
+        {'jti': info['jti'], 'scope': scope, 'iat': int(now), 'exp': int(info['expires_at'])},
+        separators=(',', ':')
+    ).encode())
+    return f"{TOKEN_PREFIX}.{payload}.{_sign(payload)}", info
+
+def list_tokens():
+    _ensure_schema()
+    rows = db.get_connection().execute(
+        'SELECT jti, name, scope, created_at, expires_at, revoked_at FROM api_tokens ORDER BY created_at DESC'
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+def revoke_token(jti):
+    """撤销令牌，令牌不存在或已撤销时返回 False"""
+    _ensure_schema()
+    now = time.time()
+    cursor = db.get_connection().execute(
+        'UPDATE api_tokens SET revoked_at = ? WHERE jti = ? AND revoked_at IS NULL', (now, jti)
+    )
+    if not cursor.rowcount:
+        return False
+    with _revoked_lock:
+        _revoked['jtis'] = _revoked['jtis'] | {jti}
+    logger.info(f"API 令牌 {jti} 已撤销")
+    return True
+
+# --- 撤销列表缓存 ---
+# 已过期的令牌无论是否撤销都会被拒绝，因此只需要缓存未过期的撤销记录
+
+_revoked = {'jtis': frozenset(), 'loaded_at': 0.0, 'pid': None}
+_revoked_lock = threading.Lock()
+
+def _revoked_jtis():
+    now = time.monotonic()
+    if _revoked['pid'] == os.getpid() and now - _revoked['loaded_at'] < REVOCATION_REFRESH_INTERVAL:
+        return _revoked['jtis']
+    with _revoked_lock:
+        if _revoked['pid'] != os.getpid() or now - _revoked['loaded_at'] >= REVOCATION_REFRESH_INTERVAL:
+            _ensure_schema()
+            rows = db.get_connection().execute(
+                'SELECT jti FROM api_tokens WHERE revoked_at IS NOT NULL AND expires_at > ?', (time.time(),)
+            ).fetchall()
+            _revoked.update(jtis=frozenset(row['jti'] for row in rows), loaded_at=now, pid=os.getpid())
+    return _revoked['jtis']
+
+def verify_token(token):
+    """校验令牌，有效时返回载荷 (包含 jti、scope)，否则返回 None"""
+    parts = token.split('.')
+    if len(parts) != 3 or parts[0] != TOKEN_PREFIX:
+        return None
+    # 令牌来自未认证的请求头，可能包含任意字符：按字节比较 (compare_digest 不接受含非 ASCII 字符的 str)
+    if not hmac.compare_digest(parts[2].encode('utf-8', 'replace'), _sign(parts[1]).encode()):
+        return None
+    try:
+        claims = json.loads(_b64decode(parts[1]))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict):
+        return None
+    if claims.get('exp', 0) <= time.time() or claims.get('scope') not in SCOPES:
+        return None
+    if claims.get('jti') in _revoked_jtis():
+        return None
+    return claims
+
+def scope_allows(granted, required):
+    """control 令牌包含只读权限"""
+    return granted == required or granted == SCOPE_CONTROL
+
+# --- 交互登录的密码校验 ---
+# bcrypt 校验约需几百毫秒 CPU，放到独立的有界线程池中执行，
+# 排队的登录请求超过上限时直接拒绝，避免登录请求占满 gunicorn 的全部请求线程。
+
+DEFAULT_LOGIN_WORKERS = 2
+LOGIN_QUEUE_FACTOR = 4   # 每个线程允许排队的登录请求数
+LOGIN_TIMEOUT = 10       # 秒
+
+class LoginBusy(Exception):
+    pass
+
+_login_executor = {'pid': None, 'executor': None, 'slots': None}
+_login_executor_lock = threading.Lock()
+
+def _get_login_executor():
+    with _login_executor_lock:
+        if _login_executor['pid'] != os.getpid():
+            workers = max(1, int(load_config().get('LOGIN_WORKERS', DEFAULT_LOGIN_WORKERS)))
+            _login_executor.update(
+                pid=os.getpid(),
+                executor=ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt'),
+                slots=threading.BoundedSemaphore(workers * LOGIN_QUEUE_FACTOR)
+            )
+        return _login_executor['executor'], _login_executor['slots']
+
+def check_password(raw_password, hashed_password):
+    """在登录线程池中校验密码；排队已满时抛出 LoginBusy"""
+    executor, slots = _get_login_executor()
+    if not slots.acquire(blocking=False):
+        raise LoginBusy("登录请求过多，请稍后重试")
+    try:
+        future = executor.submit(verify_password, raw_password, hashed_password)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    with tracing.span('auth.bcrypt'):
+        return future.result(timeout=LOGIN_TIMEOUT)
@@ -1,16 +1,23 @@
 # app/config.py
 import os
+import copy
 import json
 import bcrypt
+import time
 import logging
+import threading
 from functools import wraps
+from app import tracing
+from app.metrics import JSON_FILE_SECONDS, CACHE_REQUESTS
 
 logger = logging.getLogger(__name__)
 
 # --- 文件路径定义 (保持不变) ---
-DATA_DIR = '/data'
+# ALIST_MONITOR_DATA_DIR 仅用于基准测试等需要隔离数据的场景，部署时使用默认的 /data
+DATA_DIR = os.environ.get('ALIST_MONITOR_DATA_DIR', '/data')
 CONFIG_PATH = os.path.join(DATA_DIR, 'config.json')
-MONITOR_STATUS_PATH = os.path.join(DATA_DIR, 'monitor_status.json')
+MONITOR_STATUS_PATH = os.path.join(DATA_DIR, 'monitor_status.json')  # 旧版本的监控状态文件，仅用于迁移
+# 旧版本的通知记录文件，现在仅用于迁移到 app/notifications.py 的数据库日志
 NOTIFICATIONS_PATH = os.path.join(DATA_DIR, 'notifications.json')
 
 # --- 装饰器：确保目录存在 ---
@@ -22,32 +29,94 @@ def ensure_data_dir_exists(func):
         return func(*args, **kwargs)
     return wrapper
 
+# --- JSON 文件读缓存 ---
+# 进程内的读穿透缓存：按文件路径缓存解析结果，并记录文件的 (inode, mtime, size) 签名。
+# 每次读取只做一次 os.stat，签名未变则直接返回缓存副本；其他 gunicorn worker
+# 通过 os.replace 写入时会产生新的 inode/mtime，因此各进程都能及时发现变化并重新解析。
+_json_cache = {}
+_json_cache_lock = threading.Lock()
+_json_cache_stats = {'hits': 0, 'misses': 0}
+
+def _file_signature(file_path):
+    """返回文件的变更签名，文件不存在时返回 None"""
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _cache_put(file_path, signature, data):
+    with _json_cache_lock:
+        _json_cache[file_path] = (signature, copy.deepcopy(data))
+
+def get_cache_stats():
+    """返回 JSON 文件缓存的命中/未命中计数"""
+    with _json_cache_lock:
+        stats = dict(_json_cache_stats)
+        stats['entries'] = len(_json_cache)
+    return stats
+
 # --- 内部辅助函数 (已简化，移除文件锁) ---
 def _load_json_file(file_path, default_value):
-    """通用函数：加载JSON文件"""
-    if not os.path.exists(file_path):
+    """通用函数：加载JSON文件 (带 mtime 校验的读缓存)"""
+    started = time.perf_counter()
+    try:
+        return _read_json_file(file_path, default_value)
+    finally:
+        elapsed = time.perf_counter() - started
+        JSON_FILE_SECONDS.labels(file=os.path.basename(file_path), operation='load').observe(elapsed)
+        tracing.record('config.load', elapsed)
+
+def _read_json_file(file_path, default_value):
+    signature = _file_signature(file_path)
+    if signature is None:
         return default_value
+    with _json_cache_lock:
+        cached = _json_cache.get(file_path)
+        if cached and cached[0] == signature:
+            _json_cache_stats['hits'] += 1
+            CACHE_REQUESTS.labels(cache='json_file', result='hit').inc()
+            # 返回副本，避免调用方修改缓存中的对象
+            return copy.deepcopy(cached[1])
+        _json_cache_stats['misses'] += 1
+    CACHE_REQUESTS.labels(cache='json_file', result='miss').inc()
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             content = f.read()
             # 如果文件为空，也返回默认值
-            return json.loads(content) if content else default_value
+            if not content:
+                return default_value
+            data = json.loads(content)
     except (json.JSONDecodeError, IOError) as e:
         logger.error(f"加载JSON文件 {file_path} 失败: {e}")
         return default_value
+    # 读取期间文件可能被替换，只有签名仍一致时才写入缓存
+    if _file_signature(file_path) == signature:
+        _cache_put(file_path, signature, data)
+    return data
 
 def _save_json_file(file_path, data, indent=4):
     """通用函数：保存数据到JSON文件 (使用临时文件保证原子性)"""
+    started = time.perf_counter()
     try:
-        temp_path = file_path + '.tmp'
+        # 临时文件名带上进程和线程号，多个 worker 同时保存时不会互相覆盖对方的临时文件
+        temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
         with open(temp_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=indent, ensure_ascii=False)
         # 使用 os.replace 保证操作的原子性，避免文件损坏
         os.replace(temp_path, file_path)
+        # 写穿透：用刚写入的数据更新缓存，本进程的下一次读取无需重新解析
+        signature = _file_signature(file_path)
+        if signature is not None:
+            _cache_put(file_path, signature, data)
         return True
     except Exception as e:
         logger.error(f"保存JSON文件 {file_path} 失败: {e}")
         return False
+    finally:
+        elapsed = time.perf_counter() - started
+        JSON_FILE_SECONDS.labels(file=os.path.basename(file_path), operation='save').observe(elapsed)
+        tracing.record('config.save', elapsed)
 
 # --- 核心配置函数 ---
 @ensure_data_dir_exists
@@ -60,33 +129,22 @@ def save_config(config):
     """安全地保存配置到文件"""
     return _save_json_file(CONFIG_PATH, config, indent=4)
 
+def get_config_version():
+    """配置文件的版本 (签名, 修改时间)，文件不存在时返回 (None, None)；用于 HTTP 条件请求"""
+    signature = _file_signature(CONFIG_PATH)
+    if signature is None:
+        return None, None
+    return signature, signature[1] / 1e9
+
 # --- 监控状态函数 ---
-@ensure_data_dir_exists
+# 监控状态保存在共享数据库中 (见 app/state.py)，这里保留原有的函数名供各模块使用
 def load_monitor_status():
-    return _load_json_file(MONITOR_STATUS_PATH, default_value={'is_monitoring': False, 'start_time': None, 'check_count': 0, 'interval': None})
+    from app import state
+    return state.load_monitor_status()
 
-@ensure_data_dir_exists
 def save_monitor_status(status):
-    return _save_json_file(MONITOR_STATUS_PATH, status, indent=2)
-
-# --- 通知记录函数 ---
-@ensure_data_dir_exists
-def load_notifications():
-    """从文件加载通知记录"""
-    return _load_json_file(NOTIFICATIONS_PATH, default_value=[])
-
-@ensure_data_dir_exists
-def save_notifications(notifications):
-    """保存通知记录到文件"""
-    return _save_json_file(NOTIFICATIONS_PATH, notifications, indent=2)
-
-def add_notification_record(notification):
-    """添加一条新的通知记录，并保持日志大小"""
-    MAX_NOTIFICATIONS = 100
-    notifications = load_notifications()
-    notifications.insert(0, notification)
-    trimmed_notifications = notifications[:MAX_NOTIFICATIONS]
-    save_notifications(trimmed_notifications)
+    from app import state
+    return state.save_monitor_status(status)
 
 # --- 密码相关函数 ---
 def get_password():
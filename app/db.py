@@ -0,0 +1,64 @@
+# app/db.py
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from app.config import DATA_DIR
+
+# --- 共享的 SQLite 数据库 ---
+# 与 APScheduler 的 alist_monitor.sqlite 分开存放，避免与 SQLAlchemy 的任务存储争用写锁。
+# 使用 WAL 模式，多个 gunicorn worker 可以同时读取，写入只追加到 WAL 文件。
+DB_PATH = os.path.join(DATA_DIR, 'monitor_data.sqlite')
+
+# 写入量大的检查历史单独存放在另一个文件中，避免与队列/通知记录争用写锁
+HISTORY_DB_PATH = os.path.join(DATA_DIR, 'history.sqlite')
+
+# 最近的日志记录 (见 app/logs.py) 也单独存放，日志写入不与其它数据争用写锁
+LOG_DB_PATH = os.path.join(DATA_DIR, 'logs.sqlite')
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_applied_schemas = set()
+
+def get_connection(path=DB_PATH):
+    """获取当前线程的数据库连接 (按进程和线程复用，fork 之后会重新建立)"""
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.conns = {}
+        _local.pid = os.getpid()
+    conn = _local.conns.get(path)
+    if conn is not None:
+        return conn
+    os.makedirs(DATA_DIR, exist_ok=True)
+    # isolation_level=None: 自动提交，需要事务时显式使用 transaction()
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=10000')
+    _local.conns[path] = conn
+    return conn
+
+def ensure_schema(name, script, path=DB_PATH):
+    """在本进程中执行一次建表脚本 (脚本本身应使用 IF NOT EXISTS 保证幂等)"""
+    key = (os.getpid(), path, name)
+    if key in _applied_schemas:
+        return False
+    with _schema_lock:
+        if key in _applied_schemas:
+            return False
+        get_connection(path).executescript(script)
+        _applied_schemas.add(key)
+    return True
+
+@contextmanager
+def transaction(path=DB_PATH):
+    """开启一个写事务 (BEGIN IMMEDIATE)，跨进程串行化写操作"""
+    conn = get_connection(path)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    else:
+        conn.execute('COMMIT')
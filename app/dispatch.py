@@ -0,0 +1,310 @@
+# app/dispatch.py
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from app import db, notifications, resilience
+from app.config import load_config
+
+logger = logging.getLogger(__name__)
+
+# --- 通知异步发送队列 ---
+# send_notification 只负责把消息写入数据库中的发送队列 (spool) 并立即返回投递 ID，
+# 由每个进程内的后台线程负责真正发送：
+# - 队列持久化在 SQLite 中，进程崩溃后处于 sending 状态的消息会在超时后重新发送；
+# - 每个渠道一个令牌桶 (保存在数据库中，所有进程共享)，匹配 Telegram/企业微信的频率限制；
+# - 发送时同一渠道积压的多条消息会合并成一条发送；
+# - 一条通知发送到多个渠道时每个渠道各有一条队列消息。每个渠道同一时间只有一批消息在发送，
+#   发送线程数不少于渠道数，因此各渠道并发发送，一个渠道卡住不会拖慢其它渠道；
+# - 每个渠道一个熔断器 (app/resilience.py 中与 Alist 实例共用的熔断器，名称为 notify:<渠道>)：
+#   连续失败达到阈值后暂停该渠道，冷却时间过后先放行一批试探，成功则恢复。
+#   熔断期间消息留在队列中，不再为每条告警等待超时和重试。
+
+DEFAULT_WORKERS = 3             # 与渠道数 (tg、wecom、webhook) 相同
+DEFAULT_BREAKER_THRESHOLD = 3   # 连续失败次数
+DEFAULT_BREAKER_COOLDOWN = 60   # 秒
+DEFAULT_COALESCE_WINDOW = 1.0   # 秒，消息入队后至少等待这么久，以便合并突发消息
+MAX_COALESCE = 20               # 单次最多合并的消息条数
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 10              # 秒，第 n 次失败后等待 n * RETRY_BACKOFF 秒重试
+STALE_SENDING_TIMEOUT = 300     # 秒，sending 状态超过该时间视为发送进程已崩溃
+IDLE_POLL_INTERVAL = 2.0
+
+# Telegram 对同一个群组约为 20 条/分钟，企业微信群机器人为 20 条/分钟
+DEFAULT_RATE_LIMITS = {
+    'tg': {'per_minute': 20, 'burst': 5},
+    'wecom': {'per_minute': 20, 'burst': 5},
+    'webhook': {'per_minute': 60, 'burst': 10},
+}
+FALLBACK_RATE_LIMIT = {'per_minute': 30, 'burst': 5}
+
+STATUS_PENDING = 'pending'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+STATUS_COALESCED = 'coalesced'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notification_deliveries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    notification_type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    claimed_by TEXT,
+    merged_into INTEGER,
+    record_id INTEGER,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_deliveries_status ON notification_deliveries (status, channel, next_attempt_at);
+CREATE TABLE IF NOT EXISTS notification_rate_limits (
+    channel TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+-- 渠道熔断器已改用 app/resilience.py 的 circuit_breakers 表
+DROP TABLE IF EXISTS notification_circuits;
+"""
+
+_wakeup = threading.Condition()
+_workers_lock = threading.Lock()
+_workers_pid = None
+_owner_id = None
+
+def _ensure_schema():
+    db.ensure_schema('notification_deliveries', _SCHEMA)
+
+def _get_owner_id():
+    global _owner_id
+    if _owner_id is None or not _owner_id.startswith(f"{os.getpid()}:"):
+        _owner_id = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    return _owner_id
+
+def _rate_limit(channel, config):
+    limits = dict(DEFAULT_RATE_LIMITS.get(channel, FALLBACK_RATE_LIMIT))
+    limits.update((config.get('NOTIFY_RATE_LIMITS') or {}).get(channel, {}))
+    return float(limits['per_minute']) / 60.0, float(limits['burst'])
+
+def _take_token(conn, channel, config, now):
+    """从共享令牌桶中取一个令牌 (需在事务内调用)，返回 0 表示成功，否则返回需要等待的秒数"""
+    rate, burst = _rate_limit(channel, config)
+    row = conn.execute('SELECT tokens, updated_at FROM notification_rate_limits WHERE channel = ?', (channel,)).fetchone()
+    tokens = burst if row is None else min(burst, row['tokens'] + (now - row['updated_at']) * rate)
+    if tokens < 1:
+        return (1 - tokens) / rate if rate > 0 else IDLE_POLL_INTERVAL
+    conn.execute(
+        'INSERT OR REPLACE INTO notification_rate_limits (channel, tokens, updated_at) VALUES (?, ?, ?)',
+        (channel, tokens - 1, now)
+    )
+    return 0
+
+# --- 熔断器 ---
+
+def _breaker_settings(config):
+    return (max(1, int(config.get('NOTIFY_BREAKER_THRESHOLD', DEFAULT_BREAKER_THRESHOLD))),
+            float(config.get('NOTIFY_BREAKER_COOLDOWN', DEFAULT_BREAKER_COOLDOWN)))
+
+def _circuit_name(channel):
+    return f"notify:{channel}"
+
+def _record_circuit(channel, success, message, config):
+    threshold, cooldown = _breaker_settings(config)
+    resilience.record_result(_circuit_name(channel), success, threshold, cooldown, error=None if success else message)
+
+# --- 入队 ---
+
+def enqueue(channel, notification_type, payload, record_id=None):
+    """将一条通知写入发送队列，返回投递 ID"""
+    _ensure_schema()
+    now = time.time()
+    cursor = db.get_connection().execute(
+        'INSERT INTO notification_deliveries (channel, notification_type, payload, status, created_at, updated_at, '
+        'next_attempt_at, record_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        (channel, notification_type, json.dumps(payload, ensure_ascii=False), STATUS_PENDING, now, now, now, record_id)
+    )
+    if record_id is not None:
+        notifications.record_channel_result(record_id, channel, STATUS_PENDING)
+    ensure_workers()
+    with _wakeup:
+        _wakeup.notify()
+    return cursor.lastrowid
+
+def get_delivery(delivery_id):
+    """查询投递状态；被合并的消息返回合并后那条消息的发送结果"""
+    _ensure_schema()
+    conn = db.get_connection()
+    row = conn.execute(
+        'SELECT id, channel, notification_type, status, attempts, created_at, updated_at, merged_into, record_id, result '
+        'FROM notification_deliveries WHERE id = ?', (delivery_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    delivery = dict(row)
+    delivery['result'] = json.loads(row['result']) if row['result'] else None
+    return delivery
+
+# --- 后台发送 ---
+
+def _recover_stale(conn, now):
+    conn.execute(
+        'UPDATE notification_deliveries SET status = ?, claimed_by = NULL, updated_at = ? '
+        'WHERE status = ? AND updated_at < ?',
+        (STATUS_PENDING, now, STATUS_SENDING, now - STALE_SENDING_TIMEOUT)
+    )
+
+def _claim_batch(config):
+    """
+    认领下一批待发送消息：在有令牌、未熔断且没有正在发送的渠道中取最早的消息，
+    并合并该渠道上所有已到期的待发消息。返回 (rows, wait_seconds)。没有可发送的消息时 rows 为空。
+    """
+    now = time.time()
+    coalesce_window = float(config.get('NOTIFY_COALESCE_WINDOW', DEFAULT_COALESCE_WINDOW))
+    wait = IDLE_POLL_INTERVAL
+    _ensure_schema()
+    # 先用只读查询判断是否有到期的消息或需要回收的 sending 消息，队列空闲时不争用写锁
+    # (每个进程有多个发送线程，空闲时每隔 IDLE_POLL_INTERVAL 秒都会来认领一次)
+    conn = db.get_connection()
+    ready_at = conn.execute(
+        'SELECT MIN(MAX(next_attempt_at, created_at + ?)) FROM notification_deliveries WHERE status = ?',
+        (coalesce_window, STATUS_PENDING)
+    ).fetchone()[0]
+    stale = conn.execute(
+        'SELECT 1 FROM notification_deliveries WHERE status = ? AND updated_at < ? LIMIT 1',
+        (STATUS_SENDING, now - STALE_SENDING_TIMEOUT)
+    ).fetchone()
+    if stale is None and (ready_at is None or ready_at > now):
+        return [], wait if ready_at is None else max(min(wait, ready_at - now), 0.05)
+    # 熔断状态在写事务之外读取，熔断器的表不会在事务中创建
+    open_circuits = resilience.open_circuits(_circuit_name(''))
+    with db.transaction() as conn:
+        _recover_stale(conn, now)
+        heads = conn.execute(
+            'SELECT channel, MIN(next_attempt_at) AS next_attempt_at, MIN(created_at) AS created_at '
+            'FROM notification_deliveries WHERE status = ? GROUP BY channel ORDER BY next_attempt_at',
+            (STATUS_PENDING,)
+        ).fetchall()
+        busy = {row['channel'] for row in conn.execute(
+            'SELECT DISTINCT channel FROM notification_deliveries WHERE status = ?', (STATUS_SENDING,)
+        )}
+        for head in heads:
+            if head['channel'] in busy:
+                continue
+            ready_at = max(head['next_attempt_at'], head['created_at'] + coalesce_window)
+            if ready_at > now:
+                wait = min(wait, ready_at - now)
+                continue
+            opened_until = open_circuits.get(_circuit_name(head['channel']))
+            if opened_until and opened_until > now:
+                wait = min(wait, opened_until - now)
+                continue
+            token_wait = _take_token(conn, head['channel'], config, now)
+            if token_wait:
+                wait = min(wait, token_wait)
+                continue
+            rows = conn.execute(
+                'SELECT * FROM notification_deliveries WHERE status = ? AND channel = ? AND next_attempt_at <= ? '
+                'ORDER BY id LIMIT ?', (STATUS_PENDING, head['channel'], now, MAX_COALESCE)
+            ).fetchall()
+            ids = [r['id'] for r in rows]
+            conn.execute(
+                f"UPDATE notification_deliveries SET status = ?, claimed_by = ?, updated_at = ?, attempts = attempts + 1 "
+                f"WHERE id IN ({','.join('?' * len(ids))})", (STATUS_SENDING, _get_owner_id(), now, *ids)
+            )
+            return [dict(r, attempts=r['attempts'] + 1) for r in rows], 0
+    return [], max(wait, 0.05)
+
+def coalesce_payloads(notification_types, payloads):
+    """把多条消息合并为一条：同类消息沿用原标题，不同类消息使用汇总标题"""
+    if len(payloads) == 1:
+        return payloads[0]
+    same_type = len(set(notification_types)) == 1
+    title = payloads[0]['title'] if same_type else f"📣 {len(payloads)} 条监控通知"
+    parts = [p['details'] if same_type else f"{p['title']}\n{p['details']}" for p in payloads]
+    return {'title': title, 'details': "\n\n".join(parts), 'picurl': payloads[0].get('picurl'),
+            'template': payloads[0].get('template')}
+
+def _finish_batch(rows, success, message):
+    """
+    记录一批消息的发送结果。发送次数按每条消息分别计算 (合并发送时每条消息的次数各加 1)：
+    失败时用完 MAX_ATTEMPTS 次的消息标记为失败，其余消息放回队列，按各自的次数退避。
+    """
+    now = time.time()
+    head = rows[0]
+    result = json.dumps({'success': success, 'message': message, 'coalesced': len(rows)}, ensure_ascii=False)
+    statuses = {}
+    with db.transaction() as conn:
+        if success:
+            conn.execute(
+                'UPDATE notification_deliveries SET status = ?, updated_at = ?, result = ? WHERE id = ?',
+                (STATUS_SENT, now, result, head['id'])
+            )
+            for row in rows[1:]:
+                conn.execute(
+                    'UPDATE notification_deliveries SET status = ?, merged_into = ?, updated_at = ?, result = ? '
+                    'WHERE id = ?', (STATUS_COALESCED, head['id'], now, result, row['id'])
+                )
+            statuses = {row['id']: STATUS_SENT for row in rows}
+        else:
+            for row in rows:
+                if row['attempts'] >= MAX_ATTEMPTS:
+                    conn.execute(
+                        'UPDATE notification_deliveries SET status = ?, claimed_by = NULL, updated_at = ?, result = ? '
+                        'WHERE id = ?', (STATUS_FAILED, now, result, row['id'])
+                    )
+                    statuses[row['id']] = STATUS_FAILED
+                else:
+                    conn.execute(
+                        'UPDATE notification_deliveries SET status = ?, claimed_by = NULL, updated_at = ?, '
+                        'next_attempt_at = ?, result = ? WHERE id = ?',
+                        (STATUS_PENDING, now, now + row['attempts'] * RETRY_BACKOFF, result, row['id'])
+                    )
+                    statuses[row['id']] = STATUS_PENDING
+    for row in rows:
+        if row['record_id'] is not None:
+            notifications.record_channel_result(row['record_id'], head['channel'], statuses[row['id']], message)
+
+def _process_batch(rows, config):
+    from app.monitor import deliver_notification
+    payload = coalesce_payloads([r['notification_type'] for r in rows], [json.loads(r['payload']) for r in rows])
+    try:
+        success, message = deliver_notification(rows[0]['channel'], payload, config)
+    except Exception as e:
+        logger.error(f"发送通知时出错: {e}", exc_info=True)
+        success, message = False, f"发送通知时出错: {e}"
+    if len(rows) > 1:
+        logger.info(f"已将 {len(rows)} 条通知合并为一条发送")
+    _record_circuit(rows[0]['channel'], success, message, config)
+    _finish_batch(rows, success, message)
+
+def _worker_loop():
+    while True:
+        try:
+            config = load_config()
+            rows, wait = _claim_batch(config)
+            if rows:
+                _process_batch(rows, config)
+                continue
+        except Exception as e:
+            logger.error(f"通知发送线程出错: {e}", exc_info=True)
+            wait = IDLE_POLL_INTERVAL
+        with _wakeup:
+            _wakeup.wait(timeout=wait)
+
+def ensure_workers():
+    """在当前进程中启动发送线程 (fork 之后的子进程会重新启动)"""
+    global _workers_pid
+    if _workers_pid == os.getpid():
+        return
+    with _workers_lock:
+        if _workers_pid == os.getpid():
+            return
+        _workers_pid = os.getpid()
+        count = max(1, int(load_config().get('NOTIFY_WORKERS', DEFAULT_WORKERS)))
+        for i in range(count):
+            threading.Thread(target=_worker_loop, name=f'notify-dispatch-{i}', daemon=True).start()
@@ -0,0 +1,135 @@
+# app/events.py
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# --- 服务器推送事件 (SSE) ---
+# publish() 把事件写入共享数据库中的 events 表，事件 id 全局递增，可直接作为 SSE 的 id；
+# 每个进程在有订阅者时运行一个轮询线程，读取新事件并分发给本进程的所有连接，
+# 因此任意 worker 发布的事件都能到达所有 worker 上的订阅者。
+# 浏览器断线重连时会带上 Last-Event-ID，从数据库中补发错过的事件。
+
+EVENT_MONITOR_STATUS = 'monitor_status'
+EVENT_STORAGE_STATUS = 'storage_status'
+EVENT_NOTIFICATION = 'notification'
+
+POLL_INTERVAL = 0.5        # 秒
+HEARTBEAT_INTERVAL = 15    # 秒，发送注释行保持连接
+STREAM_MAX_DURATION = 300  # 秒，单个连接的最长时间，到期后由浏览器自动重连
+RETRY_MS = 3000
+MAX_EVENTS = 1000          # events 表保留的最大事件数
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+_subscribers = set()
+_subscribers_lock = threading.Lock()
+_poller_pid = None
+
+def _ensure_schema():
+    db.ensure_schema('events', _SCHEMA)
+
+def publish(event_type, data):
+    """发布一个事件，返回事件 id；发布失败只记录日志，不影响调用方"""
+    try:
+        _ensure_schema()
+        event_id = db.get_connection().execute(
+            'INSERT INTO events (ts, type, data) VALUES (?, ?, ?)',
+            (time.time(), event_type, json.dumps(data, ensure_ascii=False))
+        ).lastrowid
+        if event_id % 100 == 0:
+            db.get_connection().execute('DELETE FROM events WHERE id <= ?', (event_id - MAX_EVENTS,))
+        return event_id
+    except Exception as e:
+        logger.error(f"发布事件 {event_type} 失败: {e}")
+        return None
+
+def _latest_event_id():
+    row = db.get_connection().execute('SELECT MAX(id) AS id FROM events').fetchone()
+    return row['id'] or 0
+
+def _read_events_after(event_id, limit=500):
+    return db.get_connection().execute(
+        'SELECT id, type, data FROM events WHERE id > ? ORDER BY id LIMIT ?', (event_id, limit)
+    ).fetchall()
+
+def _poll_loop():
+    last_id = _latest_event_id()
+    while True:
+        time.sleep(POLL_INTERVAL)
+        with _subscribers_lock:
+            subscribers = list(_subscribers)
+        if not subscribers:
+            continue
+        try:
+            rows = _read_events_after(last_id)
+        except Exception as e:
+            logger.error(f"读取事件失败: {e}")
+            continue
+        for row in rows:
+            last_id = row['id']
+            for q in subscribers:
+                try:
+                    q.put_nowait(row)
+                except queue.Full:
+                    # 消费过慢的连接取消订阅，处理完队列后断开，浏览器重连时会用 Last-Event-ID 补发
+                    with _subscribers_lock:
+                        _subscribers.discard(q)
+
+def _ensure_poller():
+    global _poller_pid
+    if _poller_pid == os.getpid():
+        return
+    with _subscribers_lock:
+        if _poller_pid == os.getpid():
+            return
+        _poller_pid = os.getpid()
+        _subscribers.clear()
+    threading.Thread(target=_poll_loop, name='sse-poller', daemon=True).start()
+
+def _format(row):
+    return f"id: {row['id']}\nevent: {row['type']}\ndata: {row['data']}\n\n"
+
+def stream(last_event_id=None):
+    """生成 SSE 数据流；last_event_id 不为空时先补发之后的事件"""
+    _ensure_schema()
+    _ensure_poller()
+    q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    with _subscribers_lock:
+        _subscribers.add(q)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        sent_id = 0
+        if last_event_id:
+            for row in _read_events_after(last_event_id):
+                sent_id = row['id']
+                yield _format(row)
+        deadline = time.monotonic() + STREAM_MAX_DURATION
+        while time.monotonic() < deadline:
+            try:
+                row = q.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                if q not in _subscribers:
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            if row['id'] <= sent_id:
+                continue
+            sent_id = row['id']
+            yield _format(row)
+    finally:
+        with _subscribers_lock:
+            _subscribers.discard(q)
@@ -0,0 +1,278 @@
+# app/history.py
+import time
+import logging
+import threading
+from app import db
+from app.config import load_config
+from app.alerts import storage_key, instance_key
+
+logger = logging.getLogger(__name__)
+
+# --- 存储检查历史 ---
+# 每次检查为每个存储写入一个原始数据点 (时间、状态、获取延迟)，同时以 UPSERT 方式
+# 增量更新分钟/小时/天三级汇总，状态变化单独记录在 status_changes 表中。
+# 查询时按时间范围选择汇总粒度 (长范围的中间部分用天汇总，两端用小时汇总补齐)，
+# 90 天的可用率每个存储只需读取约 140 行；
+# 时间线和 MTTR 只读取状态变化记录，与检查频率无关。
+
+RESOLUTION_MINUTE = 60
+RESOLUTION_HOUR = 3600
+RESOLUTION_DAY = 86400
+
+DEFAULT_RAW_RETENTION_DAYS = 2
+DEFAULT_MINUTE_RETENTION_DAYS = 14
+DEFAULT_HOUR_RETENTION_DAYS = 400
+PRUNE_INTERVAL = 600  # 秒
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history_storages (
+    id INTEGER PRIMARY KEY,
+    storage_key TEXT NOT NULL UNIQUE,
+    last_status TEXT,
+    last_ok INTEGER,
+    last_seen REAL
+);
+CREATE TABLE IF NOT EXISTS check_points (
+    storage_id INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    ok INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    latency_ms REAL,
+    PRIMARY KEY (storage_id, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_check_points_ts ON check_points (ts);
+CREATE TABLE IF NOT EXISTS check_rollups (
+    resolution INTEGER NOT NULL,
+    storage_id INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    ok_count INTEGER NOT NULL,
+    latency_sum REAL NOT NULL,
+    latency_max REAL NOT NULL,
+    PRIMARY KEY (resolution, storage_id, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_check_rollups_bucket ON check_rollups (resolution, bucket);
+CREATE TABLE IF NOT EXISTS status_changes (
+    storage_id INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    status TEXT NOT NULL,
+    ok INTEGER NOT NULL,
+    PRIMARY KEY (storage_id, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_status_changes_ts ON status_changes (ts);
+"""
+
+_ROLLUP_UPSERT = (
+    'INSERT INTO check_rollups (resolution, storage_id, bucket, total, ok_count, latency_sum, latency_max) '
+    'VALUES (?, ?, ?, 1, ?, ?, ?) '
+    'ON CONFLICT (resolution, storage_id, bucket) DO UPDATE SET '
+    'total = total + 1, ok_count = ok_count + excluded.ok_count, '
+    'latency_sum = latency_sum + excluded.latency_sum, latency_max = MAX(latency_max, excluded.latency_max)'
+)
+
+_last_prune = 0.0
+_prune_lock = threading.Lock()
+
+def _conn():
+    db.ensure_schema('history', _SCHEMA, path=db.HISTORY_DB_PATH)
+    return db.get_connection(db.HISTORY_DB_PATH)
+
+def _points_from_result(result):
+    """把一次检查结果展开为 (key, ok, status, latency_ms) 列表"""
+    points = []
+    latency_by_instance = {}
+    for r in result.get('instances', []):
+        latency_by_instance[r['name']] = r.get('elapsed_ms')
+        points.append((instance_key(r['name']), bool(r.get('success')), 'ok' if r.get('success') else 'unreachable',
+                       r.get('elapsed_ms')))
+    for s in result.get('storages', []):
+        latency = s.latency_ms if s.latency_ms is not None else latency_by_instance.get(s.instance)
+        points.append((storage_key(s.instance, s.name), s.status in ['work', 'disabled'], s.status, latency))
+    return points
+
+def record_check(result, ts=None):
+    """持久化一次检查结果中每个存储的数据点"""
+    ts = ts or time.time()
+    points = _points_from_result(result)
+    if not points:
+        return 0
+    conn = _conn()
+    buckets = [(resolution, int(ts // resolution) * resolution)
+               for resolution in (RESOLUTION_MINUTE, RESOLUTION_HOUR, RESOLUTION_DAY)]
+    with db.transaction(db.HISTORY_DB_PATH):
+        known = {r['storage_key']: r for r in conn.execute(
+            'SELECT id, storage_key, last_status, last_ok FROM history_storages')}
+        raw_rows, rollup_rows, changes, updates = [], [], [], []
+        for key, ok, status, latency in points:
+            row = known.get(key)
+            if row is None:
+                storage_id = conn.execute(
+                    'INSERT INTO history_storages (storage_key) VALUES (?)', (key,)
+                ).lastrowid
+                last_status = None
+            else:
+                storage_id, last_status = row['id'], row['last_status']
+            latency = float(latency or 0.0)
+            raw_rows.append((storage_id, ts, int(ok), status, latency))
+            for resolution, bucket in buckets:
+                rollup_rows.append((resolution, storage_id, bucket, int(ok), latency, latency))
+            if status != last_status:
+                changes.append((storage_id, ts, status, int(ok)))
+            updates.append((status, int(ok), ts, storage_id))
+        conn.executemany(
+            'INSERT OR REPLACE INTO check_points (storage_id, ts, ok, status, latency_ms) VALUES (?, ?, ?, ?, ?)', raw_rows)
+        conn.executemany(_ROLLUP_UPSERT, rollup_rows)
+        conn.executemany('INSERT OR REPLACE INTO status_changes (storage_id, ts, status, ok) VALUES (?, ?, ?, ?)', changes)
+        conn.executemany('UPDATE history_storages SET last_status = ?, last_ok = ?, last_seen = ? WHERE id = ?', updates)
+    _maybe_schedule_prune()
+    return len(points)
+
+# --- 查询 ---
+
+def _storage_ids(conn, key=None):
+    if key:
+        row = conn.execute('SELECT id, storage_key FROM history_storages WHERE storage_key = ?', (key,)).fetchone()
+        return {row['id']: row['storage_key']} if row else {}
+    return {r['id']: r['storage_key'] for r in conn.execute('SELECT id, storage_key FROM history_storages')}
+
+def _rollup_ranges(start, end):
+    """
+    把时间范围拆分为 [(resolution, bucket_from, bucket_to)]：
+    2 天以内用分钟汇总，更长的范围用小时汇总，超过 7 天时中间的整天部分改用天汇总。
+    """
+    if end - start <= 2 * RESOLUTION_DAY:
+        return [(RESOLUTION_MINUTE, int(start // RESOLUTION_MINUTE) * RESOLUTION_MINUTE, end)]
+    hour_start = int(start // RESOLUTION_HOUR) * RESOLUTION_HOUR
+    if end - start <= 7 * RESOLUTION_DAY:
+        return [(RESOLUTION_HOUR, hour_start, end)]
+    day_start = -(-hour_start // RESOLUTION_DAY) * RESOLUTION_DAY
+    day_end = int(end // RESOLUTION_DAY) * RESOLUTION_DAY
+    return [(RESOLUTION_HOUR, hour_start, day_start),
+            (RESOLUTION_DAY, day_start, day_end),
+            (RESOLUTION_HOUR, day_end, end)]
+
+def get_uptime(key=None, start=None, end=None):
+    """
+    计算时间范围内的可用率 (按检查次数)，返回每个存储的
+    {storage, uptime_pct, checks, avg_latency_ms, max_latency_ms}。
+    """
+    end = end or time.time()
+    start = start or end - 86400
+    conn = _conn()
+    ids = _storage_ids(conn, key)
+    if not ids:
+        return []
+    totals = {}
+    for resolution, bucket_from, bucket_to in _rollup_ranges(start, end):
+        if bucket_to <= bucket_from:
+            continue
+        params = [resolution, bucket_from, bucket_to]
+        # 查询单个存储时走主键；查询全部存储时按时间索引扫描，避免扫描整个粒度的所有行
+        where_storage, index_hint = '', 'INDEXED BY idx_check_rollups_bucket'
+        if key:
+            where_storage, index_hint = 'AND storage_id = ?', ''
+            params.append(next(iter(ids)))
+        rows = conn.execute(
+            'SELECT storage_id, SUM(total) AS total, SUM(ok_count) AS ok_count, SUM(latency_sum) AS latency_sum, '
+            f'MAX(latency_max) AS latency_max FROM check_rollups {index_hint} '
+            f'WHERE resolution = ? AND bucket >= ? AND bucket < ? {where_storage} GROUP BY storage_id', params
+        ).fetchall()
+        for r in rows:
+            acc = totals.setdefault(r['storage_id'], [0, 0, 0.0, 0.0])
+            acc[0] += r['total']
+            acc[1] += r['ok_count']
+            acc[2] += r['latency_sum']
+            acc[3] = max(acc[3], r['latency_max'])
+    return [{
+        'storage': ids[storage_id],
+        'uptime_pct': round(ok_count * 100.0 / total, 3) if total else None,
+        'checks': total,
+        'avg_latency_ms': round(latency_sum / total, 1) if total else None,
+        'max_latency_ms': latency_max,
+    } for storage_id, (total, ok_count, latency_sum, latency_max) in sorted(totals.items()) if storage_id in ids]
+
+def get_timeline(key, start=None, end=None):
+    """返回存储在时间范围内的状态时间线: [{status, ok, start, end}]"""
+    end = end or time.time()
+    start = start or end - 86400
+    conn = _conn()
+    ids = _storage_ids(conn, key)
+    if not ids:
+        return []
+    storage_id = next(iter(ids))
+    # 取范围开始前的最后一次状态作为初始状态
+    initial = conn.execute(
+        'SELECT ts, status, ok FROM status_changes WHERE storage_id = ? AND ts < ? ORDER BY ts DESC LIMIT 1',
+        (storage_id, start)
+    ).fetchone()
+    changes = conn.execute(
+        'SELECT ts, status, ok FROM status_changes WHERE storage_id = ? AND ts >= ? AND ts < ? ORDER BY ts',
+        (storage_id, start, end)
+    ).fetchall()
+    segments = []
+    if initial:
+        segments.append({'status': initial['status'], 'ok': bool(initial['ok']), 'start': start})
+    for c in changes:
+        if segments:
+            segments[-1]['end'] = c['ts']
+        segments.append({'status': c['status'], 'ok': bool(c['ok']), 'start': c['ts']})
+    if segments:
+        segments[-1]['end'] = end
+    return segments
+
+def get_mttr(key, start=None, end=None):
+    """根据时间线计算故障次数和平均恢复时间 (MTTR，秒)；仍未恢复的故障不计入 MTTR"""
+    timeline = get_timeline(key, start, end)
+    incidents, repair_times = 0, []
+    failing_since = None
+    for segment in timeline:
+        if not segment['ok'] and failing_since is None:
+            failing_since = segment['start']
+            incidents += 1
+        elif segment['ok'] and failing_since is not None:
+            repair_times.append(segment['start'] - failing_since)
+            failing_since = None
+    return {
+        'incidents': incidents,
+        'resolved': len(repair_times),
+        'mttr_seconds': round(sum(repair_times) / len(repair_times), 1) if repair_times else None,
+        'ongoing_since': failing_since,
+    }
+
+# --- 数据保留 ---
+
+def prune_history():
+    """按配置的保留天数删除过期的原始数据点和汇总"""
+    config = load_config()
+    now = time.time()
+    raw_days = float(config.get('HISTORY_RAW_RETENTION_DAYS', DEFAULT_RAW_RETENTION_DAYS))
+    minute_days = float(config.get('HISTORY_MINUTE_RETENTION_DAYS', DEFAULT_MINUTE_RETENTION_DAYS))
+    hour_days = float(config.get('HISTORY_HOUR_RETENTION_DAYS', DEFAULT_HOUR_RETENTION_DAYS))
+    conn = _conn()
+    with db.transaction(db.HISTORY_DB_PATH):
+        deleted = conn.execute('DELETE FROM check_points WHERE ts < ?', (now - raw_days * 86400,)).rowcount
+        deleted += conn.execute('DELETE FROM check_rollups WHERE resolution = ? AND bucket < ?',
+                                (RESOLUTION_MINUTE, now - minute_days * 86400)).rowcount
+        deleted += conn.execute('DELETE FROM check_rollups WHERE resolution IN (?, ?) AND bucket < ?',
+                                (RESOLUTION_HOUR, RESOLUTION_DAY, now - hour_days * 86400)).rowcount
+        deleted += conn.execute('DELETE FROM status_changes WHERE ts < ?', (now - hour_days * 86400,)).rowcount
+    if deleted:
+        logger.info(f"检查历史清理完成，删除 {deleted} 行过期数据")
+    return deleted
+
+def _run_prune():
+    try:
+        prune_history()
+    except Exception as e:
+        logger.error(f"检查历史清理失败: {e}")
+
+def _maybe_schedule_prune():
+    global _last_prune
+    now = time.monotonic()
+    if now - _last_prune < PRUNE_INTERVAL:
+        return
+    with _prune_lock:
+        if now - _last_prune < PRUNE_INTERVAL:
+            return
+        _last_prune = now
+    threading.Thread(target=_run_prune, name='history-prune', daemon=True).start()
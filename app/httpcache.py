@@ -0,0 +1,134 @@
+# app/httpcache.py
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from flask import request, Response
+from app import tracing
+from app.metrics import CACHE_REQUESTS
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只使用 gzip
+    brotli = None
+
+# --- 条件请求与压缩 ---
+# 仪表盘和脚本会反复请求存储状态、通知记录和配置，大多数时候数据没有变化。
+# 每个响应由调用方给出数据版本 (快照时间、文件签名、记录 id 范围)：
+# - 版本生成弱 ETag，配合 Last-Modified，客户端带 If-None-Match/If-Modified-Since 且数据未变时返回 304，
+#   不再序列化响应体；
+# - 超过 COMPRESS_MIN_SIZE 的响应按 Accept-Encoding 使用 brotli 或 gzip 压缩，
+#   序列化和压缩的结果按 (接口, 版本) 缓存在进程内，同一版本只压缩一次。
+
+COMPRESS_MIN_SIZE = 1024   # 字节
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+MAX_CACHED_BODIES = 64     # 通知记录的不同查询参数各占一项
+
+_bodies = OrderedDict()    # cache_key -> {'version': ..., 'raw': bytes, 'headers': {...}, 'encoded': {encoding: bytes}}
+_bodies_lock = threading.Lock()
+
+def _make_etag(cache_key, version):
+    return hashlib.sha1(f"{cache_key}|{version}".encode('utf-8')).hexdigest()[:24]
+
+def choose_encoding():
+    """按 Accept-Encoding 选择压缩方式 (忽略 q=0 的编码)，不支持压缩时返回 None"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br'] > 0:
+        return 'br'
+    if accepted['gzip'] > 0:
+        return 'gzip'
+    return None
+
+def _compress(raw, encoding):
+    if encoding == 'br':
+        return brotli.compress(raw, quality=BROTLI_QUALITY)
+    return gzip.compress(raw, compresslevel=GZIP_LEVEL)
+
+def _with_fields(raw, fields):
+    """把每次响应都不同的顶层字段加到缓存的 JSON 对象响应体前面"""
+    head = json.dumps(fields, ensure_ascii=False)
+    if raw.strip() == b'{}':
+        return head.encode('utf-8')
+    return f"{head[:-1]}, ".encode('utf-8') + raw.lstrip()[1:]
+
+def _cached_body(cache_key, version, build_body, encoding, fields=None):
+    """
+    返回 (响应体, 实际使用的编码, 额外响应头)，同一版本的原始和压缩结果只生成一次。
+    有 fields 时只缓存序列化结果，加入字段后的响应体每次重新压缩。
+    """
+    with _bodies_lock:
+        entry = _bodies.get(cache_key)
+        if entry is not None and entry['version'] == version:
+            _bodies.move_to_end(cache_key)
+        else:
+            entry = None
+    if entry is None:
+        CACHE_REQUESTS.labels(cache='http_body', result='miss').inc()
+        with tracing.span('http.build_body'):
+            body, headers = build_body(), None
+        if isinstance(body, tuple):
+            body, headers = body
+        entry = {'version': version, 'raw': body.encode('utf-8') if isinstance(body, str) else body,
+                 'headers': headers or {}, 'encoded': {}}
+        with _bodies_lock:
+            _bodies[cache_key] = entry
+            _bodies.move_to_end(cache_key)
+            while len(_bodies) > MAX_CACHED_BODIES:
+                _bodies.popitem(last=False)
+    else:
+        CACHE_REQUESTS.labels(cache='http_body', result='hit').inc()
+    if fields:
+        raw = _with_fields(entry['raw'], fields)
+        if encoding is None or len(raw) < COMPRESS_MIN_SIZE:
+            return raw, None, entry['headers']
+        with tracing.span('http.compress'):
+            return _compress(raw, encoding), encoding, entry['headers']
+    if encoding is None or len(entry['raw']) < COMPRESS_MIN_SIZE:
+        return entry['raw'], None, entry['headers']
+    encoded = entry['encoded'].get(encoding)
+    if encoded is None:
+        # 多个线程同时压缩同一版本时结果相同，后写入的覆盖即可
+        with tracing.span('http.compress'):
+            encoded = entry['encoded'][encoding] = _compress(entry['raw'], encoding)
+    return encoded, encoding, entry['headers']
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        # 有 If-None-Match 时忽略 If-Modified-Since (RFC 9110)
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return since is not None and last_modified is not None and int(last_modified) <= since.timestamp()
+
+def conditional_response(cache_key, version, build_body, last_modified=None, mimetype='application/json', headers=None,
+                         fields=None):
+    """
+    返回支持条件请求和压缩的响应。
+    version 为数据版本 (任意可转换为字符串的值)，变化时 ETag 随之变化；
+    build_body 只在缓存中没有该版本时调用，返回 str 或 bytes，需要额外响应头时返回 (响应体, 响应头)。
+    调用方应先取得版本再读取数据，这样数据在两者之间变化时缓存的只会是比版本更新的内容。
+    last_modified 为 epoch 秒，headers 为每次响应都要附加的响应头 (304 响应也会附加)。
+    fields 为每次响应都不同、但不影响 ETag 的顶层字段 (例如快照年龄)，加入 build_body 返回的 JSON 对象中。
+    """
+    etag = _make_etag(cache_key, version)
+    if _not_modified(etag, last_modified):
+        CACHE_REQUESTS.labels(cache='http_conditional', result='hit').inc()
+        response = Response(status=304)
+    else:
+        CACHE_REQUESTS.labels(cache='http_conditional', result='miss').inc()
+        body, encoding, body_headers = _cached_body(cache_key, version, build_body, choose_encoding(), fields)
+        response = Response(body, mimetype=mimetype)
+        response.headers.update(body_headers)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = datetime.fromtimestamp(last_modified, tz=timezone.utc)
+    # 只允许浏览器缓存 (接口需要登录)，每次使用前都需要重新验证
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    for name, value in (headers or {}).items():
+        response.headers[name] = value
+    return response
@@ -0,0 +1,265 @@
+# app/leader.py
+import os
+import time
+import fcntl
+import atexit
+import logging
+import threading
+from app import db, startup
+from app.config import DATA_DIR, load_monitor_status
+from app.metrics import SCHEDULER_SKIPPED_RUNS
+
+logger = logging.getLogger(__name__)
+
+# --- 调度器选主 ---
+# gunicorn 的每个 worker 都运行一个选主线程，抢占 /data/scheduler.lock 上的排它文件锁 (flock)，
+# 只有拿到锁的 worker (leader) 运行 BackgroundScheduler。
+# 其它 worker 收到启动/停止监控的请求时只修改共享数据库中的监控状态 (app/state.py 的 monitor_state 表)，leader 定期读取并调整任务，
+# 因此任意 worker 处理的请求都会作用到唯一的调度器上。
+# leader 退出时 (正常退出调用 resign()，崩溃时由操作系统) 释放锁，其它 worker 在下一轮选主时接管。
+
+JOB_ID = 'alist_monitor_job'
+JOBSTORE_PATH = os.path.join(DATA_DIR, 'alist_monitor.sqlite')
+LOCK_PATH = os.path.join(DATA_DIR, 'scheduler.lock')
+ELECTION_INTERVAL = 2  # 秒，抢锁和 leader 检查期望状态的间隔
+
+# 任务的重叠与错过策略：
+# - max_instances=1: 上一次检查还没结束时跳过本次 (记为 overlap)；
+# - coalesce=True: 错过的多次执行 (leader 切换、进程暂停) 合并为一次 (合并掉的次数记为 coalesced)；
+# - misfire_grace_time=检查间隔: 超过一个间隔仍未执行的不再补跑 (记为 misfire)。
+# 每次检查另有端到端的截止时间 (CHECK_DEADLINE)，正常情况下不会与下一次重叠。
+JOB_MAX_INSTANCES = 1
+JOB_COALESCE = True
+
+SKIP_OVERLAP = 'overlap'
+SKIP_MISFIRE = 'misfire'
+SKIP_COALESCED = 'coalesced'
+SKIP_BUDGET = 'budget'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduler_run_stats (
+    reason TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    last_at REAL NOT NULL
+);
+"""
+
+_lock = threading.Lock()
+_stop_event = threading.Event()
+_election_pid = None
+_lock_file = None
+_scheduler = None
+_applied = None  # leader 当前已应用的 (interval, version)
+_expected_run_time = None  # 任务下一次应当执行的时间，用于计算被合并的执行次数
+
+def is_leader():
+    return _scheduler is not None and _election_pid == os.getpid()
+
+def scheduler_ready():
+    """调度器是否在运行：本进程是 leader 且调度器已启动，或锁文件中的 leader 进程仍然存在"""
+    scheduler = _scheduler
+    if scheduler is not None and _election_pid == os.getpid():
+        return scheduler.running
+    info = get_leader_info()
+    if info is None or info['pid'] == os.getpid():
+        return False
+    try:
+        os.kill(info['pid'], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def get_leader_info():
+    """返回当前 leader 的 pid 和成为 leader 的时间 (读取锁文件内容)，没有 leader 信息时返回 None"""
+    try:
+        with open(LOCK_PATH, 'r') as f:
+            pid, since = f.read().split()
+        return {'pid': int(pid), 'since': float(since)}
+    except (OSError, ValueError):
+        return None
+
+# --- 跳过/合并的执行次数 ---
+
+def record_skipped_run(reason, count=1):
+    """累加被跳过或合并的定时检查次数 (保存在共享数据库中，任意 worker 都能查询)"""
+    if count <= 0:
+        return
+    SCHEDULER_SKIPPED_RUNS.labels(reason=reason).inc(count)
+    db.ensure_schema('leader', _SCHEMA)
+    db.get_connection().execute(
+        'INSERT INTO scheduler_run_stats (reason, count, last_at) VALUES (?, ?, ?) '
+        'ON CONFLICT(reason) DO UPDATE SET count = count + excluded.count, last_at = excluded.last_at',
+        (reason, count, time.time())
+    )
+
+def get_run_stats():
+    """各原因被跳过/合并的次数 {reason: {'count', 'last_at'}}"""
+    db.ensure_schema('leader', _SCHEMA)
+    rows = db.get_connection().execute('SELECT reason, count, last_at FROM scheduler_run_stats').fetchall()
+    return {row['reason']: {'count': row['count'], 'last_at': row['last_at']} for row in rows}
+
+def _remember_next_run(job):
+    global _expected_run_time
+    _expected_run_time = job.next_run_time if job is not None else None
+
+def _on_job_event(event):
+    from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
+    if event.job_id != JOB_ID:
+        return
+    try:
+        if event.code == EVENT_JOB_MISSED:
+            logger.warning(f"定时检查错过了计划时间 {event.scheduled_run_time}，已跳过")
+            record_skipped_run(SKIP_MISFIRE)
+            return
+        job = _scheduler.get_job(JOB_ID) if _scheduler is not None else None
+        run_time = event.scheduled_run_times[-1]
+        if job is not None and _expected_run_time is not None and run_time > _expected_run_time:
+            # coalesce 只提交最后一个计划时间，之前错过的几次被合并掉
+            interval = job.trigger.interval.total_seconds()
+            record_skipped_run(SKIP_COALESCED, round((run_time - _expected_run_time).total_seconds() / interval))
+        if event.code == EVENT_JOB_MAX_INSTANCES:
+            record_skipped_run(SKIP_OVERLAP)
+        _remember_next_run(job)
+    except Exception as e:
+        logger.error(f"记录调度事件失败: {e}")
+
+def _try_acquire():
+    global _lock_file
+    os.makedirs(DATA_DIR, exist_ok=True)
+    f = open(LOCK_PATH, 'a+')
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    f.seek(0)
+    f.truncate()
+    f.write(f"{os.getpid()} {time.time()}\n")
+    f.flush()
+    _lock_file = f
+    return True
+
+def _release():
+    global _lock_file
+    if _lock_file is None:
+        return
+    try:
+        fcntl.flock(_lock_file.fileno(), fcntl.LOCK_UN)
+    finally:
+        _lock_file.close()
+        _lock_file = None
+
+def _become_leader():
+    global _scheduler, _applied
+    if _stop_event.is_set():
+        _release()
+        return
+    # 调度器在成为 leader 之后才创建，避免 --preload 的 master 进程持有数据库连接和线程；
+    # APScheduler 和 SQLAlchemy 也在这里才导入，其它 worker 和 master 进程不需要加载它们
+    started = time.perf_counter()
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+    from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
+    startup.record('scheduler_import', started)
+    started = time.perf_counter()
+    scheduler = BackgroundScheduler(
+        jobstores={'default': SQLAlchemyJobStore(url=f'sqlite:///{JOBSTORE_PATH}')},
+        timezone="Asia/Shanghai"
+    )
+    scheduler.add_listener(_on_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
+    # 以暂停状态启动，reconcile() 接管或添加任务并记下计划时间后再恢复，
+    # 否则上一个 leader 留下的过期任务会在接管前就被执行，无法计算合并掉的次数
+    scheduler.start(paused=True)
+    _scheduler, _applied = scheduler, None
+    logger.info(f"进程 {os.getpid()} 成为调度器 leader。")
+    reconcile()
+    scheduler.resume()
+    startup.record('scheduler_start', started)
+    startup.log_breakdown("调度器启动完成", ('scheduler_import', 'scheduler_start'))
+
+def reconcile():
+    """leader 根据 monitor_state 表 (app/state.py) 中的期望状态添加、调整或移除监控任务；非 leader 调用时不做任何事"""
+    global _applied
+    with _lock:
+        if not is_leader():
+            return
+        status = load_monitor_status()
+        interval = int(status['interval']) if status.get('is_monitoring') and status.get('interval') else None
+        job = _scheduler.get_job(JOB_ID)
+        if interval is None:
+            if job:
+                _scheduler.remove_job(JOB_ID)
+                logger.info("后台监控任务已移除。")
+            _applied = None
+            return
+        desired = (interval, status['version'])
+        if job and desired == _applied:
+            return
+        if job and _applied is None and job.trigger.interval.total_seconds() == interval \
+                and job.max_instances == JOB_MAX_INSTANCES and job.coalesce == JOB_COALESCE:
+            # 接管上一个 leader 留在任务存储中的任务，保持原有的执行节奏
+            # (错过的执行由 coalesce 合并，_on_job_event 中计入 coalesced)
+            _applied = desired
+            _remember_next_run(job)
+            logger.info(f"已接管后台监控任务，间隔: {interval}秒")
+            return
+        # 之后每次执行结束时由 schedule_next() 按自适应轮询的结果调整下一次的时间
+        job = _scheduler.add_job(
+            func='app.monitor:monitor_task', trigger='interval', seconds=interval, id=JOB_ID,
+            replace_existing=True, max_instances=JOB_MAX_INSTANCES, coalesce=JOB_COALESCE,
+            misfire_grace_time=interval
+        )
+        _applied = desired
+        _remember_next_run(job)
+        logger.info(f"后台监控任务已启动，间隔: {interval}秒")
+
+def schedule_next(delay):
+    """把监控任务的下一次执行设置为 delay 秒之后 (由正在执行的监控任务调用，只在 leader 中生效)"""
+    with _lock:
+        if not is_leader() or _scheduler.get_job(JOB_ID) is None:
+            return
+        _remember_next_run(_scheduler.reschedule_job(JOB_ID, trigger='interval', seconds=max(1, round(delay))))
+
+def _election_loop():
+    while not _stop_event.is_set():
+        try:
+            if _scheduler is None:
+                if _try_acquire():
+                    _become_leader()
+            else:
+                reconcile()
+        except Exception as e:
+            logger.error(f"调度器选主/同步失败: {e}", exc_info=True)
+        _stop_event.wait(ELECTION_INTERVAL)
+
+def start_election():
+    """在当前进程中启动选主线程 (幂等，fork 之后的新进程会重新启动)"""
+    global _election_pid, _scheduler, _lock_file, _applied
+    if _election_pid == os.getpid():
+        return
+    with _lock:
+        if _election_pid == os.getpid():
+            return
+        # 从父进程继承的状态在子进程中无效
+        _election_pid, _scheduler, _lock_file, _applied = os.getpid(), None, None, None
+        _stop_event.clear()
+    atexit.register(resign)
+    threading.Thread(target=_election_loop, name='scheduler-election', daemon=True).start()
+
+def resign():
+    """停止调度器 (等待正在执行的任务完成) 并释放锁，让其它 worker 接管"""
+    global _scheduler
+    if _election_pid != os.getpid():
+        return
+    _stop_event.set()
+    with _lock:
+        scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        try:
+            scheduler.shutdown(wait=True)
+        except Exception as e:
+            logger.error(f"关闭调度器失败: {e}")
+        logger.info(f"进程 {os.getpid()} 已退出调度器 leader。")
+    _release()
@@ -0,0 +1,322 @@
+# app/logs.py
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# --- 日志输出 ---
+# 请求线程和调度线程中的 logger.xxx() 只把日志记录放入队列 (队列满时丢弃并计数，不会阻塞)，
+# 由每个进程中的一个监听线程完成格式化 (包括 exc_info 的堆栈)、输出到 stderr 以及写入日志缓冲区。
+# Alist 故障期间 Docker 日志驱动写入变慢时，不会再拖慢请求和检查。
+# - LOG_FORMAT 为 text (默认，与原来的格式相同) 或 json (每行一个 JSON 对象)；
+# - 警告及以上级别的相同日志 (同一 logger、级别、消息和异常类型) 在 LOG_DEDUP_WINDOW 秒内只输出第一条，
+#   之后每个窗口输出一条带有省略次数的汇总；
+# - 最近 LOG_RING_SIZE 条日志批量写入共享数据库 (/data/logs.sqlite)，所有 worker 的日志都可以通过
+#   /api/admin/logs 分页查询，不需要 docker logs。
+# 监听线程在进程中第一次输出日志时启动，fork 之后的 worker 会使用新的队列重新启动。
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+QUEUE_SIZE = 10000
+FLUSH_INTERVAL = 1.0              # 秒，写入日志缓冲区和输出去重汇总的间隔
+RING_BATCH = 200                  # 积累到该条数时立即写入日志缓冲区
+SETTINGS_REFRESH_INTERVAL = 5.0   # 秒
+MAX_DEDUP_KEYS = 1000
+DEFAULT_DEDUP_WINDOW = 60
+DEFAULT_RING_SIZE = 2000
+DEFAULT_RING_LEVEL = 'INFO'
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    pid INTEGER NOT NULL,
+    level TEXT NOT NULL,
+    levelno INTEGER NOT NULL,
+    logger TEXT NOT NULL,
+    message TEXT NOT NULL,
+    exc_text TEXT
+);
+"""
+
+def _ensure_schema():
+    from app import db
+    db.ensure_schema('log_records', _SCHEMA, path=db.LOG_DB_PATH)
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        repeated = getattr(record, 'repeated', None)
+        if repeated:
+            entry['repeated'] = repeated
+        return json.dumps(entry, ensure_ascii=False)
+
+class _Handler(QueueHandler):
+    """安装在 root logger 上，只复制日志记录并放入本进程的队列"""
+
+    def __init__(self, stream=None):
+        super().__init__(None)
+        self.stream = stream
+        self.pid = None
+        self.listener = None
+        self.dropped = 0
+
+    def _ensure_listener(self):
+        # emit 在 Handler 的锁内调用 (logging 在 fork 之后会重新初始化该锁)，这里不需要另外加锁；
+        # 父进程的监听线程不会被 fork 到子进程中，子进程使用新的队列，父进程队列中剩余的日志由父进程输出
+        if self.pid == os.getpid():
+            return
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.listener = _Listener(self.queue, self)
+        self.listener.start()
+        self.pid = os.getpid()
+
+    def prepare(self, record):
+        # 只合并消息参数，异常堆栈留给监听线程格式化 (被去重省略的日志不需要格式化)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        self._ensure_listener()
+        super().emit(record)
+
+    def close(self):
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+        super().close()
+
+class _Listener(QueueListener):
+    def __init__(self, q, source):
+        super().__init__(q)
+        self.source = source
+        self.output = logging.StreamHandler(source.stream)
+        self.settings = None
+        self.settings_loaded_at = 0.0
+        self.dedup = {}   # (logger, 级别, 消息, 异常类型) -> [窗口开始时间, 省略次数, 最后一条记录]
+        self.ring = []
+        self.last_flush = time.monotonic()
+        self.dropped_reported = 0
+        self.ring_error_at = 0.0
+
+    def dequeue(self, block):
+        # 队列空闲时也要定期写入日志缓冲区、输出去重汇总
+        while True:
+            try:
+                return self.queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                self.flush()
+
+    def _get_settings(self):
+        now = time.monotonic()
+        if self.settings is not None and now - self.settings_loaded_at < SETTINGS_REFRESH_INTERVAL:
+            return self.settings
+        settings = dict(self.settings or {})
+        try:
+            from app.config import load_config
+            config = load_config()
+            ring_level = logging.getLevelName(str(config.get('LOG_RING_LEVEL', DEFAULT_RING_LEVEL)).upper())
+            settings.update(
+                format=str(config.get('LOG_FORMAT', 'text')).lower(),
+                dedup_window=float(config.get('LOG_DEDUP_WINDOW', DEFAULT_DEDUP_WINDOW)),
+                ring_size=int(config.get('LOG_RING_SIZE', DEFAULT_RING_SIZE)),
+                ring_level=ring_level if isinstance(ring_level, int) else logging.INFO,
+            )
+        except Exception as e:
+            self._stderr(f"读取日志配置失败: {e}")
+        for key, value in (('format', 'text'), ('dedup_window', DEFAULT_DEDUP_WINDOW),
+                           ('ring_size', DEFAULT_RING_SIZE), ('ring_level', logging.INFO)):
+            settings.setdefault(key, value)
+        if settings['format'] != (self.settings or {}).get('format'):
+            self.output.setFormatter(JsonFormatter() if settings['format'] == 'json' else logging.Formatter(TEXT_FORMAT))
+        self.settings, self.settings_loaded_at = settings, now
+        return settings
+
+    def handle(self, record):
+        settings = self._get_settings()
+        if not self._suppress(record, settings['dedup_window']):
+            self._output(record)
+        if len(self.ring) >= RING_BATCH or time.monotonic() - self.last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def _suppress(self, record, window):
+        """相同的警告/错误在窗口内重复出现时返回 True (只计数，不输出)"""
+        if window <= 0 or record.levelno < logging.WARNING:
+            return False
+        key = (record.name, record.levelno, record.msg, record.exc_info[0] if record.exc_info else None)
+        now = time.monotonic()
+        entry = self.dedup.get(key)
+        if entry is not None and now - entry[0] >= window:
+            entry = self._expire(key, entry, now, window)
+        if entry is None:
+            if len(self.dedup) < MAX_DEDUP_KEYS:
+                self.dedup[key] = [now, 0, record]
+            return False
+        entry[1] += 1
+        entry[2] = record
+        return True
+
+    def _expire(self, key, entry, now, window):
+        """窗口结束：有省略的日志时输出汇总并开始新的窗口，否则删除该项"""
+        if not entry[1]:
+            del self.dedup[key]
+            return None
+        last = entry[2]
+        summary = copy.copy(last)
+        summary.msg = f"{last.msg} (过去 {window:.0f} 秒内重复 {entry[1]} 次，已省略)"
+        summary.exc_info, summary.exc_text, summary.created = None, None, time.time()
+        summary.repeated = entry[1]
+        self._output(summary)
+        entry[:] = [now, 0, last]
+        return entry
+
+    def _output(self, record):
+        self.output.handle(record)
+        settings = self.settings
+        if settings['ring_size'] > 0 and record.levelno >= settings['ring_level']:
+            if record.exc_info and not record.exc_text:
+                record.exc_text = self.output.formatter.formatException(record.exc_info)
+            self.ring.append((record.created, record.process, record.levelname, record.levelno,
+                              record.name, record.getMessage(), record.exc_text))
+
+    def flush(self, final=False):
+        settings = self._get_settings()
+        now = time.monotonic()
+        window = settings['dedup_window']
+        for key, entry in list(self.dedup.items()):
+            if final or now - entry[0] >= window:
+                self._expire(key, entry, now, window)
+        dropped = self.source.dropped
+        if dropped > self.dropped_reported:
+            self._output(logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f"日志队列已满，丢弃了 {dropped - self.dropped_reported} 条日志",
+            }))
+            self.dropped_reported = dropped
+        self._write_ring(settings['ring_size'])
+        self.last_flush = now
+
+    def _write_ring(self, size):
+        if not self.ring:
+            return
+        rows, self.ring = self.ring, []
+        if size <= 0:
+            return
+        try:
+            from app import db
+            _ensure_schema()
+            with db.transaction(db.LOG_DB_PATH) as conn:
+                conn.executemany(
+                    'INSERT INTO log_records (created_at, pid, level, levelno, logger, message, exc_text) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', rows[-size:]
+                )
+                last_id = conn.execute('SELECT MAX(id) FROM log_records').fetchone()[0]
+                conn.execute('DELETE FROM log_records WHERE id <= ?', (last_id - size,))
+        except Exception as e:
+            self._stderr(f"写入日志缓冲区失败: {e}")
+
+    def _stderr(self, message):
+        # 监听线程自身的错误不能再通过 logging 输出，直接写 stderr (每分钟最多一次)
+        now = time.monotonic()
+        if now - self.ring_error_at >= 60:
+            self.ring_error_at = now
+            print(f"{datetime.now().isoformat(sep=' ', timespec='seconds')} - {__name__} - ERROR - {message}",
+                  file=sys.stderr, flush=True)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(self._sentinel, timeout=1)
+        except queue.Full:
+            pass
+        self._thread.join(5)
+        stopped = not self._thread.is_alive()
+        self._thread = None
+        if stopped:
+            self.flush(final=True)
+
+def create_handler(stream=None):
+    """创建队列日志处理器 (stream 默认为 stderr)"""
+    return _Handler(stream)
+
+def setup(level=logging.INFO):
+    """
+    为 root logger 安装队列日志处理器，代替 logging.basicConfig。
+    与 basicConfig 相同，root logger 已经有处理器时不做任何事。
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+    handler = create_handler()
+    root.addHandler(handler)
+    root.setLevel(level)
+    # 进程退出前输出队列中剩余的日志
+    atexit.register(handler.close)
+    return handler
+
+# --- 查询日志缓冲区 ---
+
+def query_logs(limit=DEFAULT_PAGE_SIZE, cursor=None, level=None, logger_name=None, pid=None, search=None):
+    """
+    按 id 倒序分页查询日志缓冲区，参数与 query_notifications 相同的分页方式；
+    level 为最低级别 (如 WARNING)，logger_name 同时匹配其子 logger，search 为消息中包含的文本。
+    返回 (records, next_cursor)。
+    """
+    from app import db
+    _ensure_schema()
+    limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    clauses, params = [], []
+    if cursor:
+        clauses.append('id < ?')
+        params.append(int(cursor))
+    if level:
+        levelno = logging.getLevelName(level.upper())
+        if not isinstance(levelno, int):
+            raise ValueError(f"未知的日志级别 {level}")
+        clauses.append('levelno >= ?')
+        params.append(levelno)
+    if logger_name:
+        clauses.append("(logger = ? OR substr(logger, 1, ?) = ?)")
+        params.extend((logger_name, len(logger_name) + 1, f"{logger_name}."))
+    if pid:
+        clauses.append('pid = ?')
+        params.append(int(pid))
+    if search:
+        clauses.append('instr(message, ?) > 0')
+        params.append(search)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    rows = db.get_connection(db.LOG_DB_PATH).execute(
+        f'SELECT * FROM log_records {where} ORDER BY id DESC LIMIT ?', (*params, limit + 1)
+    ).fetchall()
+    records = [dict(row) for row in rows[:limit]]
+    next_cursor = records[-1]['id'] if len(rows) > limit else None
+    return records, next_cursor
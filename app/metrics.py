@@ -0,0 +1,82 @@
+# app/metrics.py
+import os
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+)
+from prometheus_client import multiprocess
+
+# --- Prometheus 指标 ---
+# gunicorn 多进程部署时需要设置 PROMETHEUS_MULTIPROC_DIR (Dockerfile 中已设置)，
+# 各进程把指标写入该目录下的 mmap 文件，/metrics 读取时汇总所有进程的数据。
+# 未设置时 (本地调试) 退化为单进程的默认注册表。
+
+_FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+_NETWORK_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0, 60.0)
+
+ALIST_FETCH_SECONDS = Histogram(
+    'alist_monitor_alist_fetch_seconds', '请求 Alist 存储列表的耗时',
+    ['instance', 'outcome'], buckets=_NETWORK_BUCKETS
+)
+ALIST_RETRIES = Counter(
+    'alist_monitor_http_retries_total', 'HTTP 请求的重试次数', ['target']
+)
+ALIST_RETRIES_DENIED = Counter(
+    'alist_monitor_alist_retries_denied_total', '因重试预算不足或临近截止时间而放弃的 Alist 重试次数', ['reason']
+)
+SCHEDULER_SKIPPED_RUNS = Counter(
+    'alist_monitor_scheduler_skipped_runs_total', '被跳过或合并的定时检查次数', ['reason']
+)
+PROBE_SECONDS = Histogram(
+    'alist_monitor_probe_seconds', '挂载点深度探测 (列目录/下载) 的耗时', ['kind', 'outcome'], buckets=_NETWORK_BUCKETS
+)
+MONITOR_TASK_SECONDS = Histogram(
+    'alist_monitor_task_seconds', '后台监控任务单次执行的耗时', buckets=_NETWORK_BUCKETS
+)
+MONITOR_TASK_FAILURES = Counter(
+    'alist_monitor_task_failures_total', '后台监控任务执行出错的次数'
+)
+NOTIFICATION_SEND_SECONDS = Histogram(
+    'alist_monitor_notification_send_seconds', '发送通知的耗时', ['channel', 'outcome'], buckets=_NETWORK_BUCKETS
+)
+JSON_FILE_SECONDS = Histogram(
+    'alist_monitor_json_file_seconds', '读写 JSON 配置文件的耗时', ['file', 'operation'], buckets=_FAST_BUCKETS
+)
+CACHE_REQUESTS = Counter(
+    'alist_monitor_cache_requests_total', '缓存命中/未命中次数', ['cache', 'result']
+)
+STORAGES_BY_STATUS = Gauge(
+    'alist_monitor_storages', '最近一次检查中各状态的存储数量', ['status'], multiprocess_mode='mostrecent'
+)
+
+# 各 worker 都可能写入存储数量，而汇总时只取最近一次写入的值 (mostrecent)。
+# 出现过的状态记录在共享数据库中，每次都为所有状态写入数量，
+# 其它 worker 见过、本次检查中已没有的状态也会被置 0。
+_STATUS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metric_storage_statuses (
+    status TEXT PRIMARY KEY
+);
+"""
+
+def observe_storage_statuses(storages):
+    """根据最近一次检查结果更新各状态的存储数量 (任一进程出现过、本次没有的状态置 0)"""
+    from app import db  # app.config 导入了本模块，延迟导入避免循环导入
+    counts = {}
+    for s in storages:
+        counts[s.status] = counts.get(s.status, 0) + 1
+    db.ensure_schema('metric_storage_statuses', _STATUS_SCHEMA)
+    conn = db.get_connection()
+    known = {row['status'] for row in conn.execute('SELECT status FROM metric_storage_statuses')}
+    new = [status for status in counts if status not in known]
+    if new:
+        conn.executemany('INSERT OR IGNORE INTO metric_storage_statuses (status) VALUES (?)', [(s,) for s in new])
+    for status in known.union(counts):
+        STORAGES_BY_STATUS.labels(status=status).set(counts.get(status, 0))
+
+def render_metrics():
+    """返回 (响应体, Content-Type)"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
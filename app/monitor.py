@@ -1,16 +1,31 @@
 # app/monitor.py
-import requests
 import json
 import logging
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from app.config import load_config, load_monitor_status, save_monitor_status, add_notification_record
+from app.config import load_config, load_monitor_status
+from app.state import increment_check_count
+from app.notifications import add_notification_record
+from app import snapshot, alerts, dispatch, history, events, leader, polling, probes, resilience, tgphotos, tracing
+from app.storages import StorageRecord, last_changed
+from app.metrics import (
+    ALIST_FETCH_SECONDS, ALIST_RETRIES, ALIST_RETRIES_DENIED, MONITOR_TASK_SECONDS, MONITOR_TASK_FAILURES,
+    NOTIFICATION_SEND_SECONDS, CACHE_REQUESTS, observe_storage_statuses
+)
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Telegram Bot API 地址，可通过 TG_API_BASE 改为自建的 Bot API 服务或反向代理
+DEFAULT_TG_API_BASE = 'https://api.telegram.org'
+
+# 通知渠道：NOTIFICATION_CHANNELS 为同时发送的渠道列表，未设置时使用界面中选择的 NOTIFICATION_METHOD
+CHANNEL_NAMES = {'tg': 'Telegram', 'wecom': '企业微信', 'webhook': 'Webhook'}
+# 每个渠道的请求超时 (秒)，可通过 NOTIFY_TIMEOUTS 覆盖
+DEFAULT_NOTIFY_TIMEOUTS = {'tg': 15, 'wecom': 10, 'webhook': 10}
+
 # --- 1. 消息模板定义 (已更新图片链接) ---
 MESSAGE_TEMPLATES = {
     'start': {
@@ -28,14 +43,21 @@ MESSAGE_TEMPLATES = {
     'test': {
         'title': '✅ 连接测试',
         'picurl': 'https://tc.z.wiki/autoupload/f/VGYUFUfjLTRdneshf7trSU1pPk5D901eM2bYIJnvuwCyl5f0KlZfm6UsKj-HyTuv/20250706/3XAw/400X320/%E7%B3%BB%E7%BB%9F%E6%B5%8B%E8%AF%951-min.jpg'
+    },
+    'recovery': {
+        'title': '✅ 存储已恢复正常',
+        'picurl': None   # 没有专用的恢复图片，不附带图片
     }
 }
 
 # --- 2. 核心发送函数 (已修正) ---
 
-def _send_tg_notification(token, chat_id, title, details, picurl):
+def _send_tg_notification(token, chat_id, title, details, picurl, api_base=DEFAULT_TG_API_BASE, timeout=15,
+                          image_path=None):
     """
     为Telegram生成并发送带图片的消息 (使用 sendPhoto 方法)
+    图片优先使用缓存的 file_id，其次上传本地图片 image_path，最后才让 Telegram 下载 picurl；
+    两者都没有时使用 sendMessage 只发送文字
     """
     # 组合标题和详情，并使用 Telegram 支持的 HTML 标签
     details_html = details.replace('\n', '<br>')
@@ -43,21 +65,44 @@ def _send_tg_notification(token, chat_id, title, details, picurl):
     caption_html = f"<b>{title}</b><br><br>{details_html}"
 
     # 使用正确的 sendPhoto 方法
-    url = f"https://api.telegram.org/bot{token}/sendPhoto"
+    url = f"{api_base}/bot{token}/sendPhoto"
 
     # 构建请求体
     payload = {
         'chat_id': chat_id,
-        'photo': picurl,          # 图片 URL
         'caption': caption_html,  # 格式化的标题和描述
         'parse_mode': 'HTML'
     }
 
     try:
-        # 使用 POST 发送请求，并适当增加超时时间
-        response = session.post(url, json=payload, timeout=15)
-        response.raise_for_status()
-        result = response.json()
+        bot = tgphotos.bot_id(token)
+        source = tgphotos.image_source(picurl, image_path)
+        file_id = tgphotos.get_file_id(bot, source) if source else None
+        result = None
+        if file_id:
+            response = _get_channel_session('tg').post(url, json=dict(payload, photo=file_id), timeout=timeout)
+            if response.status_code == 400:
+                # file_id 已失效 (例如更换了 bot)，删除缓存后按原图片重新发送
+                tgphotos.forget(bot, source)
+            else:
+                response.raise_for_status()
+                result = response.json()
+        if result is None:
+            if image_path:
+                with open(image_path, 'rb') as f:
+                    response = _get_channel_session('tg').post(
+                        url, data=payload, files={'photo': (os.path.basename(image_path), f)}, timeout=timeout
+                    )
+            elif not picurl:
+                text_payload = {'chat_id': chat_id, 'text': caption_html, 'parse_mode': 'HTML'}
+                response = _get_channel_session('tg').post(f"{api_base}/bot{token}/sendMessage", json=text_payload,
+                                                           timeout=timeout)
+            else:
+                response = _get_channel_session('tg').post(url, json=dict(payload, photo=picurl), timeout=timeout)
+            response.raise_for_status()
+            result = response.json()
+            if result.get('ok') and source:
+                tgphotos.remember(bot, source, result)
         if result.get('ok'):
             logger.info("Telegram 图片通知发送成功")
             return True
@@ -70,7 +115,7 @@ def _send_tg_notification(token, chat_id, title, details, picurl):
         return False
 
 
-def _send_wecom_notification(webhook, title, details, picurl):
+def _send_wecom_notification(webhook, title, details, picurl, timeout=10):
     """为企业微信生成并发送图文卡片(news)消息"""
     data = {
         "msgtype": "news",
@@ -86,7 +131,9 @@ def _send_wecom_notification(webhook, title, details, picurl):
         }
     }
     try:
-        response = session.post(webhook, headers={"Content-Type": "application/json"}, json=data, timeout=10)
+        response = _get_channel_session('wecom').post(
+            webhook, headers={"Content-Type": "application/json"}, json=data, timeout=timeout
+        )
         response.raise_for_status()
         result = response.json()
         if result.get('errcode') == 0:
@@ -99,18 +146,74 @@ def _send_wecom_notification(webhook, title, details, picurl):
         logger.error(f"发送企业微信图文通知失败: {e}")
         return False
 
+def _send_webhook_notification(url, headers, title, details, picurl, timeout=10):
+    """向通用 Webhook 发送 JSON 消息，返回 2xx 即视为成功"""
+    data = {
+        "title": title,
+        "details": details,
+        "picurl": picurl,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+    try:
+        response = _get_channel_session('webhook').post(url, headers=headers or {}, json=data, timeout=timeout)
+        response.raise_for_status()
+        logger.info("Webhook 通知发送成功")
+        return True
+    except Exception as e:
+        logger.error(f"发送 Webhook 通知失败: {e}")
+        return False
+
+# 每个渠道使用独立的 Session (独立的连接池)，不做 HTTP 层重试：
+# 失败由 app.dispatch 按次数退避重试，并计入渠道的熔断器。
+# requests 在第一次创建 Session 时才导入，不拖慢应用启动
+_channel_sessions = {}
+_channel_sessions_lock = threading.Lock()
+
+def _get_channel_session(channel):
+    import requests
+    from requests.adapters import HTTPAdapter
+    with _channel_sessions_lock:
+        channel_session = _channel_sessions.get(channel)
+        if channel_session is None:
+            channel_session = requests.Session()
+            adapter = HTTPAdapter(max_retries=0, pool_maxsize=4)
+            channel_session.mount('http://', adapter)
+            channel_session.mount('https://', adapter)
+            _channel_sessions[channel] = channel_session
+        return channel_session
+
+def _channel_timeout(channel, config):
+    timeouts = config.get('NOTIFY_TIMEOUTS') or {}
+    return float(timeouts.get(channel, DEFAULT_NOTIFY_TIMEOUTS.get(channel, 10)))
+
+def get_notification_channels(config):
+    """需要发送的渠道列表"""
+    channels = config.get('NOTIFICATION_CHANNELS') or [config.get('NOTIFICATION_METHOD', 'wecom')]
+    return [c for c in dict.fromkeys(channels) if c in CHANNEL_NAMES]
+
+def _channel_config_error(channel, config):
+    """渠道未配置完整时返回说明，否则返回 None"""
+    if channel == 'tg' and (not config.get('TG_BOT_TOKEN') or not config.get('TG_CHAT_ID')):
+        return "Telegram Bot Token 或 Chat ID 未配置"
+    if channel == 'wecom' and not config.get('WECOM_WEBHOOK'):
+        return "企业微信 Webhook 未配置"
+    if channel == 'webhook' and not config.get('WEBHOOK_URL'):
+        return "Webhook 地址未配置"
+    return None
+
 # --- 3. 统一的通知入口函数 ---
 
 def send_notification(notification_type, data={}):
     """
-    统一的通知发送入口
+    统一的通知发送入口：生成消息、写入通知记录并为每个渠道加入异步发送队列。
+    返回 (是否已受理, 说明, 投递ID列表)，可通过 app.dispatch.get_delivery 查询每个渠道的发送结果。
     """
     config = load_config()
-    method = config.get('NOTIFICATION_METHOD', 'wecom')
+    channels = get_notification_channels(config)
     template = MESSAGE_TEMPLATES.get(notification_type, {})
     
     if not template:
-        return False, "未知的通知类型"
+        return False, "未知的通知类型", None
 
     title = template['title']
     picurl = template['picurl']
@@ -122,118 +225,406 @@ def send_notification(notification_type, data={}):
         details = f"停止时间: {data.get('stop_time')}\n运行时长: {data.get('duration')}"
     elif notification_type == 'anomaly':
         details = data.get('error_details', '未知异常')
+    elif notification_type == 'recovery':
+        details = data.get('recovery_details', '')
     elif notification_type == 'test':
-        details = f"时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n方式: {'Telegram' if method == 'tg' else '企业微信'}"
+        details = f"时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n方式: {'、'.join(CHANNEL_NAMES[c] for c in channels)}"
 
     # 替换换行符为空格，使日志更易读
     log_message = f"{title} - {details.replace(chr(10), ' ')}"
-    notification_record_type = "info" if notification_type in ['start', 'stop', 'test'] else "error"
+    if notification_type in ['start', 'stop', 'test']:
+        notification_record_type = "info"
+    elif notification_type == 'recovery':
+        notification_record_type = "success"
+    else:
+        notification_record_type = "error"
     
-    add_notification_record({
+    record_id = add_notification_record({
         "message": log_message,
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "type": notification_record_type
     })
-    
-    if method == 'tg':
-        token = config.get('TG_BOT_TOKEN')
-        chat_id = config.get('TG_CHAT_ID')
-        if not token or not chat_id:
-            return False, "Telegram Bot Token 或 Chat ID 未配置"
-        result = _send_tg_notification(token, chat_id, title, details, picurl)
-        return result, "Telegram 通知发送成功" if result else "Telegram 通知发送失败"
-
-    else: # 默认企业微信
-        webhook = config.get('WECOM_WEBHOOK')
-        if not webhook:
-            return False, "企业微信 Webhook 未配置"
-        result = _send_wecom_notification(webhook, title, details, picurl)
-        return result, "企业微信通知发送成功" if result else "企业微信通知发送失败"
+
+    # 先检查渠道配置，未配置的渠道不进入发送队列
+    errors, delivery_ids, queued = [], [], []
+    for channel in channels:
+        error = _channel_config_error(channel, config)
+        if error:
+            errors.append(error)
+            continue
+        payload = {'title': title, 'details': details, 'picurl': picurl, 'template': notification_type}
+        with tracing.span('notify.enqueue'):
+            delivery_ids.append(dispatch.enqueue(channel, notification_type, payload, record_id=record_id))
+        queued.append(CHANNEL_NAMES[channel])
+    if not delivery_ids:
+        return False, "；".join(errors) or "未配置通知渠道", []
+    message = f"{'、'.join(queued)} 通知已加入发送队列"
+    if errors:
+        message += f" ({'；'.join(errors)})"
+    return True, message, delivery_ids
+
+
+def deliver_notification(channel, payload, config):
+    """实际发送一条通知 (由 app.dispatch 的后台线程调用)，返回 (是否成功, 说明)"""
+    started = time.perf_counter()
+    success, message = _deliver(channel, payload, config)
+    NOTIFICATION_SEND_SECONDS.labels(channel=channel, outcome='success' if success else 'failure')\
+        .observe(time.perf_counter() - started)
+    return success, message
+
+def _deliver(channel, payload, config):
+    title, details, picurl = payload['title'], payload['details'], payload.get('picurl')
+    error = _channel_config_error(channel, config)
+    if error:
+        return False, error
+    timeout = _channel_timeout(channel, config)
+    if channel == 'tg':
+        api_base = config.get('TG_API_BASE', DEFAULT_TG_API_BASE).rstrip('/')
+        result = _send_tg_notification(
+            config['TG_BOT_TOKEN'], config['TG_CHAT_ID'], title, details, picurl, api_base, timeout,
+            image_path=tgphotos.local_image(payload.get('template'), config)
+        )
+    elif channel == 'webhook':
+        result = _send_webhook_notification(
+            config['WEBHOOK_URL'], config.get('WEBHOOK_HEADERS'), title, details, picurl, timeout
+        )
+    else:
+        result = _send_wecom_notification(config['WECOM_WEBHOOK'], title, details, picurl, timeout)
+    name = CHANNEL_NAMES.get(channel, channel)
+    return result, f"{name} 通知发送成功" if result else f"{name} 通知发送失败"
 
 
 # --- 4. 后台监控任务 ---
 
 def monitor_task():
-    """后台定时监控任务，发现异常时调用统一通知入口"""
+    """后台定时监控任务，存储状态发生转换 (异常/恢复) 时调用统一通知入口"""
+    with MONITOR_TASK_SECONDS.time():
+        _run_monitor_task()
+
+def _run_monitor_task():
     try:
         status = load_monitor_status()
-        status['check_count'] = status.get('check_count', 0) + 1
-        save_monitor_status(status)
+        if not status.get('is_monitoring'):
+            # 监控已停止，调度器 leader 还未同步到 (最多延迟一个选主周期)
+            logger.info("监控已停止，跳过本次定时检查。")
+            return
+        config = load_config()
+        request_count = len(get_alist_instances(config))
+        wait = polling.budget_wait(request_count, config)
+        if wait > 0:
+            logger.info(f"Alist 请求预算不足，定时检查顺延 {wait:.0f}秒")
+            leader.record_skipped_run(leader.SKIP_BUDGET)
+            leader.schedule_next(wait)
+            return
+        status['check_count'] = increment_check_count(status['version'])
+        if status['check_count'] is None:
+            logger.info("监控状态已被重置，跳过本次定时检查。")
+            return
+        events.publish(events.EVENT_MONITOR_STATUS, status)
         logger.info(f"开始执行后台定时监控任务 (第 {status['check_count']} 次)")
 
-        result = get_storage_status()
-        
-        if result.get('status') == '异常':
-            abnormal_storages = [s for s in result.get('storages', []) if s.get('status') not in ['work', 'disabled']]
-            error_details = f"发现{len(abnormal_storages)}个异常存储:\n" + \
-                            "\n".join([f" - {s.get('name', '未知路径')} 状态: {s.get('status', '未知')}" for s in abnormal_storages])
-            send_notification('anomaly', data={'error_details': error_details})
+        # 定时检查总是重新获取，保证状态机的"连续失败次数"对应真实的检查次数
+        result = get_storage_status(force=True)
+        history.record_check(result)
+        events.publish(events.EVENT_STORAGE_STATUS, summarize_result(result))
 
-        elif not result.get('success'):
-             send_notification('anomaly', data={'error_details': result.get('message', '获取状态失败')})
+        alert_events = alerts.evaluate(result)
+        failing_details, recovered_details = alerts.format_events(alert_events)
+        if failing_details:
+            send_notification('anomaly', data={'error_details': failing_details})
+        if recovered_details:
+            send_notification('recovery', data={'recovery_details': recovered_details})
+
+        if result.get('status') == '异常' or not result.get('success'):
+            if not alert_events:
+                logger.info("监控检查完成，存储异常状态未变化，不重复通知。")
         else:
             logger.info("监控检查完成，所有存储状态正常。")
 
+        leader.schedule_next(polling.plan_next_check(status, result, config, request_count))
+
     except Exception as e:
+        MONITOR_TASK_FAILURES.inc()
         logger.error(f"后台监控任务执行出错: {e}", exc_info=True)
-        send_notification('anomaly', data={'error_details': f'监控任务执行出错: {e}'})
+        # 与存储告警使用同一个状态机：达到失败阈值才通知，之后只按提醒间隔重复，抖动时暂停
+        try:
+            failing_details, _ = alerts.format_events(alerts.evaluate_task_error(e))
+        except Exception as alert_error:
+            logger.error(f"更新监控任务告警状态失败: {alert_error}")
+            failing_details = ''
+        if failing_details:
+            send_notification('anomaly', data={'error_details': failing_details})
 
 
 # --- 基础函数 ---
 
-def create_retry_session():
-    session = requests.Session()
-    retry = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504], allowed_methods=["GET", "POST"])
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    return session
+DEFAULT_INSTANCE_NAME = 'default'
+DEFAULT_ALIST_TIMEOUT = 15
+DEFAULT_ALIST_MAX_WORKERS = 8
+DEFAULT_ALIST_PAGE_SIZE = 1000
+DEFAULT_ALIST_PAGE_WORKERS = 8
 
-session = create_retry_session()
+# 每次检查 (所有实例、所有分页和深度探测) 的端到端截止时间，超时的实例按失败处理
+DEFAULT_CHECK_DEADLINE = 30
+# 单个 Alist 请求失败后的最多重试次数，第 n 次重试前等待 RETRY_BACKOFF * 2^(n-1) 秒；
+# 重试还要从所有调用方共用的重试预算中取令牌，且等待后仍需在截止时间之内
+DEFAULT_ALIST_MAX_RETRIES = 2
+RETRY_BACKOFF = 0.5
+RETRYABLE_STATUS = (500, 502, 503, 504)
+# 实例连续检查失败达到次数后熔断，冷却时间内的检查直接返回 "Alist 无法访问"
+DEFAULT_ALIST_BREAKER_THRESHOLD = 3
+DEFAULT_ALIST_BREAKER_COOLDOWN = 60
 
-def get_storage_status():
-    """获取Alist存储状态的核心函数"""
-    check_time_iso = datetime.now(timezone.utc).isoformat()
-    config = load_config()
-    ALIST_URL = config.get('ALIST_URL')
-    ALIST_TOKEN = config.get('ALIST_TOKEN')
-    
-    if not ALIST_URL or not ALIST_TOKEN:
-        return {"success": False, "message": "未配置Alist连接信息", "status": "异常", "storages": []}
+_retry_budget = resilience.RetryBudget('alist')
 
-    url = f"{ALIST_URL.rstrip('/')}/api/admin/storage/list"
-    headers = {"Authorization": ALIST_TOKEN}
+# 每个 Alist 实例使用独立的 Session (独立的连接池)，按实例地址复用。
+# 不使用 urllib3 的自动重试 (重试等待不受请求超时约束)，由 _alist_get 按截止时间和重试预算重试。
+_instance_sessions = {}
+_instance_sessions_lock = threading.Lock()
+
+def _get_instance_session(url):
+    import requests
+    from requests.adapters import HTTPAdapter
+    with _instance_sessions_lock:
+        instance_session = _instance_sessions.get(url)
+        if instance_session is None:
+            instance_session = requests.Session()
+            adapter = HTTPAdapter(max_retries=0, pool_maxsize=max(10, DEFAULT_ALIST_PAGE_WORKERS))
+            instance_session.mount('http://', adapter)
+            instance_session.mount('https://', adapter)
+            _instance_sessions[url] = instance_session
+        return instance_session
+
+def _is_retryable(error):
+    import requests
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return isinstance(error, requests.HTTPError) and error.response is not None \
+        and error.response.status_code in RETRYABLE_STATUS
+
+def _alist_get(instance, api, params, deadline, config):
+    """请求 Alist 接口，单次超时不超过截止时间的剩余时间，可重试的错误在预算内重试"""
+    max_retries = int(config.get('ALIST_MAX_RETRIES', DEFAULT_ALIST_MAX_RETRIES))
+    session = _get_instance_session(instance['url'])
+    attempt = 0
+    while True:
+        timeout = min(instance['timeout'], resilience.remaining(deadline))
+        _retry_budget.record_request()
+        try:
+            response = session.get(
+                f"{instance['url']}{api}", params=params,
+                headers={"Authorization": instance['token']}, timeout=timeout
+            )
+            response.raise_for_status()
+            return response
+        except Exception as e:
+            if not _is_retryable(e) or attempt >= max_retries:
+                raise
+            attempt += 1
+            backoff = RETRY_BACKOFF * 2 ** (attempt - 1)
+            if deadline - time.monotonic() <= backoff:
+                ALIST_RETRIES_DENIED.labels(reason='deadline').inc()
+                raise
+            if not _retry_budget.try_retry():
+                ALIST_RETRIES_DENIED.labels(reason='budget').inc()
+                raise
+            ALIST_RETRIES.labels(target='alist').inc()
+            logger.warning(f"请求 {instance['url']} 失败 ({e})，{backoff}秒后第 {attempt} 次重试")
+            time.sleep(backoff)
+
+def get_alist_instances(config):
+    """
+    从配置中解析 Alist 实例列表。
+    优先使用 ALIST_INSTANCES: [{"name": ..., "url": ..., "token": ..., "timeout": ...}]，
+    未配置时兼容旧的 ALIST_URL / ALIST_TOKEN 单实例配置。
+    """
+    default_timeout = float(config.get('ALIST_TIMEOUT', DEFAULT_ALIST_TIMEOUT))
+    instances = []
+    for item in config.get('ALIST_INSTANCES') or []:
+        url, token = item.get('url'), item.get('token')
+        if not url or not token:
+            continue
+        instances.append({
+            'name': item.get('name') or url,
+            'url': url.rstrip('/'),
+            'token': token,
+            'timeout': float(item.get('timeout', default_timeout))
+        })
+    if not instances and config.get('ALIST_URL') and config.get('ALIST_TOKEN'):
+        instances.append({
+            'name': DEFAULT_INSTANCE_NAME,
+            'url': config['ALIST_URL'].rstrip('/'),
+            'token': config['ALIST_TOKEN'],
+            'timeout': default_timeout
+        })
+    return instances
+
+def _fetch_storage_page(instance, page, per_page, deadline, config):
+    """请求一页存储列表，返回 (本页的 StorageRecord 列表, 存储总数)；per_page 为 None 时一次获取全部"""
+    params = {'page': page, 'per_page': per_page} if per_page else None
+    response = _alist_get(instance, '/api/admin/storage/list', params, deadline, config)
+    data = response.json().get('data') or {}
+    content = data.get('content') or []
+    # 每页解析后立即转换为紧凑记录，原始的字典随本页一起释放
+    records = [
+        StorageRecord(s.get('mount_path', '/'), instance['name'], s.get('driver', '未知'), s.get('status', 'unknown'))
+        for s in content
+    ]
+    return records, data.get('total', len(content))
+
+def _fetch_storage_records(instance, config, deadline):
+    """分页获取实例的全部存储：先取第一页得到总数，其余页并发请求 (ALIST_PAGE_SIZE 为 0 时不分页)"""
+    per_page = int(config.get('ALIST_PAGE_SIZE', DEFAULT_ALIST_PAGE_SIZE)) or None
+    records, total = _fetch_storage_page(instance, 1, per_page, deadline, config)
+    # 不支持分页的旧版本 Alist 会在第一页返回全部存储
+    pages = -(-total // per_page) if per_page and len(records) < total else 1
+    if pages > 1:
+        polling.record_requests(pages - 1, config)
+        max_workers = min(pages - 1, int(config.get('ALIST_PAGE_WORKERS', DEFAULT_ALIST_PAGE_WORKERS)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='alist-page') as executor:
+            for page_records, _ in executor.map(
+                    lambda page: _fetch_storage_page(instance, page, per_page, deadline, config), range(2, pages + 1)):
+                records.extend(page_records)
+        # 翻页期间存储列表有增删时，相邻两页可能返回同一个存储
+        unique = {}
+        for r in records:
+            unique.setdefault(r.name, r)
+        records = list(unique.values())
+    return records
+
+def _breaker_name(instance):
+    return f"alist:{instance['name']}"
+
+def _unreachable_message(circuit):
+    wait = max(0, circuit['retry_at'] - time.time())
+    return f"Alist 无法访问 (连续失败 {circuit['failures']} 次，{wait:.0f}秒后重试): {circuit['last_error']}"
+
+def _fetch_instance_status(instance, config, deadline):
+    """获取单个 Alist 实例的存储状态"""
+    started = time.monotonic()
+    result = {'name': instance['name'], 'url': instance['url'], 'unreachable': False}
+    threshold = int(config.get('ALIST_BREAKER_THRESHOLD', DEFAULT_ALIST_BREAKER_THRESHOLD))
+    cooldown = float(config.get('ALIST_BREAKER_COOLDOWN', DEFAULT_ALIST_BREAKER_COOLDOWN))
+    circuit = resilience.circuit_state(_breaker_name(instance))
+    if circuit['open']:
+        # 熔断期间不请求 Alist，直接返回无法访问
+        ALIST_FETCH_SECONDS.labels(instance=instance['name'], outcome='circuit_open').observe(time.monotonic() - started)
+        result.update({
+            'success': False, 'unreachable': True, 'retry_at': circuit['retry_at'],
+            'message': _unreachable_message(circuit), 'status': "异常",
+            'storage_count': 0, 'abnormal_count': 0, 'storages': []
+        })
+        result['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+        return result
     try:
-        response = session.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-        storage_list = response.json().get('data', {}).get('content', [])
-        
-        is_abnormal = False
-        storages_info = []
-        for s in storage_list:
-            status = s.get('status', 'unknown')
-            if status not in ['work', 'disabled']:
-                is_abnormal = True
-            
-            storages_info.append({
-                'name': s.get('mount_path', '/'),
-                'driver': s.get('driver', '未知'),
-                'status': status,
-                'last_updated': check_time_iso 
-            })
-        
-        overall_status = "异常" if is_abnormal else "正常"
-        
-        return {
-            "success": True, 
-            "message": "获取存储状态成功",
-            "status": overall_status,
-            "last_checked": check_time_iso,
-            "storages": storages_info
-        }
+        try:
+            storages_info = _fetch_storage_records(instance, config, deadline)
+        except Exception as e:
+            resilience.record_result(_breaker_name(instance), False, threshold, cooldown, error=str(e))
+            raise
+        if circuit['failures']:
+            resilience.record_result(_breaker_name(instance), True, threshold, cooldown)
+        if config.get('PROBE_ENABLED'):
+            polling.record_requests(probes.probe_storages(instance, storages_info, config, deadline), config)
+        abnormal_count = sum(1 for s in storages_info if s.status not in ['work', 'disabled'])
+        result.update({
+            'success': True,
+            'message': "获取存储状态成功",
+            'status': "异常" if abnormal_count else "正常",
+            'storage_count': len(storages_info),
+            'abnormal_count': abnormal_count,
+            'storages': storages_info
+        })
+        ALIST_FETCH_SECONDS.labels(instance=instance['name'], outcome='success').observe(time.monotonic() - started)
     except Exception as e:
-        logger.error(f"请求 {url} 失败: {e}")
-        return {"success": False, "message": f"无法获取存储状态: {e}", "status": "异常", "storages": []}
+        logger.error(f"请求 {instance['url']} 的存储列表失败: {e}")
+        ALIST_FETCH_SECONDS.labels(instance=instance['name'], outcome='failure').observe(time.monotonic() - started)
+        circuit = resilience.circuit_state(_breaker_name(instance))
+        result.update({
+            'success': False,
+            'unreachable': circuit['open'],
+            'message': _unreachable_message(circuit) if circuit['open'] else f"无法获取存储状态: {e}",
+            'status': "异常",
+            'storage_count': 0,
+            'abnormal_count': 0,
+            'storages': []
+        })
+    result['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return result
+
+def _fetch_storage_status(config, instances):
+    """请求所有 Alist 实例并合并结果 (多个实例时并发请求)"""
+    check_time_iso = datetime.now(timezone.utc).isoformat()
+    started = time.monotonic()
+    deadline = started + float(config.get('CHECK_DEADLINE', DEFAULT_CHECK_DEADLINE))
+    polling.record_requests(len(instances), config)
+    with tracing.span('alist.fetch'):
+        if len(instances) == 1:
+            results = [_fetch_instance_status(instances[0], config, deadline)]
+        else:
+            max_workers = min(len(instances), int(config.get('ALIST_MAX_WORKERS', DEFAULT_ALIST_MAX_WORKERS)))
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='alist-fetch') as executor:
+                results = list(executor.map(lambda instance: _fetch_instance_status(instance, config, deadline), instances))
+
+    storages = [s for r in results for s in r.pop('storages')]
+    failed = [r for r in results if not r['success']]
+    is_abnormal = bool(failed) or any(r['abnormal_count'] for r in results)
+
+    if len(results) == 1:
+        message = results[0]['message']
+    elif failed:
+        message = f"{len(failed)}/{len(results)} 个实例获取存储状态失败"
+    else:
+        message = "获取存储状态成功"
+
+    return {
+        "success": len(failed) < len(results),
+        "message": message,
+        "status": "异常" if is_abnormal else "正常",
+        "last_checked": check_time_iso,
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+        "instances": results,
+        "storages": storages
+    }
+
+def get_storage_status(force=False):
+    """
+    获取Alist存储状态的核心函数。
+    结果通过 app.snapshot 在所有 worker 间共享：在 STATUS_CACHE_TTL 秒内重复调用直接返回快照，
+    force=True 时 (手动检查) 忽略 TTL 重新请求。返回值中的 snapshot_age 为快照的年龄 (秒)。
+    """
+    config = load_config()
+    instances = get_alist_instances(config)
+
+    if not instances:
+        return {"success": False, "message": "未配置Alist连接信息", "status": "异常", "storages": [], "instances": []}
+
+    ttl = float(config.get('STATUS_CACHE_TTL', snapshot.DEFAULT_TTL))
+    with tracing.span('storage.snapshot'):
+        data, age, cached = snapshot.get_snapshot(
+            lambda: _fetch_storage_status(config, instances),
+            snapshot.config_fingerprint(instances), ttl=ttl, force=force
+        )
+    CACHE_REQUESTS.labels(cache='storage_snapshot', result='hit' if cached else 'miss').inc()
+    if not cached:
+        observe_storage_statuses(data.get('storages', []))
+    result = dict(data)
+    result['snapshot_age'] = round(age, 3)
+    result['cached'] = cached
+    return result
+
+def summarize_result(result):
+    """生成检查结果的摘要 (用于事件推送)：只包含总体状态和异常存储，不包含完整存储列表"""
+    return {
+        'success': result.get('success'),
+        'status': result.get('status'),
+        'message': result.get('message'),
+        'last_checked': result.get('last_checked'),
+        'storage_count': len(result.get('storages', [])),
+        'abnormal_storages': [s.to_dict(last_changed(result, s)) for s in result.get('storages', [])
+                              if s.status not in ['work', 'disabled']],
+        'instances': result.get('instances', [])
+    }
 
 def get_storage_list():
     """获取存储列表，供API调用"""
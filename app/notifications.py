@@ -0,0 +1,247 @@
+# app/notifications.py
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from app import db, events
+from app.config import load_config, NOTIFICATIONS_PATH
+
+logger = logging.getLogger(__name__)
+
+# --- 通知记录日志 ---
+# 每条记录是 notifications 表中的一行，写入是一次 INSERT (WAL 追加)，与历史记录数量无关。
+# 旧版本的 notifications.json 会在首次使用时导入数据库。
+# 通知发送到多个渠道时，每个渠道的发送结果保存在 notification_channel_results 中，查询时附加到记录的 channels 字段。
+
+DEFAULT_RETENTION_DAYS = 30
+DEFAULT_MAX_RECORDS = 50000
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+COMPACTION_INTERVAL = 600  # 秒
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_notifications_type_id ON notifications (type, id);
+CREATE INDEX IF NOT EXISTS idx_notifications_ts ON notifications (ts);
+CREATE TABLE IF NOT EXISTS notification_channel_results (
+    record_id INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (record_id, channel)
+);
+"""
+
+_last_compaction = 0.0
+_compaction_lock = threading.Lock()
+
+def _parse_timestamp(value):
+    """把 ISO 时间字符串或时间戳转换为 epoch 秒，无法解析时返回 None"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def _migrate_json_file(conn):
+    """将旧的 notifications.json 导入数据库 (只执行一次)"""
+    if not os.path.exists(NOTIFICATIONS_PATH):
+        return
+    try:
+        with open(NOTIFICATIONS_PATH, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except OSError as e:
+        # 暂时无法读取时保留原文件，下次启动时再导入
+        logger.error(f"读取旧通知记录文件失败: {e}")
+        return
+    try:
+        records = json.loads(content) if content.strip() else []
+        if not isinstance(records, list):
+            raise ValueError("内容不是记录列表")
+    except ValueError as e:
+        # 无法解析的文件改名为 .corrupt 保留原内容，不当作已导入
+        os.replace(NOTIFICATIONS_PATH, NOTIFICATIONS_PATH + '.corrupt')
+        logger.error(f"旧通知记录文件无法解析，已改名为 {os.path.basename(NOTIFICATIONS_PATH)}.corrupt: {e}")
+        return
+    imported = 0
+    # 旧文件中最新的记录在最前面，倒序插入以保持 id 顺序
+    for record in reversed(records):
+        if not isinstance(record, dict):
+            continue
+        conn.execute(
+            'INSERT INTO notifications (ts, type, data) VALUES (?, ?, ?)',
+            (_parse_timestamp(record.get('timestamp')) or time.time(), record.get('type', 'info'),
+             json.dumps(record, ensure_ascii=False))
+        )
+        imported += 1
+    os.replace(NOTIFICATIONS_PATH, NOTIFICATIONS_PATH + '.migrated')
+    skipped = len(records) - imported
+    logger.info(f"已将 {imported} 条旧通知记录导入数据库" + (f"，跳过 {skipped} 条格式错误的记录" if skipped else ""))
+
+def _ensure_schema():
+    if db.ensure_schema('notifications', _SCHEMA) and os.path.exists(NOTIFICATIONS_PATH):
+        with db.transaction() as conn:
+            # 在写锁内再次检查，避免多个 worker 重复导入
+            _migrate_json_file(conn)
+
+def _row_to_record(row):
+    record = json.loads(row['data'])
+    record['id'] = row['id']
+    return record
+
+def add_notification_record(notification):
+    """追加一条通知记录，返回记录 id"""
+    _ensure_schema()
+    ts = _parse_timestamp(notification.get('timestamp')) or time.time()
+    cursor = db.get_connection().execute(
+        'INSERT INTO notifications (ts, type, data) VALUES (?, ?, ?)',
+        (ts, notification.get('type', 'info'), json.dumps(notification, ensure_ascii=False))
+    )
+    _maybe_schedule_compaction()
+    events.publish(events.EVENT_NOTIFICATION, dict(notification, id=cursor.lastrowid))
+    return cursor.lastrowid
+
+def query_notifications(limit=DEFAULT_PAGE_SIZE, cursor=None, types=None, since=None, until=None):
+    """
+    按 id 倒序分页查询通知记录。
+    cursor 为上一页返回的 next_cursor (即上一页最后一条记录的 id)；
+    返回 (records, next_cursor)，没有更多数据时 next_cursor 为 None。
+    """
+    _ensure_schema()
+    limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    clauses, params = [], []
+    if cursor:
+        clauses.append('id < ?')
+        params.append(int(cursor))
+    if types:
+        clauses.append(f"type IN ({','.join('?' * len(types))})")
+        params.extend(types)
+    since_ts, until_ts = _parse_timestamp(since), _parse_timestamp(until)
+    if since_ts is not None:
+        clauses.append('ts >= ?')
+        params.append(since_ts)
+    if until_ts is not None:
+        clauses.append('ts < ?')
+        params.append(until_ts)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    rows = db.get_connection().execute(
+        f'SELECT id, data FROM notifications {where} ORDER BY id DESC LIMIT ?', (*params, limit + 1)
+    ).fetchall()
+    records = [_row_to_record(row) for row in rows[:limit]]
+    _attach_channel_results(records)
+    next_cursor = records[-1]['id'] if len(rows) > limit else None
+    return records, next_cursor
+
+def _attach_channel_results(records):
+    if not records:
+        return
+    by_id = {r['id']: r for r in records}
+    rows = db.get_connection().execute(
+        f"SELECT record_id, channel, status, message, updated_at FROM notification_channel_results "
+        f"WHERE record_id IN ({','.join('?' * len(by_id))})", tuple(by_id)
+    ).fetchall()
+    for row in rows:
+        by_id[row['record_id']].setdefault('channels', {})[row['channel']] = {
+            'status': row['status'], 'message': row['message'], 'updated_at': row['updated_at']
+        }
+
+def record_channel_result(record_id, channel, status, message=None):
+    """记录通知在某个渠道上的发送结果 (由 app.dispatch 在入队和发送完成时调用)"""
+    _ensure_schema()
+    # INSERT OR REPLACE 每次都会分配新的 rowid，notifications_version 据此感知结果的变化
+    db.get_connection().execute(
+        'INSERT OR REPLACE INTO notification_channel_results (record_id, channel, status, message, updated_at) '
+        'VALUES (?, ?, ?, ?, ?)', (record_id, channel, status, message, time.time())
+    )
+
+def notifications_version():
+    """
+    通知记录的版本，返回 (版本, 最新记录的时间)；用于 HTTP 条件请求。
+    记录只会追加 (id 递增且不复用)、按 id 从小到大压缩或全部清除，因此最小和最大 id 就能标识当前数据；
+    各渠道的发送结果用结果表中最大的 rowid 标识。
+    """
+    _ensure_schema()
+    conn = db.get_connection()
+    row = conn.execute('SELECT MIN(id) AS min_id, MAX(id) AS max_id, MAX(ts) AS max_ts FROM notifications').fetchone()
+    results = conn.execute(
+        'SELECT MAX(rowid) AS max_rowid, MAX(updated_at) AS updated_at FROM notification_channel_results'
+    ).fetchone()
+    modified_at = max(row['max_ts'] or 0, results['updated_at'] or 0) or None
+    return f"{row['min_id']}-{row['max_id']}-{results['max_rowid']}", modified_at
+
+def load_notifications(limit=DEFAULT_PAGE_SIZE):
+    """加载最新的通知记录 (最新的在前)"""
+    records, _ = query_notifications(limit=limit)
+    return records
+
+def clear_notifications():
+    """清除所有通知记录"""
+    _ensure_schema()
+    conn = db.get_connection()
+    conn.execute('DELETE FROM notifications')
+    conn.execute('DELETE FROM notification_channel_results')
+    return True
+
+# --- 后台压缩/保留策略 ---
+
+def compact_notifications():
+    """按配置的保留天数和最大条数删除过期记录，返回删除的条数"""
+    _ensure_schema()
+    config = load_config()
+    retention_days = float(config.get('NOTIFICATION_RETENTION_DAYS', DEFAULT_RETENTION_DAYS))
+    max_records = int(config.get('NOTIFICATION_MAX_RECORDS', DEFAULT_MAX_RECORDS))
+    conn = db.get_connection()
+    deleted = 0
+    if retention_days > 0:
+        deleted += conn.execute(
+            'DELETE FROM notifications WHERE ts < ?', (time.time() - retention_days * 86400,)
+        ).rowcount
+    if max_records > 0:
+        row = conn.execute(
+            'SELECT id FROM notifications ORDER BY id DESC LIMIT 1 OFFSET ?', (max_records - 1,)
+        ).fetchone()
+        if row:
+            deleted += conn.execute('DELETE FROM notifications WHERE id < ?', (row['id'],)).rowcount
+    conn.execute(
+        'DELETE FROM notification_channel_results '
+        'WHERE NOT EXISTS (SELECT 1 FROM notifications WHERE notifications.id = record_id)'
+    )
+    if deleted:
+        logger.info(f"通知记录压缩完成，删除 {deleted} 条过期记录")
+    return deleted
+
+def _run_compaction():
+    try:
+        compact_notifications()
+    except Exception as e:
+        logger.error(f"通知记录压缩失败: {e}")
+
+def _maybe_schedule_compaction():
+    """距离上次压缩超过 COMPACTION_INTERVAL 时，在后台线程中执行一次压缩"""
+    global _last_compaction
+    now = time.monotonic()
+    if now - _last_compaction < COMPACTION_INTERVAL:
+        return
+    with _compaction_lock:
+        if now - _last_compaction < COMPACTION_INTERVAL:
+            return
+        _last_compaction = now
+    threading.Thread(target=_run_compaction, name='notification-compaction', daemon=True).start()
@@ -0,0 +1,69 @@
+# app/pages.py
+import hmac
+from flask import Blueprint, send_from_directory, request, redirect, session, jsonify, Response
+from app import assets, auth, startup
+from app.config import load_config
+from app.metrics import render_metrics
+
+pages = Blueprint('pages', __name__)
+# 模板中使用 {{ asset_url('js/index.js') }} 引用带内容指纹的静态资源地址
+pages.add_app_template_global(assets.asset_url, 'asset_url')
+
+# --- 页面路由 ---
+@pages.route('/login')
+def login_page():
+    return assets.page_response('login.html')
+
+@pages.route('/change_password')
+def change_password_page():
+    if 'logged_in' not in session:
+        return redirect('/login')
+    return assets.page_response('change_password.html')
+
+@pages.route('/')
+@pages.route('/index.html')
+def index():
+    if 'logged_in' not in session:
+        return redirect('/login')
+    return assets.page_response('index.html')
+
+def _metrics_authorized():
+    # 与其它接口一样需要登录：登录会话、read 权限的 API 令牌，或配置的 METRICS_TOKEN (供 Prometheus 抓取)
+    if 'logged_in' in session:
+        return True
+    header = request.headers.get('Authorization', '')
+    token = header[7:].strip() if header[:7].lower() == 'bearer ' else None
+    if not token:
+        return False
+    metrics_token = load_config().get('METRICS_TOKEN')
+    if metrics_token and hmac.compare_digest(token.encode('utf-8', 'replace'), str(metrics_token).encode('utf-8')):
+        return True
+    claims = auth.verify_token(token)
+    return claims is not None and auth.scope_allows(claims['scope'], auth.SCOPE_READ)
+
+@pages.route('/metrics')
+def metrics():
+    if not _metrics_authorized():
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+# --- 存活与就绪检查 (不需要登录，供容器编排和负载均衡使用) ---
+@pages.route('/healthz')
+def healthz():
+    # 只表示进程能处理请求，不访问磁盘和数据库
+    return jsonify({"status": "ok"})
+
+@pages.route('/readyz')
+def readyz():
+    ready, checks = startup.readiness()
+    return jsonify({"ready": ready, "checks": checks, "startup_ms": startup.get_timings()}), 200 if ready else 503
+
+# 部署中没有反向代理，静态文件由这里直接提供 (Flask 自带的 static 路由已在 create_app 中关闭)：
+# 预先压缩的内容和 ETag 在启动时生成，带指纹的地址使用长期缓存 (见 app/assets.py)
+@pages.route('/static/<path:path>')
+def serve_static(path):
+    response = assets.static_response(path)
+    if response is None:
+        return send_from_directory(assets.STATIC_DIR, path)
+    return response
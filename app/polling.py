@@ -0,0 +1,168 @@
+# app/polling.py
+import time
+import random
+import logging
+from app import db
+from app.alerts import storage_key
+
+logger = logging.getLogger(__name__)
+
+# --- 自适应轮询 ---
+# 每次定时检查后根据结果计算下一次检查的间隔，由调度器 leader 重新设置任务的触发时间：
+# - ADAPTIVE_POLLING 开启时，所有存储正常则逐次放大间隔 (最多到 ADAPTIVE_MAX_INTERVAL)，
+#   出现异常立即收紧到 ADAPTIVE_MIN_INTERVAL；关闭时使用界面中选择的固定间隔；
+# - STORAGE_INTERVALS / DRIVER_INTERVALS 为存储 (挂载路径) 或驱动指定的最长检查间隔。
+#   Alist 一次请求返回实例下所有存储，因此覆盖值约束的是整体间隔，取当前存在的存储中最小的一个；
+# - ALIST_REQUEST_BUDGET 限制每分钟对 Alist 的请求总数 (所有进程共享的令牌桶)，
+#   手动检查和仪表盘刷新也计入，预算不足时定时检查顺延；
+# - POLL_JITTER 为间隔增加随机抖动，避免多个监控实例同时请求。
+# 当前生效的间隔保存在共享数据库中，任意 worker 都能在 /api/monitor_status 中返回。
+
+DEFAULT_MIN_INTERVAL = 30
+DEFAULT_MAX_INTERVAL_FACTOR = 4
+DEFAULT_BACKOFF_FACTOR = 1.5
+DEFAULT_JITTER = 0.1
+
+REASON_FIXED = 'fixed'
+REASON_STABLE = 'stable'
+REASON_DEGRADED = 'degraded'
+REASON_OVERRIDE = 'override'
+REASON_BUDGET = 'budget'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS poll_schedule (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    effective_interval REAL NOT NULL,
+    reason TEXT NOT NULL,
+    next_check_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS alist_request_budget (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+def _ensure_schema():
+    db.ensure_schema('polling', _SCHEMA)
+
+def _override_interval(storages, config):
+    """当前存在的存储中，按挂载路径或驱动配置的最小检查间隔；没有覆盖时返回 None"""
+    storage_intervals = config.get('STORAGE_INTERVALS') or {}
+    driver_intervals = config.get('DRIVER_INTERVALS') or {}
+    if not storage_intervals and not driver_intervals:
+        return None
+    overrides = []
+    for s in storages:
+        value = storage_intervals.get(storage_key(s.instance, s.name), driver_intervals.get(s.driver))
+        if value:
+            overrides.append(float(value))
+    return min(overrides) if overrides else None
+
+def _is_degraded(result):
+    if not result.get('success') or result.get('status') != '正常':
+        return True
+    return any(not r.get('success') for r in result.get('instances', []))
+
+def _budget(config):
+    return float(config.get('ALIST_REQUEST_BUDGET', 0) or 0)
+
+def compute_interval(base, result, config, previous=None, request_count=1):
+    """根据本次检查结果计算下一次检查的间隔 (秒)，返回 (间隔, 原因)"""
+    if config.get('ADAPTIVE_POLLING'):
+        min_interval = min(float(config.get('ADAPTIVE_MIN_INTERVAL', DEFAULT_MIN_INTERVAL)), base)
+        max_interval = float(config.get('ADAPTIVE_MAX_INTERVAL') or base * DEFAULT_MAX_INTERVAL_FACTOR)
+        if _is_degraded(result):
+            interval, reason = min_interval, REASON_DEGRADED
+        else:
+            factor = float(config.get('ADAPTIVE_BACKOFF_FACTOR', DEFAULT_BACKOFF_FACTOR))
+            # 从异常中恢复后先回到基础间隔，再逐次放大
+            interval = base if not previous or previous < base else min(previous * factor, max_interval)
+            reason = REASON_STABLE
+    else:
+        interval, reason = float(base), REASON_FIXED
+
+    override = _override_interval(result.get('storages', []), config)
+    if override and override < interval:
+        interval, reason = override, REASON_OVERRIDE
+
+    budget = _budget(config)
+    if budget > 0:
+        floor = 60.0 * request_count / budget
+        if interval < floor:
+            interval, reason = floor, REASON_BUDGET
+    return interval, reason
+
+def apply_jitter(interval, config):
+    jitter = float(config.get('POLL_JITTER', DEFAULT_JITTER))
+    if jitter <= 0:
+        return interval
+    return interval * random.uniform(1 - jitter, 1 + jitter)
+
+def plan_next_check(status, result, config, request_count=1):
+    """计算并保存下一次定时检查的间隔，返回加上抖动后的等待秒数"""
+    _ensure_schema()
+    base = float(status['interval'])
+    row = db.get_connection().execute('SELECT version, effective_interval FROM poll_schedule WHERE id = 1').fetchone()
+    previous = row['effective_interval'] if row and row['version'] == status['version'] else None
+    interval, reason = compute_interval(base, result, config, previous, request_count)
+    delay = apply_jitter(interval, config)
+    now = time.time()
+    db.get_connection().execute(
+        'INSERT OR REPLACE INTO poll_schedule (id, version, effective_interval, reason, next_check_at, updated_at) '
+        'VALUES (1, ?, ?, ?, ?, ?)', (status['version'], interval, reason, now + delay, now)
+    )
+    if previous is None or abs(previous - interval) >= 1:
+        logger.info(f"下一次检查间隔调整为 {interval:.0f}秒 (原因: {reason})")
+    return delay
+
+def get_schedule_info(status):
+    """当前生效的检查间隔信息，监控未启动时返回 None"""
+    if not status.get('is_monitoring') or not status.get('interval'):
+        return None
+    _ensure_schema()
+    row = db.get_connection().execute(
+        'SELECT version, effective_interval, reason, next_check_at FROM poll_schedule WHERE id = 1'
+    ).fetchone()
+    if row is None or row['version'] != status.get('version'):
+        # 启动后还没有完成第一次检查
+        return {'effective_interval': status['interval'], 'reason': REASON_FIXED, 'next_check_at': None}
+    return {
+        'effective_interval': round(row['effective_interval'], 1), 'reason': row['reason'],
+        'next_check_at': row['next_check_at']
+    }
+
+# --- 请求预算 ---
+
+def _refill(conn, budget, now):
+    row = conn.execute('SELECT tokens, updated_at FROM alist_request_budget WHERE id = 1').fetchone()
+    if row is None:
+        return budget
+    return min(budget, row['tokens'] + (now - row['updated_at']) * budget / 60.0)
+
+def record_requests(count, config):
+    """记录已经发出的 Alist 请求 (从令牌桶中扣除，最少扣到 0)"""
+    budget = _budget(config)
+    if budget <= 0 or count <= 0:
+        return
+    _ensure_schema()
+    now = time.time()
+    with db.transaction() as conn:
+        tokens = _refill(conn, budget, now)
+        conn.execute(
+            'INSERT OR REPLACE INTO alist_request_budget (id, tokens, updated_at) VALUES (1, ?, ?)',
+            (max(0.0, tokens - count), now)
+        )
+
+def budget_wait(count, config):
+    """发出 count 个请求前需要等待的秒数，预算充足 (或未设置预算) 时返回 0"""
+    budget = _budget(config)
+    if budget <= 0:
+        return 0
+    _ensure_schema()
+    tokens = _refill(db.get_connection(), budget, time.time())
+    # 单次检查需要的请求数超过整个预算时，只要求令牌桶装满
+    needed = min(count, budget)
+    return 0 if tokens >= needed else (needed - tokens) * 60.0 / budget
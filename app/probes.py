@@ -0,0 +1,172 @@
+# app/probes.py
+import time
+import logging
+import threading
+import posixpath
+from concurrent.futures import ThreadPoolExecutor, wait
+from app.metrics import PROBE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# --- 挂载点深度探测 ---
+# /api/admin/storage/list 只返回 Alist 记录的状态，存储显示 work 时列目录仍可能非常慢。
+# 开启 PROBE_ENABLED 后，获取存储列表之后会对每个状态为 work 的挂载点调用 /api/fs/list
+# (可选再用 /api/fs/get 取一个文件做小范围的 Range 下载)，记录延迟和吞吐量，
+# 超过阈值或探测失败的存储标记为 degraded (原状态保存在 alist_status 中)。
+# 每个探测有独立的截止时间，探测不重试，整个探测阶段有总的截止时间，单个卡住的后端不会拖住整次检查。
+
+STATUS_DEGRADED = 'degraded'
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 10                 # 秒，单个探测的截止时间
+DEFAULT_LATENCY_THRESHOLD = 5000     # 毫秒
+DEFAULT_DOWNLOAD_BYTES = 256 * 1024
+LIST_PAGE_SIZE = 20
+CHUNK_SIZE = 16 * 1024
+
+# 探测使用不带重试的独立 Session，重试会让单个探测超出截止时间 (requests 在首次探测时才导入)
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def _get_session(base_url, pool_size):
+    import requests
+    from requests.adapters import HTTPAdapter
+    with _sessions_lock:
+        session = _sessions.get(base_url)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(max_retries=0, pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[base_url] = session
+        return session
+
+def _load_settings(config):
+    return {
+        'concurrency': max(1, int(config.get('PROBE_CONCURRENCY', DEFAULT_CONCURRENCY))),
+        'timeout': float(config.get('PROBE_TIMEOUT', DEFAULT_TIMEOUT)),
+        'latency_threshold': float(config.get('PROBE_LATENCY_THRESHOLD', DEFAULT_LATENCY_THRESHOLD)),
+        'download': bool(config.get('PROBE_DOWNLOAD', False)),
+        'download_bytes': int(config.get('PROBE_DOWNLOAD_BYTES', DEFAULT_DOWNLOAD_BYTES)),
+        'min_throughput': float(config.get('PROBE_MIN_THROUGHPUT', 0)),  # KB/s，0 表示不检查
+    }
+
+class ProbeTimeout(Exception):
+    pass
+
+def _remaining(deadline):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise ProbeTimeout("探测超时")
+    return remaining
+
+def _alist_post(session, instance, api, payload, deadline):
+    response = session.post(
+        f"{instance['url']}{api}", json=payload, headers={"Authorization": instance['token']},
+        timeout=_remaining(deadline)
+    )
+    response.raise_for_status()
+    body = response.json()
+    if body.get('code') != 200:
+        raise RuntimeError(body.get('message') or f"code {body.get('code')}")
+    return body.get('data') or {}
+
+def _download(session, instance, path, settings, deadline):
+    """对文件做一次 Range 下载，返回 (字节数, 耗时秒)"""
+    data = _alist_post(session, instance, '/api/fs/get', {'path': path, 'password': ''}, deadline)
+    raw_url = data.get('raw_url')
+    if not raw_url:
+        raise RuntimeError("文件没有可下载的地址")
+    started = time.monotonic()
+    received = 0
+    headers = {'Range': f"bytes=0-{settings['download_bytes'] - 1}"}
+    with session.get(raw_url, headers=headers, stream=True, timeout=_remaining(deadline)) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            received += len(chunk)
+            # 服务器不支持 Range 时会返回整个文件，读够字节数即停止
+            if received >= settings['download_bytes']:
+                break
+            _remaining(deadline)
+    return received, time.monotonic() - started
+
+def _probe_one(instance, storage, settings, check_deadline=None):
+    deadline = time.monotonic() + settings['timeout']
+    if check_deadline is not None:
+        deadline = min(deadline, check_deadline)
+    session = _get_session(instance['url'], settings['concurrency'])
+    probe = {'ok': False, 'list_ms': None, 'download_bytes': 0, 'throughput_kbps': None, 'error': None}
+    started = time.monotonic()
+    try:
+        data = _alist_post(session, instance, '/api/fs/list', {
+            'path': storage.name, 'password': '', 'page': 1, 'per_page': LIST_PAGE_SIZE, 'refresh': False
+        }, deadline)
+        probe['list_ms'] = round((time.monotonic() - started) * 1000, 1)
+        PROBE_SECONDS.labels(kind='list', outcome='success').observe(time.monotonic() - started)
+        if settings['download']:
+            files = [f for f in (data.get('content') or []) if not f.get('is_dir')]
+            if files:
+                download_started = time.monotonic()
+                try:
+                    received, elapsed = _download(
+                        session, instance, posixpath.join(storage.name, files[0]['name']), settings, deadline
+                    )
+                except Exception:
+                    PROBE_SECONDS.labels(kind='download', outcome='failure').observe(time.monotonic() - download_started)
+                    raise
+                PROBE_SECONDS.labels(kind='download', outcome='success').observe(elapsed)
+                probe['download_bytes'] = received
+                probe['throughput_kbps'] = round(received / 1024 / elapsed, 1) if elapsed > 0 else None
+        probe['ok'] = True
+    except Exception as e:
+        import requests
+        if probe['list_ms'] is None:
+            PROBE_SECONDS.labels(kind='list', outcome='failure').observe(time.monotonic() - started)
+        probe['error'] = "探测超时" if isinstance(e, (ProbeTimeout, requests.Timeout)) else f"{type(e).__name__}: {e}"
+    return probe
+
+def _degraded_reason(probe, settings):
+    if not probe['ok']:
+        return f"探测失败: {probe['error']}"
+    if probe['list_ms'] is not None and probe['list_ms'] > settings['latency_threshold']:
+        return f"列目录耗时 {probe['list_ms']:.0f}ms 超过阈值 {settings['latency_threshold']:.0f}ms"
+    if settings['min_throughput'] and probe['throughput_kbps'] is not None \
+            and probe['throughput_kbps'] < settings['min_throughput']:
+        return f"下载速度 {probe['throughput_kbps']}KB/s 低于阈值 {settings['min_throughput']:.0f}KB/s"
+    return None
+
+def probe_storages(instance, storages, config, deadline=None):
+    """
+    探测实例下所有状态为 work 的存储 (就地修改 storages)，返回探测的个数。
+    每个存储增加 probe 字段和 latency_ms (列目录延迟)，不达标的存储状态改为 degraded。
+    deadline 为整次检查的截止时间 (time.monotonic)，探测阶段不会超过它。
+    """
+    settings = _load_settings(config)
+    targets = [s for s in storages if s.status == 'work']
+    if not targets:
+        return 0
+    # 探测阶段的总截止时间：按并发数分批，每批最多 timeout 秒
+    batches = -(-len(targets) // settings['concurrency'])
+    stage_timeout = settings['timeout'] * batches + 1
+    if deadline is not None:
+        stage_timeout = max(0, min(stage_timeout, deadline - time.monotonic()))
+    executor = ThreadPoolExecutor(max_workers=settings['concurrency'], thread_name_prefix='alist-probe')
+    futures = {executor.submit(_probe_one, instance, s, settings, deadline): s for s in targets}
+    try:
+        wait(futures, timeout=stage_timeout)
+    finally:
+        # 不等待卡住的探测线程，它们会在各自的截止时间后结束
+        executor.shutdown(wait=False, cancel_futures=True)
+    for future, storage in futures.items():
+        if future.done() and not future.cancelled():
+            probe = future.result()
+        else:
+            probe = {'ok': False, 'list_ms': None, 'download_bytes': 0, 'throughput_kbps': None, 'error': "探测超时"}
+        storage.probe = probe
+        storage.latency_ms = probe['list_ms']
+        reason = _degraded_reason(probe, settings)
+        if reason:
+            storage.alist_status, storage.status = storage.status, STATUS_DEGRADED
+            probe['reason'] = reason
+            logger.warning(f"存储 {storage.name} ({instance['name']}) 性能降级: {reason}")
+    return len(targets)
@@ -0,0 +1,139 @@
+# app/resilience.py
+import time
+import logging
+import threading
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# --- 截止时间、重试预算与熔断器 ---
+# 供请求 Alist 的代码共用：
+# - 每次检查有一个端到端的截止时间，单个请求的超时、重试前的等待都不会超过剩余时间；
+# - 重试预算：每个请求存入一部分重试令牌，每次重试取出一个，所有进程中的调用方 (定时检查、手动检查、
+#   分页并发请求) 共用保存在数据库中的同一个桶，Alist 整体不可用时重试次数受限，不会把请求量放大数倍；
+# - 熔断器：连续失败达到阈值后在冷却时间内直接失败，状态保存在共享数据库中，所有 worker 一致。
+#   Alist 实例 (alist:<实例名>) 和通知渠道 (notify:<渠道>，见 app/dispatch.py) 共用同一种熔断器。
+
+class DeadlineExceeded(Exception):
+    pass
+
+def remaining(deadline, message="检查超时"):
+    """距截止时间 (time.monotonic) 的剩余秒数，已超时时抛出 DeadlineExceeded"""
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded(message)
+    return left
+
+class RetryBudget:
+    """
+    令牌桶形式的重试预算，保存在共享数据库中，所有 worker 和调度器 leader 共用一个桶：
+    每个请求存入 ratio 个令牌，每次重试取出 1 个；另外每秒补充 min_per_sec 个，保证请求量很小时也能重试。
+    令牌数不超过 max_tokens。请求存入的令牌先在进程内累积，满一个令牌或需要重试时才写入数据库，
+    正常情况下不会为每个请求写一次数据库。
+    """
+
+    def __init__(self, name, ratio=0.2, min_per_sec=0.1, max_tokens=10.0):
+        self.name = name
+        self.ratio = ratio
+        self.min_per_sec = min_per_sec
+        self.max_tokens = max_tokens
+        self._pending = 0.0
+        self._lock = threading.Lock()
+
+    def _current(self, conn, now):
+        row = conn.execute('SELECT tokens, updated_at FROM retry_budgets WHERE name = ?', (self.name,)).fetchone()
+        if row is None:
+            return self.max_tokens
+        return min(self.max_tokens, row['tokens'] + (now - row['updated_at']) * self.min_per_sec)
+
+    def _update(self, take):
+        _ensure_schema()
+        now = time.time()
+        with db.transaction() as conn:
+            with self._lock:
+                pending, self._pending = self._pending, 0.0
+            tokens = min(self.max_tokens, self._current(conn, now) + pending)
+            granted = take and tokens >= 1
+            if granted:
+                tokens -= 1
+            conn.execute(
+                'INSERT OR REPLACE INTO retry_budgets (name, tokens, updated_at) VALUES (?, ?, ?)',
+                (self.name, tokens, now)
+            )
+        return granted
+
+    def record_request(self):
+        with self._lock:
+            self._pending += self.ratio
+            if self._pending < 1:
+                return
+        self._update(take=False)
+
+    def try_retry(self):
+        """取出一个重试令牌，预算不足时返回 False"""
+        return self._update(take=True)
+
+    @property
+    def tokens(self):
+        _ensure_schema()
+        return round(self._current(db.get_connection(), time.time()), 2)
+
+# --- 共享状态 (熔断器与重试预算) ---
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS circuit_breakers (
+    name TEXT PRIMARY KEY,
+    failures INTEGER NOT NULL,
+    opened_until REAL,
+    last_error TEXT
+);
+CREATE TABLE IF NOT EXISTS retry_budgets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+def _ensure_schema():
+    db.ensure_schema('resilience', _SCHEMA)
+
+def open_circuits(prefix):
+    """名称以 prefix 开头、当前处于熔断状态的熔断器，返回 {名称: 冷却结束时间}"""
+    _ensure_schema()
+    rows = db.get_connection().execute(
+        'SELECT name, opened_until FROM circuit_breakers WHERE substr(name, 1, ?) = ? AND opened_until > ?',
+        (len(prefix), prefix, time.time())
+    ).fetchall()
+    return {row['name']: row['opened_until'] for row in rows}
+
+def circuit_state(name):
+    """返回熔断器状态 {'open', 'failures', 'retry_at', 'last_error'}；冷却结束后 open 为 False (放行试探)"""
+    _ensure_schema()
+    row = db.get_connection().execute(
+        'SELECT failures, opened_until, last_error FROM circuit_breakers WHERE name = ?', (name,)
+    ).fetchone()
+    if row is None:
+        return {'open': False, 'failures': 0, 'retry_at': None, 'last_error': None}
+    is_open = row['opened_until'] is not None and row['opened_until'] > time.time()
+    return {'open': is_open, 'failures': row['failures'], 'retry_at': row['opened_until'] if is_open else None,
+            'last_error': row['last_error']}
+
+def record_result(name, success, threshold, cooldown, error=None):
+    """记录一次调用结果：成功时关闭熔断器，连续失败达到 threshold 次时熔断 cooldown 秒"""
+    _ensure_schema()
+    with db.transaction() as conn:
+        row = conn.execute('SELECT failures FROM circuit_breakers WHERE name = ?', (name,)).fetchone()
+        if success:
+            if row is not None:
+                conn.execute('DELETE FROM circuit_breakers WHERE name = ?', (name,))
+                if row['failures'] >= threshold:
+                    logger.info(f"{name} 已恢复，关闭熔断")
+            return
+        failures = (row['failures'] if row else 0) + 1
+        opened_until = time.time() + cooldown if failures >= threshold else None
+        conn.execute(
+            'INSERT OR REPLACE INTO circuit_breakers (name, failures, opened_until, last_error) VALUES (?, ?, ?, ?)',
+            (name, failures, opened_until, error)
+        )
+    if opened_until is not None:
+        logger.warning(f"{name} 连续失败 {failures} 次，熔断 {cooldown:.0f}秒")
@@ -0,0 +1,260 @@
+# app/snapshot.py
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from app import db, storages
+
+logger = logging.getLogger(__name__)
+
+# --- 存储状态快照缓存 ---
+# 最近一次的存储状态结果保存在共享数据库中，所有 gunicorn worker 和后台任务共用：
+# - 快照未超过 TTL 时直接返回，不再请求 Alist；
+# - 同一时间只有一个调用方真正请求 Alist (单飞)：进程内用 Event 等待，
+#   进程间通过数据库中的租约 (lease) 协调，其它进程轮询等待新快照写入。
+# - 快照带有单调递增的版本号 (version)：写入时与上一个快照逐个比较存储，有存储新增、删除或状态变化时
+#   版本号加一，变化的存储记录新的 changed_version，被删除的存储记入 storage_removals。
+#   客户端带上已有的版本号即可只获取之后的变化 (changes_since)。
+
+DEFAULT_TTL = 10           # 秒
+MAX_DELTA_VERSIONS = 1000  # 保留删除记录的版本数，更早的版本无法计算增量，需要重新获取全部存储
+LEASE_TIMEOUT = 120        # 持有租约的最长时间，超过后视为持有者已失效
+WAIT_POLL_INTERVAL = 0.1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS storage_snapshot (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    fetched_at REAL NOT NULL,
+    fingerprint TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS storage_snapshot_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    min_delta_version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS storage_removals (
+    version INTEGER NOT NULL,
+    instance TEXT,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_storage_removals_version ON storage_removals(version);
+CREATE TABLE IF NOT EXISTS storage_snapshot_lease (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+_owner_id = None
+_inflight_lock = threading.Lock()
+_inflight = None           # 本进程正在进行的请求: {'event': Event, 'result': ...}
+_parsed_cache = (None, None)  # (fetched_at, data)，避免重复解析同一个快照
+
+def _get_owner_id():
+    global _owner_id
+    if _owner_id is None or not _owner_id.startswith(f"{os.getpid()}:"):
+        _owner_id = f"{os.getpid()}:{uuid.uuid4().hex}"
+    return _owner_id
+
+def config_fingerprint(instances):
+    """根据实例配置计算指纹，配置变化后旧快照自动失效"""
+    raw = json.dumps([(i['name'], i['url'], i['token']) for i in instances], sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def _read_snapshot(fingerprint):
+    """读取共享快照，返回 (fetched_at, data)；不存在或配置已变化时返回 (None, None)"""
+    global _parsed_cache
+    db.ensure_schema('storage_snapshot', _SCHEMA)
+    conn = db.get_connection()
+    row = conn.execute('SELECT fetched_at, fingerprint FROM storage_snapshot WHERE id = 1').fetchone()
+    if row is None or row['fingerprint'] != fingerprint:
+        return None, None
+    cached_at, cached_data = _parsed_cache
+    if cached_at == row['fetched_at']:
+        return cached_at, cached_data
+    row = conn.execute('SELECT fetched_at, data FROM storage_snapshot WHERE id = 1').fetchone()
+    if row is None:
+        return None, None
+    _parsed_cache = (row['fetched_at'], storages.loads_result(row['data']))
+    return _parsed_cache
+
+def _previous_storages(conn):
+    """读取上一个快照 (不论配置指纹) 用于比较，本进程已解析过时直接使用"""
+    row = conn.execute('SELECT fetched_at FROM storage_snapshot WHERE id = 1').fetchone()
+    if row is None:
+        return None
+    cached_at, cached_data = _parsed_cache
+    if cached_at == row['fetched_at']:
+        return cached_data
+    row = conn.execute('SELECT data FROM storage_snapshot WHERE id = 1').fetchone()
+    return storages.loads_result(row['data']) if row else None
+
+def _track_changes(conn, data):
+    """设置快照版本、每个存储的 changed_version 和 change_times，记录被删除的存储"""
+    meta = conn.execute('SELECT version, min_delta_version FROM storage_snapshot_version WHERE id = 1').fetchone()
+    version, min_delta_version = (meta['version'], meta['min_delta_version']) if meta else (0, 0)
+    previous = _previous_storages(conn)
+    if previous is None:
+        # 没有上一个快照，无法知道哪些存储被删除，之前的版本都不能计算增量
+        previous_by_key, previous_times, min_delta_version = {}, {}, version + 1
+    else:
+        previous_by_key = {(s.instance, s.name): s for s in previous.get('storages', [])}
+        previous_times = previous.get('change_times') or {}
+    next_version = version + 1
+    changed = False
+    for s in data.get('storages', []):
+        old = previous_by_key.pop((s.instance, s.name), None)
+        # 驱动、状态或探测前的状态变化才算变化，探测延迟每次检查都不同，不计入
+        if old is not None and old.changed_version is not None and old.status == s.status \
+                and old.driver == s.driver and old.alist_status == s.alist_status:
+            s.changed_version = old.changed_version
+        else:
+            s.changed_version = next_version
+            changed = True
+    if changed or previous_by_key or previous is None:
+        version = next_version
+        conn.executemany(
+            'INSERT INTO storage_removals (version, instance, name) VALUES (?, ?, ?)',
+            [(version, instance, name) for instance, name in previous_by_key]
+        )
+        if version - MAX_DELTA_VERSIONS > min_delta_version:
+            min_delta_version = version - MAX_DELTA_VERSIONS
+            conn.execute('DELETE FROM storage_removals WHERE version < ?', (min_delta_version,))
+        conn.execute(
+            'INSERT OR REPLACE INTO storage_snapshot_version (id, version, min_delta_version) VALUES (1, ?, ?)',
+            (version, min_delta_version)
+        )
+    # 只保留仍被存储引用的版本时间
+    times = dict(previous_times, **{str(next_version): data.get('last_checked')})
+    referenced = {str(s.changed_version) for s in data.get('storages', [])}
+    data['version'] = version
+    data['change_times'] = {v: t for v, t in times.items() if v in referenced}
+
+def _write_snapshot(fingerprint, fetched_at, data):
+    global _parsed_cache
+    # 在写事务中与上一个快照比较，多个进程同时写入时版本号也不会重复
+    with db.transaction() as conn:
+        _track_changes(conn, data)
+        conn.execute(
+            'INSERT OR REPLACE INTO storage_snapshot (id, fetched_at, fingerprint, data) VALUES (1, ?, ?, ?)',
+            (fetched_at, fingerprint, storages.dumps_result(data))
+        )
+    _parsed_cache = (fetched_at, data)
+
+def changes_since(data, since):
+    """
+    返回快照 data 相对于版本 since 的变化 (变化的存储列表, 被删除的存储 [(实例, 名称)])。
+    since 早于保留的删除记录或晚于当前版本 (例如数据库被重置) 时返回 None，需要获取全部存储。
+    """
+    version = data.get('version')
+    if version is None:
+        return None
+    db.ensure_schema('storage_snapshot', _SCHEMA)
+    conn = db.get_connection()
+    meta = conn.execute('SELECT min_delta_version FROM storage_snapshot_version WHERE id = 1').fetchone()
+    if meta is None or since < meta['min_delta_version'] or since > version:
+        return None
+    changed = [s for s in data.get('storages', []) if s.changed_version is not None and s.changed_version > since]
+    present = {(s.instance, s.name) for s in data.get('storages', [])}
+    rows = conn.execute(
+        'SELECT DISTINCT instance, name FROM storage_removals WHERE version > ? AND version <= ?', (since, version)
+    ).fetchall()
+    # 删除后又重新出现的存储已包含在变化列表中
+    removed = [(row['instance'], row['name']) for row in rows if (row['instance'], row['name']) not in present]
+    return changed, removed
+
+def _try_acquire_lease():
+    now = time.time()
+    with db.transaction() as conn:
+        row = conn.execute('SELECT owner, expires_at FROM storage_snapshot_lease WHERE id = 1').fetchone()
+        if row and row['expires_at'] > now and row['owner'] != _get_owner_id():
+            return False
+        conn.execute(
+            'INSERT OR REPLACE INTO storage_snapshot_lease (id, owner, expires_at) VALUES (1, ?, ?)',
+            (_get_owner_id(), now + LEASE_TIMEOUT)
+        )
+    return True
+
+def _release_lease():
+    db.get_connection().execute('DELETE FROM storage_snapshot_lease WHERE id = 1 AND owner = ?', (_get_owner_id(),))
+
+def _lease_active():
+    row = db.get_connection().execute('SELECT expires_at FROM storage_snapshot_lease WHERE id = 1').fetchone()
+    return row is not None and row['expires_at'] > time.time()
+
+def _fetch_across_processes(fetch_func, fingerprint, requested_at):
+    """在进程间单飞：拿到租约的进程负责请求，其它进程等待新快照"""
+    while True:
+        if _try_acquire_lease():
+            try:
+                fetched_at = time.time()
+                data = fetch_func()
+                _write_snapshot(fingerprint, fetched_at, data)
+                return fetched_at, data
+            finally:
+                _release_lease()
+        # 其它进程正在请求，等待它写入比本次请求更新的快照
+        while _lease_active():
+            time.sleep(WAIT_POLL_INTERVAL)
+            fetched_at, data = _read_snapshot(fingerprint)
+            if fetched_at is not None and fetched_at >= requested_at - WAIT_POLL_INTERVAL:
+                return fetched_at, data
+        fetched_at, data = _read_snapshot(fingerprint)
+        if fetched_at is not None and fetched_at >= requested_at - WAIT_POLL_INTERVAL:
+            return fetched_at, data
+
+def get_snapshot(fetch_func, fingerprint, ttl=DEFAULT_TTL, force=False):
+    """
+    获取存储状态快照，返回 (data, age_seconds, cached)。
+    force=True 时忽略 TTL，但仍会与正在进行中的请求合并。
+    """
+    global _inflight
+    requested_at = time.time()
+    db.ensure_schema('storage_snapshot', _SCHEMA)
+    if ttl <= 0 and not force:
+        # 不缓存时仍然写入快照，以便记录版本和存储的变化
+        data = fetch_func()
+        _write_snapshot(fingerprint, requested_at, data)
+        return data, 0.0, False
+
+    if not force:
+        fetched_at, data = _read_snapshot(fingerprint)
+        if fetched_at is not None and requested_at - fetched_at < ttl:
+            return data, max(0.0, requested_at - fetched_at), True
+
+    # 进程内单飞：已有线程在请求时直接等待它的结果
+    with _inflight_lock:
+        inflight = _inflight
+        leader = inflight is None
+        if leader:
+            inflight = _inflight = {'event': threading.Event(), 'result': None, 'error': None}
+    if not leader:
+        inflight['event'].wait()
+        if inflight['error'] is not None:
+            raise inflight['error']
+        fetched_at, data = inflight['result']
+        # 与请求线程相同：请求在本次调用之后才开始时，结果是新获取的，不算命中快照
+        return data, max(0.0, time.time() - fetched_at), fetched_at < requested_at
+
+    try:
+        inflight['result'] = _fetch_across_processes(fetch_func, fingerprint, requested_at)
+    except Exception as e:
+        inflight['error'] = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight = None
+        inflight['event'].set()
+    fetched_at, data = inflight['result']
+    return data, max(0.0, time.time() - fetched_at), fetched_at < requested_at
+
+def invalidate_snapshot():
+    """删除共享快照，下次读取时重新请求 Alist"""
+    global _parsed_cache
+    db.ensure_schema('storage_snapshot', _SCHEMA)
+    db.get_connection().execute('DELETE FROM storage_snapshot')
+    _parsed_cache = (None, None)
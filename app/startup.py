@@ -0,0 +1,99 @@
+# app/startup.py
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# --- 启动过程与就绪检查 ---
+# 导入 app.main 只创建 Flask 应用、注册路由，耗时的初始化都推迟执行：
+# - 创建数据目录、初始化默认密码 (首次启动时需要 bcrypt 计算)、预热配置缓存、
+#   生成静态资源清单 (计算指纹并预压缩) 在后台线程中完成；
+# - 调度器、APScheduler 和 SQLAlchemy 只在选为 leader 的 worker 中加载 (见 app/leader.py)；
+# - requests 在第一次请求 Alist 或发送通知时才导入。
+# 各步骤的耗时记录在 _timings 中，启动时输出到日志，并在 /readyz 中返回。
+# /healthz 只表示进程存活；/readyz 在配置可用、数据库可读写、调度器已运行时才返回 200。
+
+_timings = {}   # 步骤 -> 毫秒
+_timings_lock = threading.Lock()
+_deferred_pid = None
+
+def record(step, started):
+    """记录从 started (time.perf_counter) 到现在的耗时"""
+    elapsed = round((time.perf_counter() - started) * 1000, 1)
+    with _timings_lock:
+        _timings[step] = elapsed
+    return elapsed
+
+@contextmanager
+def timed(step):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(step, started)
+
+def get_timings():
+    with _timings_lock:
+        return dict(_timings)
+
+def log_breakdown(title, steps):
+    timings = get_timings()
+    parts = [f"{step} {timings[step]:.0f}ms" for step in steps if step in timings]
+    logger.info(f"{title}: {', '.join(parts)}")
+
+# --- 延迟初始化 ---
+
+DEFERRED_STEPS = ('data_dir', 'default_password', 'config', 'assets')
+
+def _run_deferred():
+    from app import assets
+    from app.config import DATA_DIR, load_config, initialize_default_password
+    try:
+        with timed('data_dir'):
+            os.makedirs(DATA_DIR, exist_ok=True)
+        # 幂等操作，只在首次启动 (尚未设置密码) 时进行 bcrypt 计算
+        with timed('default_password'):
+            initialize_default_password()
+        with timed('config'):
+            load_config()
+        with timed('assets'):
+            assets.build_manifest()
+        log_breakdown(f"进程 {os.getpid()} 启动初始化完成", DEFERRED_STEPS)
+    except Exception as e:
+        logger.error(f"启动初始化失败: {e}", exc_info=True)
+
+def start_deferred():
+    """在当前进程中启动延迟初始化线程 (幂等，fork 之后的新进程会重新执行)"""
+    global _deferred_pid
+    if _deferred_pid == os.getpid():
+        return
+    with _timings_lock:
+        if _deferred_pid == os.getpid():
+            return
+        _deferred_pid = os.getpid()
+    threading.Thread(target=_run_deferred, name='startup', daemon=True).start()
+
+# --- 就绪检查 ---
+
+def readiness():
+    """返回 (是否就绪, 各项检查结果)"""
+    from app import db, leader
+    from app.config import load_config, get_password
+    checks = {}
+    try:
+        load_config()
+        checks['config'] = bool(get_password())
+    except Exception as e:
+        logger.warning(f"就绪检查: 读取配置失败: {e}")
+        checks['config'] = False
+    try:
+        db.get_connection().execute('SELECT 1').fetchone()
+        checks['database'] = True
+    except Exception as e:
+        logger.warning(f"就绪检查: 数据库不可用: {e}")
+        checks['database'] = False
+    checks['scheduler'] = leader.scheduler_ready()
+    return all(checks.values()), checks
@@ -0,0 +1,170 @@
+# app/state.py
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from app import db
+from app.config import MONITOR_STATUS_PATH
+
+logger = logging.getLogger(__name__)
+
+# --- 监控状态存储 ---
+# 监控状态保存在共享 SQLite 数据库的单行表中，替代原来每次都整体重写的 monitor_status.json：
+# - save_monitor_status() 整体覆盖并递增 version；
+# - compare_and_set_monitor_status() 只在当前值与预期一致时修改 (用于 is_monitoring/interval)；
+# - increment_check_count() 在内存中累积，由后台线程每 WRITE_BEHIND_INTERVAL 秒合并为一条
+#   UPDATE check_count = check_count + n 写入 (后写)，不会丢失其它进程的累加。
+#   累加绑定在读取时的 version 上，状态被重置 (启动/停止监控) 后，属于旧 version 的累加会被丢弃。
+
+WRITE_BEHIND_INTERVAL = 1.0  # 秒
+DEFAULT_STATUS = {'is_monitoring': False, 'start_time': None, 'check_count': 0, 'interval': None}
+_FIELDS = ('is_monitoring', 'start_time', 'interval', 'check_count')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS monitor_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    is_monitoring INTEGER NOT NULL DEFAULT 0,
+    start_time TEXT,
+    interval INTEGER,
+    check_count INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_pending = {}  # version -> 尚未写入的 check_count 累加值
+_pending_lock = threading.Lock()
+_flusher_pid = None
+
+def _column_value(field, value):
+    """把状态字段转换为数据库中保存的值"""
+    if field == 'is_monitoring':
+        return 1 if value else 0
+    if field == 'interval':
+        return int(value) if value else None
+    if field == 'check_count':
+        return int(value or 0)
+    return value
+
+def _row_values(status):
+    return tuple(_column_value(field, status.get(field)) for field in _FIELDS)
+
+def _ensure_schema():
+    if not db.ensure_schema('monitor_state', _SCHEMA):
+        return
+    with db.transaction() as conn:
+        if conn.execute('SELECT 1 FROM monitor_state WHERE id = 1').fetchone():
+            return
+        # 首次使用时导入旧的 monitor_status.json (在写锁内检查，避免多个 worker 重复导入)
+        status = dict(DEFAULT_STATUS)
+        if os.path.exists(MONITOR_STATUS_PATH):
+            try:
+                with open(MONITOR_STATUS_PATH, 'r', encoding='utf-8') as f:
+                    status.update(json.load(f))
+                os.replace(MONITOR_STATUS_PATH, MONITOR_STATUS_PATH + '.migrated')
+                logger.info("已将 monitor_status.json 导入数据库")
+            except (json.JSONDecodeError, IOError) as e:
+                logger.error(f"读取旧监控状态文件失败: {e}")
+        conn.execute(
+            'INSERT INTO monitor_state (id, is_monitoring, start_time, interval, check_count) VALUES (1, ?, ?, ?, ?)',
+            _row_values(status)
+        )
+
+def load_monitor_status():
+    """读取监控状态，check_count 包含本进程尚未写入的累加"""
+    _ensure_schema()
+    row = db.get_connection().execute(
+        'SELECT is_monitoring, start_time, interval, check_count, version FROM monitor_state WHERE id = 1'
+    ).fetchone()
+    with _pending_lock:
+        pending = _pending.get(row['version'], 0)
+    return {
+        'is_monitoring': bool(row['is_monitoring']), 'start_time': row['start_time'],
+        'check_count': row['check_count'] + pending, 'interval': row['interval'], 'version': row['version']
+    }
+
+def save_monitor_status(status):
+    """整体覆盖监控状态 (version 加一，之前未写入的累加作废)"""
+    _ensure_schema()
+    db.get_connection().execute(
+        'UPDATE monitor_state SET is_monitoring = ?, start_time = ?, interval = ?, check_count = ?, '
+        'version = version + 1 WHERE id = 1', _row_values(status)
+    )
+    return True
+
+def compare_and_set_monitor_status(expected, changes):
+    """
+    当前状态中 expected 给出的字段都与预期相同时，才应用 changes 并返回 True；否则不做修改，返回 False。
+    expected 可以包含 version，用于确认读取之后状态没有被其它进程修改过。
+    """
+    _ensure_schema()
+    sets, clauses, params = [], [], []
+    for field, value in changes.items():
+        if field in _FIELDS:
+            sets.append(f'{field} = ?')
+            params.append(_column_value(field, value))
+    sets.append('version = version + 1')
+    for field, value in expected.items():
+        if field != 'version' and field not in _FIELDS:
+            raise ValueError(f"未知的监控状态字段: {field}")
+        value = value if field == 'version' else _column_value(field, value)
+        if value is None:
+            clauses.append(f'{field} IS NULL')
+        else:
+            clauses.append(f'{field} = ?')
+            params.append(value)
+    where = ' AND '.join(['id = 1'] + clauses)
+    cursor = db.get_connection().execute(f"UPDATE monitor_state SET {', '.join(sets)} WHERE {where}", params)
+    return cursor.rowcount == 1
+
+def increment_check_count(version, delta=1):
+    """把 check_count 加 delta (后写)，返回累加后的值；状态已被重置 (version 不同) 时返回 None"""
+    status = load_monitor_status()
+    if status['version'] != version:
+        return None
+    with _pending_lock:
+        _pending[version] = _pending.get(version, 0) + delta
+    _ensure_flusher()
+    return status['check_count'] + delta
+
+def flush():
+    """立即写入本进程累积的 check_count"""
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return
+    try:
+        _ensure_schema()
+        with db.transaction() as conn:
+            for version, delta in pending.items():
+                conn.execute(
+                    'UPDATE monitor_state SET check_count = check_count + ? WHERE id = 1 AND version = ?',
+                    (delta, version)
+                )
+    except Exception:
+        # 写入失败时放回内存，下一轮重试
+        with _pending_lock:
+            for version, delta in pending.items():
+                _pending[version] = _pending.get(version, 0) + delta
+        raise
+
+def _flush_loop():
+    while True:
+        time.sleep(WRITE_BEHIND_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"写入监控状态失败: {e}")
+
+def _ensure_flusher():
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _pending_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    atexit.register(flush)
+    threading.Thread(target=_flush_loop, name='monitor-state-flusher', daemon=True).start()
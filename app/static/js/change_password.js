@@ -0,0 +1,97 @@
+document.getElementById('change-password-form').addEventListener('submit', function (event) {
+    event.preventDefault();
+
+    const form = event.target;
+    const changePasswordButton = document.getElementById('change-password-button');
+    const originalButtonText = changePasswordButton.innerHTML;
+
+    // 验证表单
+    const oldPassword = document.getElementById('old-password').value;
+    const newPassword = document.getElementById('new-password').value;
+    const confirmPassword = document.getElementById('confirm-password').value;
+
+    if (!oldPassword || !newPassword || !confirmPassword) {
+        showToast('请填写所有字段', 'error');
+        return;
+    }
+
+    if (newPassword !== confirmPassword) {
+        showToast('两次输入的新密码不一致', 'error');
+        return;
+    }
+
+    if (newPassword.length < 6) {
+        showToast('新密码长度至少为6个字符', 'error');
+        return;
+    }
+
+    // 显示加载状态
+    changePasswordButton.disabled = true;
+    changePasswordButton.classList.add('login-button-loading');
+    changePasswordButton.innerHTML = '<i class="fa fa-spinner fa-spin mr-2"></i>处理中...';
+
+    fetch('/api/change_password', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ old_password: oldPassword, new_password: newPassword })
+    })
+    .then(response => response.json())
+    .then(data => {
+        // 恢复按钮状态
+        changePasswordButton.disabled = false;
+        changePasswordButton.classList.remove('login-button-loading');
+        changePasswordButton.innerHTML = originalButtonText;
+
+        if (data.success) {
+            showToast(data.message, 'success');
+            // 延迟跳转以显示成功消息
+            setTimeout(() => {
+                window.location.href = '/';
+            }, 1500);
+        } else {
+            showToast(data.message, 'error');
+        }
+    })
+    .catch(error => {
+        console.error('修改密码失败:', error);
+        // 恢复按钮状态
+        changePasswordButton.disabled = false;
+        changePasswordButton.classList.remove('login-button-loading');
+        changePasswordButton.innerHTML = originalButtonText;
+        showToast('修改密码失败，请稍后重试', 'error');
+    });
+});
+
+function showToast(message, type = 'success') {
+    const toast = document.getElementById('toast');
+    const toastIcon = document.getElementById('toast-icon');
+    const toastMessage = document.getElementById('toast-message');
+
+    // 移除所有类型类
+    toast.classList.remove('toast-success', 'toast-error', 'toast-warning', 'toast-info');
+
+    // 添加适当的类型类
+    if (type === 'success') {
+        toast.classList.add('toast-success');
+        toastIcon.className = 'fa fa-check-circle mr-3 text-white';
+    } else if (type === 'error') {
+        toast.classList.add('toast-error');
+        toastIcon.className = 'fa fa-times-circle mr-3 text-white';
+    } else if (type === 'warning') {
+        toast.classList.add('toast-warning');
+        toastIcon.className = 'fa fa-exclamation-triangle mr-3 text-white';
+    } else {
+        toast.classList.add('toast-info');
+        toastIcon.className = 'fa fa-info-circle mr-3 text-white';
+    }
+
+    toastMessage.textContent = message;
+
+    // 显示toast
+    toast.classList.remove('opacity-0', 'translate-y-10');
+
+    // 定时隐藏
+    setTimeout(() => {
+        toast.classList.add('opacity-0', 'translate-y-10');
+    }, 3000);
+}
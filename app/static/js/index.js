@@ -0,0 +1,391 @@
+let monitorStartTime = null;
+let isMonitoring = false;
+// 最近一次读取到的监控状态版本，启动/停止时带上，状态已被其它页面修改时服务器返回 409
+let monitorVersion = null;
+let currentNotificationMethod = 'wecom'; 
+let hasAlistInstances = false;
+
+const startButton = document.getElementById('start-monitor');
+const stopButton = document.getElementById('stop-monitor');
+const notificationToggleButton = document.getElementById('notification-toggle-btn');
+const wecomConfigContainer = document.getElementById('wecom-config-container');
+const tgConfigContainer = document.getElementById('tg-config-container');
+
+let durationInterval = null;
+let statusRefreshInterval = null;
+let eventSource = null;
+const renderedNotificationIds = new Set();
+// 存储表格按版本增量更新：storageVersion 为已渲染的快照版本，storageRows 为 实例+名称 -> 表格行
+let storageVersion = null;
+let storageMultiInstance = false;
+const storageRows = new Map();
+
+function updateNotificationUI(method) {
+    if (method === 'tg') {
+        currentNotificationMethod = 'tg';
+        wecomConfigContainer.classList.add('hidden');
+        tgConfigContainer.classList.remove('hidden');
+        notificationToggleButton.innerHTML = `<i class="fa fa-telegram text-sky-500"></i><span>Telegram</span>`;
+    } else { 
+        currentNotificationMethod = 'wecom';
+        wecomConfigContainer.classList.remove('hidden');
+        tgConfigContainer.classList.add('hidden');
+        notificationToggleButton.innerHTML = `<i class="fa fa-weixin text-green-500"></i><span>企业微信</span>`;
+    }
+}
+
+function syncMonitorStatus() {
+    fetch('/api/monitor_status').then(response => response.json())
+    .then(data => {
+        monitorVersion = data.version ?? monitorVersion;
+        if (data.is_monitoring) {
+            if (data.start_time) monitorStartTime = new Date(data.start_time);
+            document.getElementById('check-count').textContent = data.check_count || 0;
+        }
+    }).catch(error => { console.error('同步监控状态失败:', error); clearInterval(statusRefreshInterval); statusRefreshInterval = null; });
+}
+
+// 订阅服务器推送事件，替代定时轮询；浏览器断线后会自动带上 Last-Event-ID 重连
+function connectEventStream() {
+    if (!window.EventSource || eventSource) return;
+    eventSource = new EventSource('/api/events');
+    eventSource.addEventListener('monitor_status', event => {
+        const data = JSON.parse(event.data);
+        monitorVersion = data.version ?? monitorVersion;
+        if (data.is_monitoring !== isMonitoring) { checkAndRestoreMonitorStatus(); return; }
+        if (data.is_monitoring) {
+            if (data.start_time) monitorStartTime = new Date(data.start_time);
+            document.getElementById('check-count').textContent = data.check_count || 0;
+        }
+    });
+    eventSource.addEventListener('storage_status', () => updateStorageStatus());
+    eventSource.addEventListener('notification', event => addNotification(JSON.parse(event.data), true));
+}
+
+document.addEventListener('DOMContentLoaded', function () {
+    loadConfig();
+    connectEventStream();
+    document.querySelectorAll('.logout-trigger').forEach(button => {
+        button.addEventListener('click', function(event) {
+            event.preventDefault();
+            fetch('/api/logout', { method: 'POST' }).then(response => response.json())
+            .then(data => {
+                if(data.success) {
+                    showToast('已安全退出', 'success');
+                    setTimeout(() => { window.location.href = '/login'; }, 1000);
+                }
+            }).catch(error => { console.error("退出时发生错误", error); showToast('退出时发生错误', 'error'); });
+        });
+    });
+
+    notificationToggleButton.addEventListener('click', function() {
+        const newMethod = currentNotificationMethod === 'wecom' ? 'tg' : 'wecom';
+        updateNotificationUI(newMethod);
+    });
+});
+
+startButton.addEventListener('click', startMonitoring);
+stopButton.addEventListener('click', stopMonitoring);
+document.getElementById('check-button').addEventListener('click', performManualCheck);
+
+function loadConfig() {
+    fetch('/api/config').then(response => response.json())
+    .then(data => {
+        document.getElementById('alist-url').value = data.ALIST_URL || '';
+        document.getElementById('alist-token').value = data.ALIST_TOKEN || '';
+        document.getElementById('wecom-webhook').value = data.WECOM_WEBHOOK || '';
+        document.getElementById('tg-bot-token').value = data.TG_BOT_TOKEN || '';
+        document.getElementById('tg-chat-id').value = data.TG_CHAT_ID || '';
+        hasAlistInstances = Array.isArray(data.ALIST_INSTANCES) && data.ALIST_INSTANCES.length > 0;
+
+        const initialMethod = data.NOTIFICATION_METHOD || 'wecom';
+        updateNotificationUI(initialMethod);
+
+        updateStorageStatus();
+        checkAndRestoreMonitorStatus();
+        loadAndRenderNotifications();
+    }).catch(error => { console.error('获取配置失败:', error); showToast('获取配置失败', 'error'); updateStorageStatus(); });
+}
+
+document.getElementById('config-form').addEventListener('submit', function (event) {
+    event.preventDefault();
+    const config = { 
+        ALIST_URL: document.getElementById('alist-url').value, 
+        ALIST_TOKEN: document.getElementById('alist-token').value, 
+        WECOM_WEBHOOK: document.getElementById('wecom-webhook').value,
+        TG_BOT_TOKEN: document.getElementById('tg-bot-token').value,
+        TG_CHAT_ID: document.getElementById('tg-chat-id').value,
+        NOTIFICATION_METHOD: currentNotificationMethod
+    };
+    fetch('/api/config', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(config) })
+    .then(response => response.json())
+    .then(data => {
+        showToast(data.message || '配置保存成功', 'success');
+        updateStorageStatus();
+        if (isMonitoring) { showToast('配置已保存，若需更改监控间隔请重启监控', 'info'); }
+    }).catch(error => { console.error('保存配置失败:', error); showToast('保存配置失败', 'error'); });
+});
+
+document.getElementById('test-notification').addEventListener('click', function () {
+    this.disabled = true; this.innerHTML = '<i class="fa fa-spinner fa-spin mr-1"></i>发送中...';
+    fetch('/api/notify/test', { method: 'POST' })
+    .then(response => response.json()).then(data => { 
+        loadAndRenderNotifications(); 
+        const deliveryIds = data.delivery_ids || (data.delivery_id ? [data.delivery_id] : []);
+        if (!data.success || !deliveryIds.length) { showToast(data.message, data.success ? 'success' : 'error'); return; }
+        showToast(data.message, 'info');
+        return Promise.all(deliveryIds.map(id => waitForDelivery(id).then(delivery => {
+            const result = delivery && delivery.result;
+            if (!result) { showToast('通知仍在发送队列中，请稍后查看', 'warning'); return; }
+            showToast(result.message, result.success ? 'success' : 'error');
+        }))).then(() => loadAndRenderNotifications());
+    })
+    .catch(error => { showToast('发送测试通知失败', 'error'); })
+    .finally(() => { this.disabled = false; this.innerHTML = '<i class="fa fa-paper-plane mr-1"></i>测试通知'; });
+});
+
+// 轮询投递状态，直到发送完成或超时
+function waitForDelivery(deliveryId, attempts = 30) {
+    return fetch(`/api/notify/deliveries/${deliveryId}`).then(response => response.json())
+    .then(data => {
+        const delivery = data.delivery;
+        if (!delivery || ['sent', 'failed', 'coalesced'].includes(delivery.status) || attempts <= 1) return delivery;
+        return new Promise(resolve => setTimeout(resolve, 1000)).then(() => waitForDelivery(deliveryId, attempts - 1));
+    });
+}
+
+function checkAndRestoreMonitorStatus() {
+    fetch('/api/monitor_status').then(response => response.json())
+    .then(data => {
+        isMonitoring = data.is_monitoring;
+        monitorVersion = data.version ?? null;
+        const monitorStatsCard = document.getElementById('monitor-stats');
+        if (data.is_monitoring) {
+            if (data.start_time) monitorStartTime = new Date(data.start_time);
+            if (data.interval) document.getElementById('monitor-interval').value = data.interval;
+            document.getElementById('check-count').textContent = data.check_count || 0;
+            startButton.classList.add('hidden');
+            stopButton.classList.remove('hidden');
+            document.getElementById('monitor-status').className = 'monitor-status monitor-active px-2.5 py-1 rounded-full text-xs font-medium flex items-center';
+            document.getElementById('monitor-status').innerHTML = '<i class="fa fa-check-circle mr-1"></i>运行中';
+            monitorStatsCard.classList.remove('hidden');
+            updateMonitorStats();
+            if(durationInterval) clearInterval(durationInterval);
+            durationInterval = setInterval(updateMonitorStats, 1000);
+            if(statusRefreshInterval) clearInterval(statusRefreshInterval);
+            // 不支持 SSE 的浏览器才回退到定时轮询
+            if (!window.EventSource) statusRefreshInterval = setInterval(syncMonitorStatus, 15000);
+        } else {
+            stopMonitoringUI();
+        }
+    }).catch(error => { console.error('检查监控状态失败:', error); showToast('无法获取后台监控状态', 'error'); });
+}
+
+function performManualCheck() {
+    const checkButton = document.getElementById('check-button');
+    checkButton.disabled = true; checkButton.innerHTML = '<i class="fa fa-spinner fa-spin mr-1"></i>检查中...';
+    fetch('/api/check_storage', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ storage_path: document.getElementById('alist-url').value, api_key: document.getElementById('alist-token').value }) })
+    .then(response => { if (!response.ok) throw new Error(`HTTP错误! 状态码: ${response.status}`); return response.json(); })
+    .then(data => {
+        showToast(data.message || '检查完成', 'success');
+        updateStorageStatus(true);
+        syncMonitorStatus();
+        loadAndRenderNotifications();
+    }).catch(error => { showToast('检查失败: ' + error.message, 'error'); console.error('检查存储失败:', error); })
+    .finally(() => { checkButton.disabled = false; checkButton.innerHTML = '<i class="fa fa-refresh mr-1"></i>手动检查'; });
+}
+
+function startMonitoring() {
+    const intervalSelect = document.getElementById('monitor-interval');
+    const monitorIntervalSeconds = parseInt(intervalSelect.value, 10);
+    const startTime = new Date().toISOString();
+    startButton.disabled = true; startButton.innerHTML = '<i class="fa fa-spinner fa-spin mr-1"></i>启动中...';
+
+    fetch('/api/monitor_status', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ is_monitoring: true, interval: monitorIntervalSeconds, start_time: startTime, version: monitorVersion }) })
+    .then(response => response.json())
+    .then(data => {
+        if (data.status) monitorVersion = data.status.version;
+        if (data.success) {
+            showToast('监控已在后台成功启动', 'success');
+            checkAndRestoreMonitorStatus();
+            performManualCheck(); 
+            fetch('/api/notify/start', { 
+                method: 'POST', 
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ 
+                    start_time: startTime, 
+                    interval: getIntervalText(intervalSelect.value) 
+                }) 
+            });
+        } else { showToast(`启动失败: ${data.message}`, 'error'); if (data.status) checkAndRestoreMonitorStatus(); }
+    }).catch(error => { showToast('启动监控请求失败', 'error'); console.error('启动监控请求失败:', error); })
+    .finally(() => { startButton.disabled = false; startButton.innerHTML = '<i class="fa fa-play mr-1"></i>开启监控'; });
+}
+
+function stopMonitoring() {
+    stopButton.disabled = true; stopButton.innerHTML = '<i class="fa fa-spinner fa-spin mr-1"></i>停止中...';
+
+    let duration = 'N/A';
+    if (monitorStartTime) {
+        duration = calculateDuration(monitorStartTime, new Date());
+    }
+
+    fetch('/api/monitor_status', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ is_monitoring: false, version: monitorVersion })})
+    .then(response => response.json())
+    .then(data => {
+        if (data.status) monitorVersion = data.status.version;
+        if (data.success) {
+            showToast('监控已在后台成功停止', 'success');
+            stopMonitoringUI();
+            fetch('/api/notify/stop', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ duration: duration })
+            });
+        } else { showToast(`停止失败: ${data.message}`, 'error'); if (data.status) checkAndRestoreMonitorStatus(); }
+    }).catch(error => { showToast('停止监控请求失败', 'error'); console.error('停止监控请求失败:', error); })
+    .finally(() => { stopButton.disabled = false; stopButton.innerHTML = '<i class="fa fa-stop mr-1"></i>停止监控'; });
+}
+
+function stopMonitoringUI() {
+    isMonitoring = false;
+    clearInterval(durationInterval); durationInterval = null;
+    clearInterval(statusRefreshInterval); statusRefreshInterval = null;
+    startButton.classList.remove('hidden'); stopButton.classList.add('hidden');
+    document.getElementById('monitor-status').className = 'monitor-status monitor-inactive px-2.5 py-1 rounded-full text-xs font-medium flex items-center';
+    document.getElementById('monitor-status').innerHTML = '<i class="fa fa-circle-o mr-1"></i>未启动';
+    document.getElementById('monitor-stats').classList.add('hidden');
+}
+
+function updateMonitorStats() {
+    if (!monitorStartTime) return;
+    const now = new Date();
+    const duration = calculateDuration(monitorStartTime, now);
+    document.getElementById('monitor-start-time').textContent = new Date(monitorStartTime).toLocaleString('zh-CN', { timeZone: 'Asia/Shanghai', hour12: false });
+    document.getElementById('monitor-duration').textContent = duration;
+}
+
+function calculateDuration(start, end) {
+    const diff = end - start;
+    const hours = Math.floor(diff / 3600000).toString().padStart(2, '0');
+    const minutes = Math.floor((diff % 3600000) / 60000).toString().padStart(2, '0');
+    const seconds = Math.floor((diff % 60000) / 1000).toString().padStart(2, '0');
+    return `${hours}:${minutes}:${seconds}`;
+}
+
+function getIntervalText(seconds) {
+    const intervals = {"600": "10分钟", "900": "15分钟", "1800": "30分钟", "3600": "1小时", "7200": "2小时"};
+    return intervals[seconds] || seconds + "秒";
+}
+
+function updateStorageStatus(force = false) {
+    const alistUrl = document.getElementById('alist-url').value; const alistToken = document.getElementById('alist-token').value;
+    if (!hasAlistInstances && (!alistUrl || !alistToken)) { if (!force) return; document.getElementById('storage-table-body').innerHTML = `<tr><td colspan="4" class="px-6 py-10 text-center text-warning"><i class="fa fa-exclamation-triangle mr-3 text-warning/70"></i>请先配置Alist地址和令牌</td></tr>`; return; }
+    // 已渲染过表格时只请求上次版本之后的变化，强制刷新时重新获取全部
+    const incremental = storageVersion !== null && !force;
+    const emptyMessage = message => `<tr><td colspan="4" class="px-6 py-10 text-center text-gray-400"><i class="fa fa-info-circle mr-3 text-gray-300"></i>${message || '没有找到存储信息'}</td></tr>`;
+    if (!incremental) document.getElementById('storage-table-body').innerHTML = `<tr><td colspan="4" class="px-6 py-10 text-center text-gray-400"><i class="fa fa-spinner fa-spin mr-3 text-lg"></i>加载中...</td></tr>`;
+    fetch(incremental ? `/api/storage_list?since=${storageVersion}` : '/api/storage_list').then(response => { if (!response.ok) throw new Error(`HTTP错误! 状态码: ${response.status}`); return response.json(); })
+    .then(data => {
+        const tableBody = document.getElementById('storage-table-body');
+        const multiInstance = (data.instances || []).length > 1;
+        if (!data.success) { storageVersion = null; storageRows.clear(); tableBody.innerHTML = emptyMessage(data.message); return; }
+        if (data.full === false && multiInstance === storageMultiInstance) {
+            data.removed.forEach(storage => { const row = storageRows.get(storageKey(storage)); if (row) { row.remove(); storageRows.delete(storageKey(storage)); } });
+            data.storages.forEach(storage => {
+                const key = storageKey(storage); const oldRow = storageRows.get(key);
+                const row = addStorageRow(tableBody, storage, multiInstance);
+                if (oldRow) oldRow.replaceWith(row);
+                storageRows.set(key, row);
+            });
+        } else {
+            tableBody.innerHTML = ''; storageRows.clear();
+            (data.storages || []).forEach(storage => { storageRows.set(storageKey(storage), addStorageRow(tableBody, storage, multiInstance)); });
+        }
+        storageMultiInstance = multiInstance;
+        storageVersion = data.version ?? null;
+        if (storageRows.size === 0) { storageVersion = null; tableBody.innerHTML = emptyMessage(data.message); }
+    }).catch(error => { storageVersion = null; storageRows.clear(); document.getElementById('storage-table-body').innerHTML = `<tr><td colspan="4" class="px-6 py-10 text-center text-danger"><i class="fa fa-times-circle mr-3 text-danger/70"></i>获取存储状态失败: ${error.message}</td></tr>`; showToast('获取存储状态失败', 'error'); console.error('获取存储状态失败:', error); });
+}
+
+function storageKey(storage) { return `${storage.instance || ''}\u0000${storage.name}`; }
+
+function addStorageRow(tableBody, storage, multiInstance = false) {
+    const row = tableBody.insertRow(); row.className = 'storage-row hover:bg-gray-500/5 transition-colors duration-200';
+    const instanceLabel = multiInstance && storage.instance ? `<span class="mr-2 px-1.5 py-0.5 rounded bg-primary-light text-primary text-xs">${storage.instance}</span>` : '';
+    const nameCell = row.insertCell(); nameCell.className = 'px-6 py-4 whitespace-nowrap'; nameCell.innerHTML = `<div class="flex items-center"><i class="fa fa-hdd-o mr-2.5 text-primary/70"></i>${instanceLabel}<span>${storage.name}</span></div>`;
+    const statusCell = row.insertCell(); statusCell.className = 'px-6 py-4 whitespace-nowrap';
+    let statusClass = 'status-badge-neutral', statusIcon = 'fa-circle-o';
+    if (storage.status === 'work') { statusClass = 'status-badge-success'; statusIcon = 'fa-check-circle'; } 
+    else if (storage.status === 'disabled') { statusClass = 'status-badge-neutral'; statusIcon = 'fa-pause-circle'; } 
+    else if (storage.status === 'degraded') { statusClass = 'status-badge-warning'; statusIcon = 'fa-tachometer'; } 
+    else { statusClass = 'status-badge-error'; statusIcon = 'fa-exclamation-circle'; }
+    statusCell.innerHTML = `<span class="status-badge ${statusClass} inline-flex items-center px-2.5 py-0.5 rounded-full text-xs font-medium"><i class="fa ${statusIcon} mr-1"></i>${storage.status || '未知状态'}</span>`;
+    if (storage.probe) { statusCell.title = storage.probe.reason || (storage.probe.list_ms !== null ? `列目录 ${storage.probe.list_ms}ms` : ''); }
+    const typeCell = row.insertCell(); typeCell.className = 'px-6 py-4 whitespace-nowrap'; typeCell.innerHTML = `<div class="flex items-center"><i class="fa fa-folder mr-2.5 text-primary/70"></i><span>${storage.driver || '未知类型'}</span></div>`;
+    const lastUpdateCell = row.insertCell(); lastUpdateCell.className = 'px-6 py-4 whitespace-nowrap text-sm text-gray-500';
+    lastUpdateCell.innerHTML = `<i class="fa fa-clock-o mr-1 text-gray-400"></i>${formatLastUpdateTime(storage.last_changed)}`;
+    return row;
+}
+
+function formatLastUpdateTime(dateString) {
+    if (!dateString) return "N/A";
+    const date = new Date(dateString);
+    return date.toLocaleString('zh-CN', { timeZone: 'Asia/Shanghai', hour12: false });
+}
+
+function showToast(message, type = 'success') {
+    const toast = document.getElementById('toast'); const toastIcon = document.getElementById('toast-icon'); const toastMessage = document.getElementById('toast-message');
+    if (type === 'success') toastIcon.className = 'fa fa-check-circle mr-3';
+    else if (type === 'error') toastIcon.className = 'fa fa-times-circle mr-3';
+    else if (type === 'warning') toastIcon.className = 'fa fa-exclamation-triangle mr-3';
+    else toastIcon.className = 'fa fa-info-circle mr-3';
+    toastMessage.textContent = message;
+    toast.classList.remove('translate-y-10', 'opacity-0'); toast.classList.add('translate-y-0', 'opacity-100');
+    setTimeout(() => { toast.classList.remove('translate-y-0', 'opacity-100'); toast.classList.add('translate-y-10', 'opacity-0'); }, 3000);
+}
+
+function loadAndRenderNotifications() {
+    const container = document.getElementById('notification-container');
+    container.innerHTML = `<div class="text-center text-gray-400 py-8"><i class="fa fa-spinner fa-spin mr-2"></i>正在加载通知...</div>`;
+    fetch('/api/notifications').then(response => response.json())
+    .then(notifications => {
+        container.innerHTML = '';
+        renderedNotificationIds.clear();
+        if (notifications && notifications.length > 0) {
+            notifications.forEach(addNotification);
+        } else {
+            container.innerHTML = `<div id="no-notification-hint" class="text-center text-gray-400 py-8"><i class="fa fa-info-circle mr-2 text-gray-300"></i>暂无通知记录</div>`;
+        }
+    }).catch(error => { console.error('加载通知记录失败:', error); container.innerHTML = `<div class="text-center text-danger py-8"><i class="fa fa-times-circle mr-2"></i>加载通知记录失败</div>`; });
+}
+
+function addNotification(notification, prepend = false) {
+    if (notification.id !== undefined) {
+        if (renderedNotificationIds.has(notification.id)) return;
+        renderedNotificationIds.add(notification.id);
+    }
+    const container = document.getElementById('notification-container');
+    const noNotificationHint = document.getElementById('no-notification-hint');
+    if (noNotificationHint) { try { container.removeChild(noNotificationHint); } catch(e){} }
+    const item = document.createElement('div'); item.className = 'notification-item';
+    let iconClass = 'fa-info-circle', badgeClass = 'bg-blue-100/70 text-blue-800';
+    if (notification.type === 'success') { iconClass = 'fa-check-circle'; badgeClass = 'bg-green-100/70 text-green-800'; } 
+    else if (notification.type === 'warning') { iconClass = 'fa-exclamation-triangle'; badgeClass = 'bg-yellow-100/70 text-yellow-800'; } 
+    else if (notification.type === 'error') { iconClass = 'fa-times-circle'; badgeClass = 'bg-red-100/70 text-red-800'; }
+    const timestamp = new Date(notification.timestamp).toLocaleString('zh-CN', { timeZone: 'Asia/Shanghai', hour12: false });
+    const typeMap = { info: '监控信息', success: '成功', warning: '警告', error: '错误' };
+    const displayType = typeMap[notification.type] || notification.type;
+    item.innerHTML = `<div class="flex justify-between items-start mb-2"><div class="flex items-center gap-2"><span class="p-2 rounded-full ${badgeClass}"><i class="fa ${iconClass} text-base"></i></span><span class="font-medium">${displayType}</span></div><span class="text-xs text-gray-400">${timestamp}</span></div><p class="text-sm text-gray-700">${notification.message.replace(/\n/g, '<br>')}</p>`;
+    if (prepend) container.insertBefore(item, container.firstChild); else container.appendChild(item);
+}
+
+document.getElementById('clear-notifications').addEventListener('click', function () {
+    this.disabled = true;
+    fetch('/api/notifications', { method: 'DELETE' }).then(response => response.json())
+    .then(data => {
+        if (data.success) { showToast('通知记录已清除', 'success'); loadAndRenderNotifications(); } 
+        else { showToast('清除失败', 'error'); }
+    }).catch(error => { console.error('清除通知失败:', error); showToast('清除失败', 'error'); })
+    .finally(() => { this.disabled = false; });
+});
@@ -0,0 +1,86 @@
+document.getElementById('login-form').addEventListener('submit', function (event) {
+    event.preventDefault();
+
+    const form = event.target;
+    const loginButton = document.getElementById('login-button');
+    const originalButtonText = loginButton.innerHTML;
+
+    // 验证表单
+    const username = document.getElementById('username').value;
+    const password = document.getElementById('password').value;
+
+    if (!username || !password) {
+        showToast('请输入用户名和密码', 'error');
+        return;
+    }
+
+    // 显示加载状态
+    loginButton.disabled = true;
+    loginButton.classList.add('login-button-loading');
+    loginButton.innerHTML = '<i class="fa fa-spinner fa-spin mr-2"></i>登录中...';
+
+    fetch('/api/login', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ username, password })
+    })
+    .then(response => response.json())
+    .then(data => {
+        // 恢复按钮状态
+        loginButton.disabled = false;
+        loginButton.classList.remove('login-button-loading');
+        loginButton.innerHTML = originalButtonText;
+
+        if (data.success) {
+            showToast(data.message, 'success');
+            // 使用后端返回的redirect字段进行跳转
+            setTimeout(() => {
+                window.location.href = data.redirect || '/';
+            }, 1000);
+        } else {
+            showToast(data.message, 'error');
+        }
+    })
+    .catch(error => {
+        console.error('登录失败:', error);
+        // 恢复按钮状态
+        loginButton.disabled = false;
+        loginButton.classList.remove('login-button-loading');
+        loginButton.innerHTML = originalButtonText;
+        showToast('登录失败，请稍后重试', 'error');
+    });
+});
+
+function showToast(message, type = 'success') {
+    const toast = document.getElementById('toast');
+    const toastIcon = document.getElementById('toast-icon');
+    const toastMessage = document.getElementById('toast-message');
+
+    // 移除所有类型类
+    toast.classList.remove('toast-success', 'toast-error', 'toast-warning', 'toast-info');
+
+    // 添加适当的类型类
+    if (type === 'success') {
+        toast.classList.add('toast-success');
+        toastIcon.className = 'fa fa-check-circle mr-3 text-white';
+    } else if (type === 'error') {
+        toast.classList.add('toast-error');
+        toastIcon.className = 'fa fa-times-circle mr-3 text-white';
+    } else if (type === 'warning') {
+        toast.classList.add('toast-warning');
+        toastIcon.className = 'fa fa-exclamation-triangle mr-3 text-white';
+    } else {
+        toast.classList.add('toast-info');
+        toastIcon.className = 'fa fa-info-circle mr-3 text-white';
+    }
+
+    toastMessage.textContent = message;
+
+    // 显示toast
+    toast.classList.remove('opacity-0', 'translate-y-10');
+
+    // 定时隐藏
+    setTimeout(() => {
+        toast.classList.add('opacity-0', 'translate-y-10');
+    }, 3000);
+}
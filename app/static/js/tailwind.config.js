@@ -0,0 +1,33 @@
+tailwind.config = {
+    theme: {
+        extend: {
+            colors: {
+                primary: '#4F46E5',
+                secondary: '#10B981',
+                warning: '#F59E0B',
+                danger: '#EF4444',
+                dark: '#1E293B',
+                light: '#F8FAFC',
+                monitor: '#10B981',
+                card: '#FFFFFF',
+                'card-border': '#E2E8F0',
+                'status-success': '#10B981',
+                'status-warning': '#F59E0B',
+                'status-error': '#EF4444',
+                'primary-light': '#EEF2FF',
+                'secondary-light': '#D1FAE5',
+                'warning-light': '#FEF3C7',
+                'danger-light': '#FEE2E2'
+            },
+            fontFamily: {
+                inter: ['Inter', 'system-ui', 'sans-serif']
+            },
+            boxShadow: {
+                'card': '0 4px 12px rgba(0, 0, 0, 0.05)',
+                'card-hover': '0 8px 24px rgba(0, 0, 0, 0.1)',
+                'btn': '0 4px 6px -1px rgba(79, 70, 229, 0.3)',
+                'btn-hover': '0 10px 15px -3px rgba(79, 70, 229, 0.4)',
+            }
+        }
+    }
+};
@@ -0,0 +1,127 @@
+# app/storages.py
+import json
+from operator import attrgetter
+from json.encoder import encode_basestring
+
+# --- 存储记录 ---
+# 存储数量可能上万，每个存储用带 __slots__ 的 StorageRecord 表示，只保存用到的字段；
+# 每个存储只记录状态最后一次变化时的快照版本 (changed_version)，版本对应的时间只在结果中保存一次
+# (change_times)，序列化给前端时再作为每个存储的 last_changed 输出。
+# 快照按列存储 (字段名只出现一次)，API 响应直接由记录拼接 JSON，不构造中间字典。
+
+class StorageRecord:
+    __slots__ = ('name', 'instance', 'driver', 'status', 'alist_status', 'probe', 'latency_ms', 'changed_version')
+
+    def __init__(self, name, instance, driver, status, alist_status=None, probe=None, latency_ms=None,
+                 changed_version=None):
+        self.name = name
+        self.instance = instance
+        self.driver = driver
+        self.status = status
+        self.alist_status = alist_status  # 被深度探测标记为 degraded 之前 Alist 报告的状态
+        self.probe = probe
+        self.latency_ms = latency_ms
+        self.changed_version = changed_version  # 状态 (驱动、状态、探测前的状态) 最后一次变化时的快照版本
+
+    def to_row(self):
+        return _row_getter(self)
+
+    def to_dict(self, last_changed=None):
+        data = {'name': self.name, 'instance': self.instance, 'driver': self.driver, 'status': self.status,
+                'last_changed': last_changed}
+        for field in ('alist_status', 'probe', 'latency_ms'):
+            value = getattr(self, field)
+            if value is not None:
+                data[field] = value
+        return data
+
+    def __repr__(self):
+        return f"StorageRecord({self.instance}:{self.name}, {self.status})"
+
+FIELDS = list(StorageRecord.__slots__)
+_row_getter = attrgetter(*FIELDS)  # 按 FIELDS 的顺序取出所有字段 (元组)
+
+# --- 快照的编码/解码 ---
+
+def dumps_result(result):
+    """把检查结果编码为 JSON 文本 (存储按列保存)"""
+    data = dict(result)
+    data['storages'] = {'fields': FIELDS, 'rows': list(map(_row_getter, result.get('storages', [])))}
+    return json.dumps(data, ensure_ascii=False)
+
+def loads_result(text):
+    data = json.loads(text)
+    storages = data.get('storages') or {}
+    if isinstance(storages, list):
+        # 旧版本快照中每个存储是一个字典
+        data['storages'] = [StorageRecord(s.get('name'), s.get('instance'), s.get('driver'), s.get('status'))
+                            for s in storages]
+        return data
+    index = [storages['fields'].index(field) if field in storages['fields'] else None for field in FIELDS]
+    records = [StorageRecord(*(row[i] if i is not None else None for i in index)) for row in storages['rows']]
+    # 大多数存储的 changed_version 相同，共用同一个 int 对象
+    versions = {}
+    for record in records:
+        record.changed_version = versions.setdefault(record.changed_version, record.changed_version)
+    data['storages'] = records
+    return data
+
+# --- API 响应 ---
+
+def _str(value):
+    return 'null' if value is None else encode_basestring(value)
+
+def _storage_json(s, last_changed):
+    parts = [
+        '{"name": ', _str(s.name), ', "instance": ', _str(s.instance),
+        ', "driver": ', _str(s.driver), ', "status": ', _str(s.status), ', "last_changed": ', last_changed
+    ]
+    if s.alist_status is not None:
+        parts += [', "alist_status": ', _str(s.alist_status)]
+    if s.probe is not None:
+        parts += [', "probe": ', json.dumps(s.probe, ensure_ascii=False)]
+    if s.latency_ms is not None:
+        parts += [', "latency_ms": ', json.dumps(s.latency_ms)]
+    parts.append('}')
+    return ''.join(parts)
+
+def last_changed(result, storage):
+    """存储状态最后一次变化的时间 (ISO 格式)，旧快照没有记录时使用检查时间"""
+    return (result.get('change_times') or {}).get(str(storage.changed_version), result.get('last_checked'))
+
+def _head_json(head):
+    return json.dumps({k: v for k, v in head.items() if k not in ('storages', 'change_times')}, ensure_ascii=False)
+
+def _storages_json(result, records):
+    change_times = result.get('change_times') or {}
+    default = json.dumps(result.get('last_checked'))
+    encoded = {}  # 同一版本的时间只编码一次
+    parts = []
+    for s in records:
+        version = str(s.changed_version)
+        value = encoded.get(version)
+        if value is None:
+            value = encoded[version] = json.dumps(change_times[version]) if version in change_times else default
+        parts.append(_storage_json(s, value))
+    return ', '.join(parts)
+
+def _object_json(head_json, member):
+    """在已序列化的 JSON 对象 head_json 末尾加入一个已序列化的成员 ('"键": 值')"""
+    if head_json == '{}':
+        return f'{{{member}}}'
+    return f'{head_json[:-1]}, {member}}}'
+
+def result_to_json(result):
+    """把检查结果序列化为 API 响应的 JSON 文本 (格式与原来每个存储一个字典时相同)"""
+    storages = _storages_json(result, result.get('storages', []))
+    return _object_json(_head_json(result), f'"storages": [{storages}]')
+
+def delta_to_json(result, since, changed, removed):
+    """增量响应：只包含 since 版本之后新增或变化的存储 (storages) 和被删除的存储 (removed)"""
+    head = dict(result, since=since, full=False,
+                removed=[{'instance': instance, 'name': name} for instance, name in removed])
+    return _object_json(_head_json(head), f'"storages": [{_storages_json(result, changed)}]')
+
+def wrap_result_json(head, key, result):
+    """外层响应对象：head 中的字段加上 key 对应的完整检查结果 (与 result_to_json 相同)"""
+    return _object_json(json.dumps(head, ensure_ascii=False), f'{encode_basestring(key)}: {result_to_json(result)}')
@@ -0,0 +1,83 @@
+# app/tgphotos.py
+import os
+import time
+import hashlib
+import logging
+from app import db
+from app.config import DATA_DIR
+from app.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# --- Telegram 图片 file_id 缓存 ---
+# sendPhoto 传入图片 URL 时，Telegram 每次都要重新从图床下载图片，图床慢时通知也跟着变慢或失败。
+# Telegram 的响应中带有已上传图片的 file_id，之后用 file_id 发送不需要再次下载或上传。
+# - 缓存保存在共享数据库中 (/data/monitor_data.sqlite)，按 (bot, 图片来源) 记录，所有 worker 共用、重启后仍然有效；
+# - 图片来源为模板的图片 URL，或本地图片文件的内容摘要，模板图片更换后来源随之变化，自然使用新的缓存项；
+# - NOTIFY_IMAGE_DIR (默认 /data/notify_images) 中存在 <通知类型>.jpg/.jpeg/.png 时，
+#   Telegram 改为上传本地图片 (只上传一次)，不再依赖图床。
+# file_id 只对获取它的 bot 有效，因此按 bot ID (令牌中冒号前的部分) 区分。
+
+DEFAULT_IMAGE_DIR = os.path.join(DATA_DIR, 'notify_images')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tg_photo_cache (
+    bot_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (bot_id, source)
+);
+"""
+
+def _ensure_schema():
+    db.ensure_schema('tg_photo_cache', _SCHEMA)
+
+def bot_id(token):
+    return token.split(':', 1)[0]
+
+def local_image(template, config):
+    """返回通知类型对应的本地图片路径，不存在时返回 None"""
+    if not template:
+        return None
+    image_dir = config.get('NOTIFY_IMAGE_DIR') or DEFAULT_IMAGE_DIR
+    for ext in IMAGE_EXTENSIONS:
+        path = os.path.join(image_dir, f"{template}{ext}")
+        if os.path.isfile(path):
+            return path
+    return None
+
+def image_source(picurl, path=None):
+    """图片来源的缓存键：本地图片为内容摘要 (文件替换后失效)，否则为图片 URL"""
+    if path:
+        with open(path, 'rb') as f:
+            return f"sha256:{hashlib.sha256(f.read()).hexdigest()}"
+    return f"url:{picurl}" if picurl else None
+
+def get_file_id(bot, source):
+    _ensure_schema()
+    row = db.get_connection().execute(
+        'SELECT file_id FROM tg_photo_cache WHERE bot_id = ? AND source = ?', (bot, source)
+    ).fetchone()
+    CACHE_REQUESTS.labels(cache='tg_file_id', result='hit' if row else 'miss').inc()
+    return row['file_id'] if row else None
+
+def remember(bot, source, result):
+    """从 sendPhoto 的响应中取出最大尺寸图片的 file_id 并缓存"""
+    photos = (result.get('result') or {}).get('photo') or []
+    if not photos:
+        return None
+    file_id = photos[-1]['file_id']
+    _ensure_schema()
+    db.get_connection().execute(
+        'INSERT OR REPLACE INTO tg_photo_cache (bot_id, source, file_id, created_at) VALUES (?, ?, ?, ?)',
+        (bot, source, file_id, time.time())
+    )
+    return file_id
+
+def forget(bot, source):
+    """file_id 被 Telegram 拒绝 (bot 更换、文件失效) 时删除缓存"""
+    _ensure_schema()
+    db.get_connection().execute('DELETE FROM tg_photo_cache WHERE bot_id = ? AND source = ?', (bot, source))
+    logger.info(f"Telegram 图片缓存已失效: {source}")
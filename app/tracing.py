@@ -0,0 +1,232 @@
+# app/tracing.py
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# --- 请求耗时分解与慢请求追踪 ---
+# 开启 TRACE_ENABLED 后，api 蓝图的每个请求都会记录内部各阶段的耗时 (span)：
+# 配置文件读写、存储状态快照/请求 Alist、bcrypt 校验、响应序列化与压缩、通知入队等。
+# 同名 span 合并为 (次数, 总耗时)，响应头 Server-Timing 给出分解 (浏览器开发者工具可直接查看)；
+# 超过 TRACE_SLOW_MS 的请求输出警告日志，并记入共享数据库 (任意 worker 都能查询)。
+# 未开启时 span() 只读取一次 contextvar，直接返回空操作对象。
+#
+# 另外提供采样分析：在 N 秒内定期采集本进程所有线程的调用栈，汇总为函数的自身/累计采样数和折叠调用栈
+# (可直接用于火焰图)，用于定位 span 之外的耗时。
+
+DEFAULT_SLOW_MS = 500
+DEFAULT_MAX_TRACES = 200
+SETTINGS_REFRESH_INTERVAL = 1.0   # 秒
+MAX_PROFILE_SECONDS = 30
+PROFILE_INTERVAL = 0.005          # 秒，采样间隔
+# 调用栈最内层在这些模块中时视为空闲线程 (等待任务、等待新连接)；
+# 等待 Alist 等网络响应的线程停在 socket.py/ssl.py 中，仍然计入
+IDLE_MODULES = ('threading.py', 'selectors.py', 'queue.py', 'socketserver.py')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS request_traces (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    pid INTEGER NOT NULL,
+    method TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status INTEGER,
+    duration_ms REAL NOT NULL,
+    spans TEXT NOT NULL
+);
+"""
+
+def _ensure_schema():
+    from app import db
+    db.ensure_schema('request_traces', _SCHEMA)
+
+_current = contextvars.ContextVar('alist_monitor_trace', default=None)
+
+class _Trace:
+    __slots__ = ('started', 'spans')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}  # name -> [次数, 秒]
+
+    def add(self, name, seconds):
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+class _Span:
+    __slots__ = ('trace', 'name', 'started')
+
+    def __init__(self, trace, name):
+        self.trace, self.name = trace, name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, time.perf_counter() - self.started)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+def span(name):
+    """记录一个阶段的耗时：with tracing.span('alist.fetch'): ...；当前请求未开启追踪时不做任何事"""
+    trace = _current.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name)
+
+def record(name, seconds):
+    """记录调用方已经测量好的耗时"""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+# --- 设置 (每个进程最多每秒从 config.json 刷新一次) ---
+
+_settings = {'pid': None, 'loaded_at': 0.0, 'enabled': False, 'slow_ms': DEFAULT_SLOW_MS, 'max_traces': DEFAULT_MAX_TRACES}
+_settings_lock = threading.Lock()
+
+def get_settings():
+    now = time.monotonic()
+    if _settings['pid'] == os.getpid() and now - _settings['loaded_at'] < SETTINGS_REFRESH_INTERVAL:
+        return _settings
+    from app.config import load_config
+    with _settings_lock:
+        if _settings['pid'] != os.getpid() or now - _settings['loaded_at'] >= SETTINGS_REFRESH_INTERVAL:
+            config = load_config()
+            _settings.update(
+                pid=os.getpid(), loaded_at=now, enabled=bool(config.get('TRACE_ENABLED', False)),
+                slow_ms=float(config.get('TRACE_SLOW_MS', DEFAULT_SLOW_MS)),
+                max_traces=int(config.get('TRACE_MAX_TRACES', DEFAULT_MAX_TRACES))
+            )
+    return _settings
+
+# --- 请求钩子 (注册在 api 蓝图上) ---
+
+def start_request():
+    if get_settings()['enabled']:
+        _current.set(_Trace())
+
+def finish_request(response):
+    from flask import request
+    trace = _current.get()
+    if trace is None:
+        return response
+    _current.set(None)
+    duration_ms = (time.perf_counter() - trace.started) * 1000
+    spans = {name: {'count': count, 'ms': round(seconds * 1000, 2)} for name, (count, seconds) in trace.spans.items()}
+    timing = [f'{name.replace(".", "-")};dur={s["ms"]}' for name, s in spans.items()]
+    response.headers['Server-Timing'] = ', '.join(timing + [f'total;dur={duration_ms:.2f}'])
+    settings = get_settings()
+    if duration_ms >= settings['slow_ms']:
+        breakdown = ', '.join(f"{name} {s['ms']:.0f}ms×{s['count']}"
+                              for name, s in sorted(spans.items(), key=lambda item: -item[1]['ms']))
+        logger.warning(f"慢请求 {request.method} {request.full_path.rstrip('?')} {duration_ms:.0f}ms "
+                       f"(状态 {response.status_code}): {breakdown or '无分解'}")
+        try:
+            _save_trace(request.method, request.full_path.rstrip('?'), response.status_code, duration_ms, spans,
+                        settings['max_traces'])
+        except Exception as e:
+            logger.error(f"保存慢请求记录失败: {e}")
+    return response
+
+def clear_request(exc=None):
+    _current.set(None)
+
+def _save_trace(method, path, status, duration_ms, spans, max_traces):
+    from app import db
+    _ensure_schema()
+    with db.transaction() as conn:
+        cursor = conn.execute(
+            'INSERT INTO request_traces (created_at, pid, method, path, status, duration_ms, spans) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (time.time(), os.getpid(), method, path, status, round(duration_ms, 2), json.dumps(spans))
+        )
+        conn.execute('DELETE FROM request_traces WHERE id <= ?', (cursor.lastrowid - max_traces,))
+
+def recent_traces(limit=50):
+    from app import db
+    _ensure_schema()
+    rows = db.get_connection().execute(
+        'SELECT * FROM request_traces ORDER BY id DESC LIMIT ?', (limit,)
+    ).fetchall()
+    return [dict(row, spans=json.loads(row['spans'])) for row in rows]
+
+# --- 采样分析 ---
+
+class ProfilerBusy(Exception):
+    pass
+
+_profile_lock = threading.Lock()
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+def sample_profile(seconds, include_idle=False, top=30):
+    """
+    采集本进程所有线程的调用栈 seconds 秒，返回汇总结果。
+    同一进程同时只能进行一次采样，否则抛出 ProfilerBusy。
+    """
+    seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("本进程正在进行采样分析")
+    try:
+        own = threading.get_ident()
+        names = {}
+        stacks, self_counts, total_counts, thread_counts = Counter(), Counter(), Counter(), Counter()
+        samples = idle = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if not include_idle and os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                    idle += 1
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.reverse()
+                samples += 1
+                stacks[';'.join(labels)] += 1
+                self_counts[labels[-1]] += 1
+                total_counts.update(set(labels))
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                thread_counts[names.get(ident, str(ident))] += 1
+            time.sleep(PROFILE_INTERVAL)
+    finally:
+        _profile_lock.release()
+    return {
+        'pid': os.getpid(),
+        'seconds': seconds,
+        'samples': samples,
+        'idle_samples': idle,
+        'threads': dict(thread_counts.most_common()),
+        'top_self': [{'function': f, 'samples': n} for f, n in self_counts.most_common(top)],
+        'top_cumulative': [{'function': f, 'samples': n} for f, n in total_counts.most_common(top)],
+        # 折叠调用栈 (外层在前，以分号分隔)，可直接交给 flamegraph.pl 等工具
+        'stacks': [f"{stack} {n}" for stack, n in stacks.most_common(top * 4)],
+    }
@@ -0,0 +1,161 @@
+# bench/fakes.py
+"""
+基准测试使用的本地替身服务：
+- FakeAlist: /api/admin/storage/list (可配置存储数量、延迟、错误率) 和 /api/fs/list
+- FakeTelegram: /bot<token>/sendPhoto (图片为 URL 时模拟 Telegram 从图床下载图片的延迟)
+- FakeWeCom: 企业微信群机器人 webhook
+"""
+import json
+import time
+import random
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DRIVERS = ('Local', 'Aliyundrive', 'BaiduNetdisk', '115 Cloud', 'Quark', 'OneDrive')
+
+class _Server:
+    """在后台线程中运行的 HTTP 服务，记录请求数和请求时间"""
+
+    def __init__(self, latency=0.0, error_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # 响应头和响应体分两次写出，不关闭 Nagle 时会遇到 40ms 的延迟确认
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server._dispatch(self, None)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                if self.headers.get('Content-Type', '').startswith('multipart/'):
+                    # 上传文件的请求不解析，只记录大小
+                    server._dispatch(self, {'upload_bytes': len(body)})
+                else:
+                    server._dispatch(self, json.loads(body) if body else {})
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        threading.Thread(target=self.httpd.serve_forever, name=type(self).__name__, daemon=True).start()
+
+    def _dispatch(self, handler, body):
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            with self.lock:
+                self.errors += 1
+            self._send(handler, b'{"message": "injected error"}', status=500)
+            return
+        self._send(handler, self.handle(handler.path, body))
+
+    @staticmethod
+    def _send(handler, payload, status=200):
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def handle(self, path, body):
+        raise NotImplementedError
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class FakeAlist(_Server):
+    """返回 storage_count 个存储，其中 abnormal_count 个状态异常；支持 page/per_page 分页 (paginate=False 时模拟不分页的旧版本)"""
+
+    def __init__(self, storage_count=100, abnormal_count=0, latency=0.0, error_rate=0.0, paginate=True):
+        super().__init__(latency, error_rate)
+        self.paginate = paginate
+        self.set_storages(storage_count, abnormal_count)
+
+    def set_storages(self, storage_count, abnormal_count=0):
+        content = [{
+            'id': i, 'mount_path': f'/storage/{i:05d}', 'driver': DRIVERS[i % len(DRIVERS)],
+            'status': 'work' if i >= abnormal_count else 'failed to refresh token',
+            'order': i, 'remark': '', 'modified': '2024-01-01T00:00:00Z', 'disabled': False
+        } for i in range(storage_count)]
+        # 响应体按 (page, per_page) 序列化一次后缓存，大数量时不让替身服务本身成为瓶颈
+        with self.lock:
+            self._content = content
+            self._pages = {}
+
+    def _storage_page(self, page, per_page):
+        key = (page, per_page)
+        with self.lock:
+            body = self._pages.get(key)
+            content = self._content
+        if body is None:
+            items = content if per_page is None else content[(page - 1) * per_page:page * per_page]
+            body = json.dumps({'code': 200, 'message': 'success', 'data': {'content': items, 'total': len(content)}}).encode()
+            with self.lock:
+                self._pages[key] = body
+        return body
+
+    def handle(self, path, body):
+        if path.startswith('/api/admin/storage/list'):
+            query = parse_qs(urlsplit(path).query)
+            if not self.paginate or 'per_page' not in query:
+                return self._storage_page(1, None)
+            return self._storage_page(max(1, int(query.get('page', ['1'])[0])), int(query['per_page'][0]))
+        if path.startswith('/api/fs/list'):
+            return json.dumps({'code': 200, 'data': {'content': [{'name': 'file.bin', 'is_dir': False}], 'total': 1}}).encode()
+        return b'{"code": 404, "message": "not found"}'
+
+class _Sink(_Server):
+    """记录收到的通知消息"""
+
+    def __init__(self, latency=0.0, error_rate=0.0):
+        super().__init__(latency, error_rate)
+        self.messages = []
+
+    def record(self, body):
+        with self.lock:
+            self.messages.append((time.monotonic(), body))
+
+class FakeTelegram(_Sink):
+    """photo 为 URL 时额外等待 fetch_latency 秒 (Telegram 从图床下载图片)，为 file_id 或上传文件时不等待"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, fetch_latency=0.0):
+        super().__init__(latency, error_rate)
+        self.fetch_latency = fetch_latency
+        self.photo_fetches = 0
+        self.photo_uploads = 0
+
+    def handle(self, path, body):
+        photo = body.get('photo')
+        if photo is None:
+            with self.lock:
+                self.photo_uploads += 1
+        elif photo.startswith(('http://', 'https://')):
+            with self.lock:
+                self.photo_fetches += 1
+            if self.fetch_latency:
+                time.sleep(self.fetch_latency)
+        self.record(body)
+        return b'{"ok": true, "result": {"message_id": 1, "photo": [{"file_id": "bench-photo-s"}, {"file_id": "bench-photo"}]}}'
+
+class FakeWeCom(_Sink):
+    def handle(self, path, body):
+        self.record(body)
+        return b'{"errcode": 0, "errmsg": "ok"}'
+
+    @property
+    def webhook(self):
+        return f"{self.url}/cgi-bin/webhook/send?key=bench"
@@ -0,0 +1,76 @@
+# bench/monitor_state_contention.py
+"""
+监控状态并发写入的基准测试：模拟 4 个 gunicorn worker (手动检查) 加 1 个调度器 (定时检查)
+同时累加 check_count，对比旧的 JSON 文件 (读取 -> +1 -> 整体重写) 与 app/state.py 的数据库存储。
+
+用法: python bench/monitor_state_contention.py [--workers 4] [--increments 2000]
+数据写入临时目录，不会影响 /data。
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import multiprocessing
+
+os.environ['ALIST_MONITOR_DATA_DIR'] = tempfile.mkdtemp(prefix='alist-monitor-bench-')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import config, state  # noqa: E402
+
+JSON_PATH = os.path.join(config.DATA_DIR, 'bench_monitor_status.json')
+
+def json_increment(count):
+    for _ in range(count):
+        status = config._load_json_file(JSON_PATH, default_value=dict(state.DEFAULT_STATUS))
+        status['check_count'] = status.get('check_count', 0) + 1
+        config._save_json_file(JSON_PATH, status, indent=2)
+
+def json_total():
+    return config._load_json_file(JSON_PATH, default_value={}).get('check_count', 0)
+
+def json_reset():
+    config._save_json_file(JSON_PATH, dict(state.DEFAULT_STATUS, is_monitoring=True), indent=2)
+
+def db_increment(count):
+    version = state.load_monitor_status()['version']
+    for _ in range(count):
+        state.increment_check_count(version)
+    state.flush()
+
+def db_total():
+    return state.load_monitor_status()['check_count']
+
+def db_reset():
+    state.save_monitor_status(dict(state.DEFAULT_STATUS, is_monitoring=True, interval=60))
+
+def run(name, reset, increment, total, processes, increments):
+    reset()
+    ctx = multiprocessing.get_context('fork')
+    started = time.perf_counter()
+    procs = [ctx.Process(target=increment, args=(increments,)) for _ in range(processes)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - started
+    expected, actual = processes * increments, total()
+    print(f"{name:<8} 期望 {expected:>7}  实际 {actual:>7}  丢失 {expected - actual:>7}  "
+          f"耗时 {elapsed:7.3f}s  {expected / elapsed:10.0f} 次/秒")
+    return expected - actual
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4, help='模拟的 worker 进程数 (另加 1 个调度器进程)')
+    parser.add_argument('--increments', type=int, default=2000, help='每个进程累加的次数')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    processes = args.workers + 1
+    print(f"{processes} 个进程 ({args.workers} 个 worker + 1 个调度器)，每个累加 {args.increments} 次")
+    run('json', json_reset, json_increment, json_total, processes, args.increments)
+    lost = run('sqlite', db_reset, db_increment, db_total, processes, args.increments)
+    sys.exit(1 if lost else 0)
+
+if __name__ == '__main__':
+    main()
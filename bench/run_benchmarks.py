@@ -0,0 +1,376 @@
+# bench/run_benchmarks.py
+"""
+端到端基准测试：用本地替身 Alist / Telegram / 企业微信 (见 bench/fakes.py) 驱动
+get_storage_status、monitor_task、通知发送队列和 Flask API，输出报告并可与之前的结果对比。
+
+用法:
+  python bench/run_benchmarks.py                          # 运行全部场景，结果写入 bench/results/
+  python bench/run_benchmarks.py --storages 10 1000 50000 --latency 0.05 --error-rate 0.01
+  python bench/run_benchmarks.py --scenarios api --api-clients 32
+  python bench/run_benchmarks.py --compare bench/results/a.json bench/results/b.json
+
+数据写入临时目录，不会影响 /data。
+"""
+import os
+import gc
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import tracemalloc
+
+os.environ['ALIST_MONITOR_DATA_DIR'] = tempfile.mkdtemp(prefix='alist-monitor-bench-')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import requests  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+from fakes import FakeAlist, FakeTelegram, FakeWeCom  # noqa: E402
+from app import db, config as app_config, state, monitor, dispatch, snapshot, storages  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+SCENARIOS = ('storage_status', 'monitor_task', 'notifications', 'api', 'logging')
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+def write_config(**overrides):
+    """覆盖式写入基准测试使用的 config.json"""
+    config = {'password': app_config.load_config().get('password'), 'STATUS_CACHE_TTL': 10}
+    config.update(overrides)
+    app_config.save_config(config)
+    return config
+
+def _timed_loop(func, iterations, duration):
+    """重复执行 func，直到达到次数或时长，返回每次的耗时 (秒) 列表"""
+    timings = []
+    deadline = time.monotonic() + duration
+    while len(timings) < iterations and (not timings or time.monotonic() < deadline):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+def _summary(prefix, timings):
+    total = sum(timings)
+    return {
+        f'{prefix}.per_sec': round(len(timings) / total, 2) if total else None,
+        f'{prefix}.p50_ms': round(percentile(timings, 50) * 1000, 2),
+        f'{prefix}.p99_ms': round(percentile(timings, 99) * 1000, 2),
+    }
+
+# --- 场景 ---
+
+def bench_storage_status(args, alist):
+    """强制刷新获取存储状态的速度，以及每个存储占用的内存"""
+    metrics = {}
+    for count in args.storages:
+        alist.set_storages(count, abnormal_count=count // 100)
+        write_config(ALIST_URL=alist.url, ALIST_TOKEN='bench')
+        monitor.get_storage_status(force=True)  # 预热连接池和建表
+        timings = _timed_loop(lambda: monitor.get_storage_status(force=True), args.iterations, args.duration)
+        metrics.update(_summary(f'storage_status.{count}.checks', timings))
+
+        # 内存：保留一次完整结果 (含进程内快照缓存) 所增加的内存
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        result = monitor.get_storage_status(force=True)
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        metrics[f'storage_status.{count}.bytes_per_storage'] = round((after - before) / max(1, len(result['storages'])), 1)
+
+        # 响应大小：完整响应，以及存储没有变化时 ?since=<当前版本> 的增量响应
+        metrics[f'storage_status.{count}.full_response_bytes'] = len(storages.result_to_json(result).encode())
+        delta = storages.delta_to_json(result, result['version'], *snapshot.changes_since(result, result['version']))
+        metrics[f'storage_status.{count}.delta_response_bytes'] = len(delta.encode())
+        del result
+    return metrics
+
+def bench_monitor_task(args, alist):
+    """完整的定时检查：获取状态、写历史、告警状态机、事件发布"""
+    metrics = {}
+    for count in args.storages:
+        alist.set_storages(count, abnormal_count=count // 100)
+        write_config(ALIST_URL=alist.url, ALIST_TOKEN='bench', NOTIFICATION_METHOD='none')
+        state.save_monitor_status({'is_monitoring': True, 'start_time': 'bench', 'check_count': 0, 'interval': 60})
+        monitor.monitor_task()
+        timings = _timed_loop(monitor.monitor_task, args.iterations, args.duration)
+        metrics.update(_summary(f'monitor_task.{count}.checks', timings))
+    return metrics
+
+def bench_notifications(args, telegram, wecom):
+    """通知从入队到替身服务收到的吞吐量 (不限速、不合并等待)"""
+    metrics = {}
+    sinks = {'tg': telegram, 'wecom': wecom}
+    # 最后一组同时发送到两个渠道 (多渠道并发扇出)
+    for channels in (['tg'], ['wecom'], ['tg', 'wecom']):
+        channel = '+'.join(channels)
+        write_config(
+            NOTIFICATION_CHANNELS=channels, TG_BOT_TOKEN='bench', TG_CHAT_ID='1', TG_API_BASE=telegram.url,
+            WECOM_WEBHOOK=wecom.webhook, NOTIFY_COALESCE_WINDOW=0, NOTIFY_WORKERS=args.notify_workers,
+            NOTIFY_RATE_LIMITS={c: {'per_minute': 10 ** 9, 'burst': 10 ** 9} for c in channels}
+        )
+        dispatch.ensure_workers()
+        received_before = sum(len(sinks[c].messages) for c in channels)
+        started = time.perf_counter()
+        for _ in range(args.notifications):
+            monitor.send_notification('test')
+        enqueued = time.perf_counter() - started
+        conn = db.get_connection()
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            row = conn.execute(
+                "SELECT COUNT(*) AS n FROM notification_deliveries WHERE status IN ('pending', 'sending')"
+            ).fetchone()
+            if row['n'] == 0:
+                break
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        metrics[f'notifications.{channel}.enqueue.per_sec'] = round(args.notifications / enqueued, 2)
+        metrics[f'notifications.{channel}.delivered.per_sec'] = round(args.notifications / elapsed, 2)
+        metrics[f'notifications.{channel}.requests'] = sum(len(sinks[c].messages) for c in channels) - received_before
+    # 图片 file_id 缓存生效后，Telegram 只需从图床下载一次图片
+    metrics['notifications.tg.photo_fetches'] = telegram.photo_fetches
+    return metrics
+
+API_ENDPOINTS = ('/api/storage_status', '/api/monitor_status', '/api/notifications?limit=50', '/api/alerts')
+
+def bench_api(args, alist):
+    """多个客户端并发请求 Flask API (threaded 开发服务器)"""
+    from app.main import app
+    alist.set_storages(args.api_storages, abnormal_count=args.api_storages // 100)
+    write_config(ALIST_URL=alist.url, ALIST_TOKEN='bench', NOTIFICATION_METHOD='none')
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-api', daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    login = requests.Session()
+    login.post(f"{base}/api/login", json={'username': 'admin', 'password': 'admin'}).raise_for_status()
+
+    latencies = {path: [] for path in API_ENDPOINTS}
+    errors = []
+    lock = threading.Lock()
+
+    def client(index):
+        session = requests.Session()
+        session.cookies.update(login.cookies)
+        for i in range(args.api_requests):
+            path = API_ENDPOINTS[(index + i) % len(API_ENDPOINTS)]
+            started = time.perf_counter()
+            response = session.get(base + path)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+                latencies[path].append(elapsed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.api_clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    page_metrics = _bench_page_loads(base, login)
+    server.shutdown()
+
+    all_latencies = [v for values in latencies.values() for v in values]
+    metrics = {
+        'api.requests.per_sec': round(len(all_latencies) / elapsed, 2),
+        'api.p50_ms': round(percentile(all_latencies, 50) * 1000, 2),
+        'api.p99_ms': round(percentile(all_latencies, 99) * 1000, 2),
+        'api.errors': len(errors),
+    }
+    for path, values in latencies.items():
+        name = path.split('?')[0].rsplit('/', 1)[-1]
+        metrics[f'api.{name}.p50_ms'] = round(percentile(values, 50) * 1000, 2)
+        metrics[f'api.{name}.p99_ms'] = round(percentile(values, 99) * 1000, 2)
+    metrics.update(page_metrics)
+    return metrics
+
+def _bench_page_loads(base, login):
+    """仪表盘首次打开与再次打开 (浏览器已缓存) 时请求本服务的次数和传输的字节数 (不含 CDN 资源)"""
+    import re
+    session = requests.Session()
+    session.cookies.update(login.cookies)
+    page = session.get(f"{base}/")
+    responses = [page] + [session.get(base + url) for url in re.findall(r'src="(/static/[^"]+)"', page.text)]
+    first_bytes = sum(int(r.headers.get('Content-Length', 0)) for r in responses)
+    # 再次打开：页面带 If-None-Match 重新验证，immutable 的资源直接使用浏览器缓存
+    repeat = [session.get(f"{base}/", headers={'If-None-Match': page.headers.get('ETag', '')})]
+    repeat += [session.get(r.url) for r in responses[1:] if 'immutable' not in r.headers.get('Cache-Control', '')]
+    return {
+        'pages.index.first_load_bytes': first_bytes,
+        'pages.index.repeat_load_bytes': sum(int(r.headers.get('Content-Length', 0)) for r in repeat),
+        'pages.index.repeat_load_requests': len(repeat),
+    }
+
+class _SlowStream:
+    """写入变慢的输出流，模拟被 Docker 日志驱动阻塞的 stdout/stderr"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.writes = 0
+
+    def write(self, text):
+        time.sleep(self.latency)
+        self.writes += 1
+
+    def flush(self):
+        pass
+
+def bench_logging(args):
+    """Alist 故障期间每次检查都输出带堆栈的错误日志：同步输出与经队列输出 (app/logs.py) 时调用方的耗时"""
+    from app import logs
+    write_config(LOG_DEDUP_WINDOW=60)
+    metrics = {}
+    for mode in ('sync', 'queued'):
+        stream = _SlowStream(args.log_sink_latency)
+        if mode == 'sync':
+            handler = logging.StreamHandler(stream)
+            handler.setFormatter(logging.Formatter(logs.TEXT_FORMAT))
+        else:
+            handler = logs.create_handler(stream)
+        logger = logging.getLogger(f'bench.logging.{mode}')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+
+        def emit():
+            try:
+                raise ConnectionError('Alist 不可达')
+            except ConnectionError as e:
+                logger.error(f"获取存储状态失败: {e}", exc_info=True)
+
+        timings = _timed_loop(emit, args.log_records, args.duration)
+        logger.removeHandler(handler)
+        handler.close()
+        metrics.update(_summary(f'logging.{mode}', timings))
+        metrics[f'logging.{mode}.sink_writes'] = stream.writes
+    return metrics
+
+# --- 报告与对比 ---
+
+def lower_is_better(name):
+    return name.endswith(('_ms', 'bytes_per_storage', '_bytes', '.errors', '.requests', '_fetches', '_writes'))
+
+def print_report(report):
+    print(f"\n基准测试结果 ({report['meta']['started_at']}, {report['meta']['git_commit'] or '未知版本'})")
+    for name, value in sorted(report['metrics'].items()):
+        print(f"  {name:<52} {value}")
+
+def compare(old, new, threshold):
+    """打印两次结果的差异，返回退步的指标列表"""
+    print(f"\n对比 {old['meta']['started_at']} -> {new['meta']['started_at']} (退步阈值 {threshold:.0%})")
+    ignored = ('output', 'baseline', 'compare', 'threshold')
+    old_args = {k: v for k, v in old['meta'].get('args', {}).items() if k not in ignored}
+    new_args = {k: v for k, v in new['meta'].get('args', {}).items() if k not in ignored}
+    if old_args != new_args:
+        changed = sorted(k for k in set(old_args) | set(new_args) if old_args.get(k) != new_args.get(k))
+        print(f"  注意: 两次运行的参数不同 ({', '.join(changed)})，结果不一定可比")
+    regressions = []
+    for name in sorted(set(old['metrics']) | set(new['metrics'])):
+        before, after = old['metrics'].get(name), new['metrics'].get(name)
+        if before is None or after is None:
+            print(f"  {name:<52} {before!s:>12} -> {after!s:<12}")
+            continue
+        change = (after - before) / before if before else 0.0
+        worse = change > threshold if lower_is_better(name) else change < -threshold
+        mark = '  <-- 退步' if worse else ''
+        print(f"  {name:<52} {before:>12} -> {after:<12} {change:+.1%}{mark}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+def _git_commit():
+    head = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.git', 'HEAD')
+    try:
+        with open(head) as f:
+            ref = f.read().strip()
+        if ref.startswith('ref: '):
+            with open(os.path.join(os.path.dirname(head), ref[5:])) as f:
+                return f.read().strip()[:12]
+        return ref[:12]
+    except OSError:
+        return None
+
+def run(args):
+    app_config.initialize_default_password()
+    alist = FakeAlist(latency=args.latency, error_rate=args.error_rate)
+    telegram = FakeTelegram(args.sink_latency, fetch_latency=args.image_fetch_latency)
+    wecom = FakeWeCom(args.sink_latency)
+    report = {'meta': {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'git_commit': _git_commit(),
+        'python': platform.python_version(), 'args': vars(args),
+    }, 'metrics': {}}
+    for scenario in args.scenarios:
+        print(f"运行场景 {scenario} ...", flush=True)
+        if scenario == 'storage_status':
+            report['metrics'].update(bench_storage_status(args, alist))
+        elif scenario == 'monitor_task':
+            report['metrics'].update(bench_monitor_task(args, alist))
+        elif scenario == 'notifications':
+            report['metrics'].update(bench_notifications(args, telegram, wecom))
+        elif scenario == 'api':
+            report['metrics'].update(bench_api(args, alist))
+        elif scenario == 'logging':
+            report['metrics'].update(bench_logging(args))
+    report['meta']['alist_requests'] = alist.requests
+    report['meta']['alist_injected_errors'] = alist.errors
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='Alist Monitor 端到端基准测试')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--storages', nargs='+', type=int, default=[10, 1000, 10000], help='存储数量 (10 ~ 50000)')
+    parser.add_argument('--latency', type=float, default=0.0, help='替身 Alist 的响应延迟 (秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='替身 Alist 返回 500 的比例')
+    parser.add_argument('--sink-latency', type=float, default=0.0, help='替身 Telegram/企业微信的响应延迟 (秒)')
+    parser.add_argument('--image-fetch-latency', type=float, default=0.3,
+                        help='替身 Telegram 从图床下载图片的延迟 (秒)，使用缓存的 file_id 时没有该延迟')
+    parser.add_argument('--iterations', type=int, default=50, help='每个数量下最多执行的检查次数')
+    parser.add_argument('--duration', type=float, default=10.0, help='每个数量下最长的执行时间 (秒)')
+    parser.add_argument('--notifications', type=int, default=200, help='每个渠道发送的通知数')
+    parser.add_argument('--notify-workers', type=int, default=3)
+    parser.add_argument('--api-clients', type=int, default=16, help='并发的 API 客户端数')
+    parser.add_argument('--api-requests', type=int, default=50, help='每个客户端的请求数')
+    parser.add_argument('--api-storages', type=int, default=1000, help='API 场景中的存储数量')
+    parser.add_argument('--log-records', type=int, default=1000, help='日志场景中输出的错误日志条数')
+    parser.add_argument('--log-sink-latency', type=float, default=0.005, help='日志场景中每次写入输出流的延迟 (秒)')
+    parser.add_argument('--output', help='结果文件路径，默认写入 bench/results/<时间>.json')
+    parser.add_argument('--baseline', help='运行后与该结果文件对比')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='只对比两个已有的结果文件')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD, help='判定退步的变化比例')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    if args.compare:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            regressions = compare(json.load(f_old), json.load(f_new), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    report = run(args)
+    print_report(report)
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['meta']['started_at'].replace(':', '')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n结果已写入 {output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+# gunicorn.conf.py
+# gunicorn 的配置与生命周期钩子，Dockerfile 中通过 --config 加载
+import os
+import shutil
+
+# 清空上次运行遗留的 Prometheus 多进程指标文件。
+# 必须在加载应用 (--preload) 之前完成，因此放在配置文件的模块级别而不是 on_starting 钩子中。
+_multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+if _multiproc_dir:
+    shutil.rmtree(_multiproc_dir, ignore_errors=True)
+    os.makedirs(_multiproc_dir, exist_ok=True)
+
+def post_fork(server, worker):
+    """每个 worker 启动选主线程 (抢到锁的 worker 运行调度器，见 app/leader.py) 和延迟初始化线程 (见 app/startup.py)"""
+    from app import leader, startup
+    startup.start_deferred()
+    leader.start_election()
+
+def worker_exit(server, worker):
+    """worker 正常退出 (重启、缩容) 时停止调度器并释放锁，其它 worker 立即可以接管"""
+    from app import leader
+    leader.resign()
+
+def child_exit(server, worker):
+    """worker 退出后标记其指标文件，避免汇总时重复计算已退出进程的 gauge"""
+    if _multiproc_dir:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,24 @@
+# tests/conftest.py
+# 测试数据写入临时目录 (必须在导入 app 之前设置)，不会影响 /data
+import os
+import sys
+import tempfile
+
+os.environ['ALIST_MONITOR_DATA_DIR'] = tempfile.mkdtemp(prefix='alist-monitor-test-')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pytest  # noqa: E402
+
+@pytest.fixture
+def app():
+    from app import create_app, config, leader
+    config.initialize_default_password()
+    flask_app = create_app()
+    flask_app.testing = True
+    yield flask_app
+    # 第一次请求会启动选主线程，测试结束时释放调度器
+    leader.resign()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,40 @@
+# tests/test_alerts.py
+import pytest
+from app import alerts, db, monitor
+
+@pytest.fixture(autouse=True)
+def clean_states(monkeypatch):
+    monkeypatch.setattr(alerts, 'load_config', lambda: {})
+    db.ensure_schema('storage_alert_state', alerts._SCHEMA)
+    db.get_connection().execute('DELETE FROM storage_alert_state')
+
+def _ok_result():
+    return {'success': True, 'instances': [{'name': 'default', 'success': True}], 'storages': []}
+
+def test_task_error_notifies_once_and_recovers_on_next_check():
+    assert [e['event'] for e in alerts.evaluate_task_error(RuntimeError('boom'))] == [alerts.EVENT_FAILING]
+    assert alerts.evaluate_task_error(RuntimeError('boom')) == []
+    events = alerts.evaluate(_ok_result())
+    assert [(e['key'], e['event']) for e in events] == [(alerts.TASK_KEY, alerts.EVENT_RECOVERED)]
+
+def test_task_error_respects_failure_threshold(monkeypatch):
+    monkeypatch.setattr(alerts, 'load_config', lambda: {'ALERT_FAILURE_THRESHOLD': 2})
+    assert alerts.evaluate_task_error(RuntimeError('boom')) == []
+    assert alerts.evaluate_task_error(RuntimeError('boom'))[0]['status'] == '执行出错: boom'
+
+def test_task_error_does_not_touch_storage_states():
+    alerts.evaluate(_ok_result())
+    keys = {s['storage_key'] for s in alerts.load_alert_states()}
+    alerts.evaluate_task_error(RuntimeError('boom'))
+    assert {s['storage_key'] for s in alerts.load_alert_states()} == keys
+
+def test_failing_monitor_task_is_not_notified_every_tick(monkeypatch):
+    sent = []
+    def broken():
+        raise RuntimeError('数据库不可用')
+    monkeypatch.setattr(monitor, 'load_monitor_status', broken)
+    monkeypatch.setattr(monitor, 'send_notification', lambda kind, data=None: sent.append((kind, data)))
+    for _ in range(3):
+        monitor._run_monitor_task()
+    assert len(sent) == 1 and sent[0][0] == 'anomaly'
+    assert '监控任务 状态: 执行出错: 数据库不可用' in sent[0][1]['error_details']
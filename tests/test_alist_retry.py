@@ -0,0 +1,86 @@
+# tests/test_alist_retry.py
+import time
+import types
+import pytest
+import requests
+from app import db, monitor, resilience
+
+INSTANCE = {'name': 'default', 'url': 'http://alist', 'token': 't', 'timeout': 15}
+
+class _FakeSession:
+    """按顺序返回预设的结果：异常实例会被抛出，其它值作为响应返回"""
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.timeouts = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.timeouts.append(timeout)
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+class _OkResponse:
+    def raise_for_status(self):
+        pass
+
+def _http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f'{status}', response=response)
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # 只替换 monitor 模块中的 time，记录重试等待而不真的等待
+    recorded = []
+    monkeypatch.setattr(monitor, 'time', types.SimpleNamespace(
+        sleep=recorded.append, monotonic=time.monotonic, perf_counter=time.perf_counter, time=time.time
+    ))
+    resilience._ensure_schema()
+    db.get_connection().execute('DELETE FROM retry_budgets')
+    monkeypatch.setattr(monitor, '_retry_budget', resilience.RetryBudget('test-alist', ratio=0, min_per_sec=0, max_tokens=10))
+    return recorded
+
+def _get(monkeypatch, session, deadline_in=30, **config):
+    monkeypatch.setattr(monitor, '_get_instance_session', lambda url: session)
+    return monitor._alist_get(INSTANCE, '/api/admin/storage/list', None, time.monotonic() + deadline_in, config)
+
+def test_retries_with_exponential_backoff_until_success(monkeypatch, sleeps):
+    session = _FakeSession(requests.ConnectionError(), _http_error(502), _OkResponse())
+    assert isinstance(_get(monkeypatch, session), _OkResponse)
+    assert sleeps == [0.5, 1.0] and len(session.timeouts) == 3
+
+def test_gives_up_after_max_retries(monkeypatch, sleeps):
+    session = _FakeSession(requests.ConnectionError())
+    with pytest.raises(requests.ConnectionError):
+        _get(monkeypatch, session, ALIST_MAX_RETRIES=1)
+    assert len(session.timeouts) == 2
+
+def test_client_errors_are_not_retried(monkeypatch, sleeps):
+    session = _FakeSession(_http_error(404))
+    with pytest.raises(requests.HTTPError):
+        _get(monkeypatch, session)
+    assert sleeps == [] and len(session.timeouts) == 1
+
+def test_retry_stops_when_backoff_would_pass_the_deadline(monkeypatch, sleeps):
+    session = _FakeSession(requests.Timeout())
+    with pytest.raises(requests.Timeout):
+        _get(monkeypatch, session, deadline_in=0.8, ALIST_MAX_RETRIES=5)
+    # 第一次等待 0.5 秒仍在截止时间内，第二次需要等待 1 秒，超过剩余时间
+    assert sleeps == [0.5] and len(session.timeouts) == 2
+    # 单次请求的超时不超过截止时间的剩余时间
+    assert all(timeout <= 0.8 for timeout in session.timeouts)
+
+def test_expired_deadline_raises_before_request(monkeypatch, sleeps):
+    session = _FakeSession(_OkResponse())
+    with pytest.raises(resilience.DeadlineExceeded):
+        _get(monkeypatch, session, deadline_in=-1)
+    assert session.timeouts == []
+
+def test_retry_stops_when_budget_runs_out(monkeypatch, sleeps):
+    monkeypatch.setattr(monitor, '_retry_budget', resilience.RetryBudget('test-alist-empty', ratio=0, min_per_sec=0,
+                                                                        max_tokens=1))
+    session = _FakeSession(requests.ConnectionError())
+    with pytest.raises(requests.ConnectionError):
+        _get(monkeypatch, session, ALIST_MAX_RETRIES=5)
+    assert sleeps == [0.5] and len(session.timeouts) == 2
@@ -0,0 +1,74 @@
+# tests/test_api.py
+import json
+import pytest
+from app import api
+
+def _result(version, last_checked, age=1.5, cached=True):
+    return {'success': True, 'message': 'ok', 'status': '正常', 'last_checked': last_checked,
+            'version': version, 'instances': [], 'storages': [], 'snapshot_age': age, 'cached': cached}
+
+@pytest.fixture
+def logged_in(client):
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+    return client
+
+def _serve(monkeypatch, result):
+    monkeypatch.setattr(api, 'get_storage_status', lambda force=False: dict(result))
+
+def test_storage_status_keeps_snapshot_fields_in_body(logged_in, monkeypatch):
+    _serve(monkeypatch, _result(1, '2026-01-01T00:00:00.000001+00:00', age=2.0, cached=True))
+    response = logged_in.get('/api/storage_status')
+    body = json.loads(response.data)
+    assert body['snapshot_age'] == 2.0 and body['cached'] is True
+    assert response.headers['X-Snapshot-Age'] == '2.0'
+    assert response.headers['X-Snapshot-Cached'] == 'true'
+
+def test_storage_status_etag_ignores_age_and_follows_snapshot(logged_in, monkeypatch):
+    _serve(monkeypatch, _result(1, '2026-01-01T00:00:00.000001+00:00', age=1.0))
+    etag = logged_in.get('/api/storage_status').headers['ETag']
+    _serve(monkeypatch, _result(1, '2026-01-01T00:00:00.000001+00:00', age=5.0))
+    response = logged_in.get('/api/storage_status', headers={'If-None-Match': etag})
+    assert response.status_code == 304 and response.headers['X-Snapshot-Age'] == '5.0'
+    # 新的快照 (检查时间不同) 即使版本号不变也要返回新的响应体
+    _serve(monkeypatch, _result(1, '2026-01-01T00:01:00.000001+00:00', age=0.0, cached=False))
+    response = logged_in.get('/api/storage_status', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert json.loads(response.data)['last_checked'] == '2026-01-01T00:01:00.000001+00:00'
+
+def test_storage_status_without_config_has_no_snapshot_headers(logged_in, monkeypatch):
+    monkeypatch.setattr(api, 'get_storage_status', lambda force=False: {
+        'success': False, 'message': '未配置Alist连接信息', 'status': '异常', 'storages': [], 'instances': []
+    })
+    response = logged_in.get('/api/storage_status')
+    assert 'X-Snapshot-Age' not in response.headers and 'X-Snapshot-Cached' not in response.headers
+    body = json.loads(response.data)
+    assert 'snapshot_age' not in body and body['message'] == '未配置Alist连接信息'
+
+def _monitor(client, **data):
+    return client.post('/api/monitor_status', json=data)
+
+def test_monitor_start_and_stop_compare_against_client_version(logged_in):
+    version = logged_in.get('/api/monitor_status').get_json()['version']
+    started = _monitor(logged_in, is_monitoring=True, interval=60, start_time='2026-01-01T00:00:00Z', version=version)
+    assert started.status_code == 200 and started.get_json()['status']['version'] == version + 1
+    # 另一个页面仍持有旧的 version：启动和停止都不会覆盖
+    stale = _monitor(logged_in, is_monitoring=False, version=version)
+    assert stale.status_code == 409 and stale.get_json()['status']['is_monitoring'] is True
+    stale = _monitor(logged_in, is_monitoring=True, interval=30, start_time='2026-01-01T00:00:00Z', version=version)
+    assert stale.status_code == 409
+    stopped = _monitor(logged_in, is_monitoring=False, version=version + 1)
+    assert stopped.status_code == 200
+    status = logged_in.get('/api/monitor_status').get_json()
+    assert status['is_monitoring'] is False and status['version'] == version + 2
+
+def test_monitor_status_without_version_uses_current_state(logged_in):
+    assert _monitor(logged_in, is_monitoring=False).status_code == 200
+    assert _monitor(logged_in, is_monitoring=False, version='1').status_code == 400
+
+def test_check_storage_wraps_result_in_data(logged_in, monkeypatch):
+    monkeypatch.setattr(api, 'get_storage_status', lambda force=False: _result(2, '2026-01-01T00:00:00+00:00', cached=False))
+    monkeypatch.setattr(api, 'record_check', lambda result: None)
+    body = logged_in.post('/api/check_storage', json={}).get_json()
+    assert body['success'] is True and body['message'] == '检查完成'
+    assert body['data']['version'] == 2 and body['data']['cached'] is False and body['data']['storages'] == []
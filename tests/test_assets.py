@@ -0,0 +1,25 @@
+# tests/test_assets.py
+from app import assets
+
+def _get(client, path, encoding, etag=None):
+    headers = {'Accept-Encoding': encoding}
+    if etag:
+        headers['If-None-Match'] = etag
+    return client.get(path, headers=headers)
+
+def test_each_content_encoding_has_its_own_strong_etag(client):
+    asset = assets.build_manifest()['js/index.js']
+    assert 'gzip' in asset.encoded
+    plain = _get(client, '/static/js/index.js', 'identity')
+    gzipped = _get(client, '/static/js/index.js', 'gzip')
+    assert gzipped.headers['Content-Encoding'] == 'gzip' and 'Content-Encoding' not in plain.headers
+    assert plain.headers['ETag'] == f'"{asset.etag}"'
+    assert gzipped.headers['ETag'] == f'"{asset.etag}-gzip"'
+    assert not gzipped.headers['ETag'].startswith('W/')
+
+def test_any_encoding_variant_revalidates(client):
+    asset = assets.build_manifest()['js/index.js']
+    response = _get(client, '/static/js/index.js', 'gzip', etag=f'"{asset.etag}"')
+    assert response.status_code == 304 and response.headers['ETag'] == f'"{asset.etag}-gzip"'
+    assert _get(client, '/static/js/index.js', 'identity', etag=f'"{asset.etag}-gzip"').status_code == 304
+    assert _get(client, '/static/js/index.js', 'gzip', etag='"other"').status_code == 200
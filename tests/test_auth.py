@@ -0,0 +1,50 @@
+# tests/test_auth.py
+import time
+from app import auth
+
+def test_issued_token_verifies():
+    token, info = auth.issue_token('ci', auth.SCOPE_READ)
+    claims = auth.verify_token(token)
+    assert claims['jti'] == info['jti']
+    assert claims['scope'] == auth.SCOPE_READ
+
+def test_tampered_token_is_rejected():
+    token, _ = auth.issue_token('ci', auth.SCOPE_READ)
+    prefix, payload, signature = token.split('.')
+    tampered = signature[:-1] + ('B' if signature.endswith('A') else 'A')
+    assert auth.verify_token(f"{prefix}.{payload}.{tampered}") is None
+    forged = auth._b64encode(b'{"jti":"x","scope":"control","exp":9999999999}')
+    assert auth.verify_token(f"{prefix}.{forged}.{signature}") is None
+
+def test_malformed_tokens_are_rejected():
+    for token in ('', 'am1', 'am1.abc', 'xx1.abc.def', 'am1.abc.éé', 'am1.éé.abc', 'am1.a.b.c'):
+        assert auth.verify_token(token) is None
+
+def test_signed_non_object_payload_is_rejected():
+    payload = auth._b64encode(b'[1, 2]')
+    assert auth.verify_token(f"am1.{payload}.{auth._sign(payload)}") is None
+
+def test_expired_token_is_rejected():
+    token, _ = auth.issue_token('ci', auth.SCOPE_READ, ttl=0.01)
+    time.sleep(0.05)
+    assert auth.verify_token(token) is None
+
+def test_revoked_token_is_rejected():
+    token, info = auth.issue_token('ci', auth.SCOPE_CONTROL)
+    assert auth.revoke_token(info['jti'])
+    assert auth.verify_token(token) is None
+    assert not auth.revoke_token(info['jti'])
+
+def test_scope_allows():
+    assert auth.scope_allows(auth.SCOPE_CONTROL, auth.SCOPE_READ)
+    assert not auth.scope_allows(auth.SCOPE_READ, auth.SCOPE_CONTROL)
+
+def test_non_ascii_bearer_token_returns_401(client):
+    response = client.get('/api/monitor_status', headers={'Authorization': 'Bearer am1.abc.éé'})
+    assert response.status_code == 401
+
+def test_read_token_cannot_control(client):
+    token, _ = auth.issue_token('ci', auth.SCOPE_READ)
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/api/monitor_status', headers=headers).status_code == 200
+    assert client.post('/api/check_storage', headers=headers, json={}).status_code == 403
@@ -0,0 +1,132 @@
+# tests/test_dispatch.py
+import time
+import pytest
+from app import db, dispatch, resilience
+
+CONFIG = {'NOTIFY_COALESCE_WINDOW': 0}
+
+@pytest.fixture(autouse=True)
+def clean_queue(monkeypatch):
+    # 不启动后台发送线程，由测试直接认领和完成消息
+    monkeypatch.setattr(dispatch, 'ensure_workers', lambda: None)
+    dispatch._ensure_schema()
+    resilience.circuit_state('init')
+    conn = db.get_connection()
+    for table in ('notification_deliveries', 'notification_rate_limits', 'circuit_breakers'):
+        conn.execute(f'DELETE FROM {table}')
+
+def _payload(title='t'):
+    return {'title': title, 'details': 'd', 'picurl': None, 'template': 'test'}
+
+def test_claim_coalesces_pending_messages_of_one_channel():
+    first = dispatch.enqueue('tg', 'test', _payload('a'))
+    second = dispatch.enqueue('tg', 'test', _payload('b'))
+    rows, wait = dispatch._claim_batch(CONFIG)
+    assert [r['id'] for r in rows] == [first, second]
+    assert wait == 0
+    assert all(r['attempts'] == 1 for r in rows)
+    assert dispatch.get_delivery(first)['status'] == dispatch.STATUS_SENDING
+
+def test_channel_with_batch_in_flight_is_not_claimed_again():
+    dispatch.enqueue('tg', 'test', _payload())
+    dispatch._claim_batch(CONFIG)
+    dispatch.enqueue('tg', 'test', _payload())
+    other = dispatch.enqueue('wecom', 'test', _payload())
+    rows, _ = dispatch._claim_batch(CONFIG)
+    assert [r['id'] for r in rows] == [other]
+    assert dispatch._claim_batch(CONFIG)[0] == []
+
+def test_idle_queue_does_not_take_the_write_lock(monkeypatch):
+    def fail():
+        raise AssertionError('空闲时不应开启写事务')
+    monkeypatch.setattr(dispatch.db, 'transaction', fail)
+    assert dispatch._claim_batch(CONFIG) == ([], dispatch.IDLE_POLL_INTERVAL)
+
+def test_coalesce_window_delays_claim_without_write_lock(monkeypatch):
+    dispatch.enqueue('tg', 'test', _payload())
+    monkeypatch.setattr(dispatch.db, 'transaction', lambda: pytest.fail('消息尚未到期时不应开启写事务'))
+    rows, wait = dispatch._claim_batch({'NOTIFY_COALESCE_WINDOW': 1})
+    assert rows == [] and 0 < wait <= 1
+
+def test_successful_batch_marks_merged_messages_coalesced():
+    first = dispatch.enqueue('tg', 'test', _payload())
+    second = dispatch.enqueue('tg', 'test', _payload())
+    rows, _ = dispatch._claim_batch(CONFIG)
+    dispatch._finish_batch(rows, True, 'ok')
+    assert dispatch.get_delivery(first)['status'] == dispatch.STATUS_SENT
+    merged = dispatch.get_delivery(second)
+    assert merged['status'] == dispatch.STATUS_COALESCED and merged['merged_into'] == first
+    assert merged['result'] == {'success': True, 'message': 'ok', 'coalesced': 2}
+
+def test_rate_limit_defers_next_batch():
+    config = dict(CONFIG, NOTIFY_RATE_LIMITS={'tg': {'per_minute': 60, 'burst': 1}})
+    dispatch.enqueue('tg', 'test', _payload())
+    rows, _ = dispatch._claim_batch(config)
+    dispatch._finish_batch(rows, True, 'ok')
+    dispatch.enqueue('tg', 'test', _payload())
+    rows, wait = dispatch._claim_batch(config)
+    assert rows == [] and 0 < wait <= 1
+
+def test_open_circuit_keeps_messages_queued():
+    delivery_id = dispatch.enqueue('tg', 'test', _payload())
+    for _ in range(dispatch.DEFAULT_BREAKER_THRESHOLD):
+        dispatch._record_circuit('tg', False, 'down', CONFIG)
+    assert dispatch._claim_batch(CONFIG)[0] == []
+    dispatch._record_circuit('tg', True, 'ok', CONFIG)
+    assert [r['id'] for r in dispatch._claim_batch(CONFIG)[0]] == [delivery_id]
+
+def test_stale_sending_messages_are_recovered():
+    delivery_id = dispatch.enqueue('tg', 'test', _payload())
+    dispatch._claim_batch(CONFIG)
+    db.get_connection().execute(
+        'UPDATE notification_deliveries SET updated_at = ? WHERE id = ?',
+        (time.time() - dispatch.STALE_SENDING_TIMEOUT - 1, delivery_id)
+    )
+    rows, _ = dispatch._claim_batch(CONFIG)
+    assert [r['id'] for r in rows] == [delivery_id] and rows[0]['attempts'] == 2
+
+def test_coalesce_payloads_uses_summary_title_for_mixed_types():
+    payload = dispatch.coalesce_payloads(['anomaly', 'recovery'], [_payload('异常'), _payload('恢复')])
+    assert payload['title'] == '📣 2 条监控通知'
+    assert '异常' in payload['details'] and '恢复' in payload['details']
+    assert dispatch.coalesce_payloads(['test'], [_payload('x')])['title'] == 'x'
+
+def test_failed_batch_counts_attempts_per_message():
+    retried = dispatch.enqueue('tg', 'test', _payload('old'))
+    db.get_connection().execute(
+        'UPDATE notification_deliveries SET attempts = ? WHERE id = ?', (dispatch.MAX_ATTEMPTS - 1, retried)
+    )
+    fresh = dispatch.enqueue('tg', 'test', _payload('new'))
+    rows, _ = dispatch._claim_batch(CONFIG)
+    assert {r['id']: r['attempts'] for r in rows} == {retried: dispatch.MAX_ATTEMPTS, fresh: 1}
+    dispatch._finish_batch(rows, False, 'down')
+    assert dispatch.get_delivery(retried)['status'] == dispatch.STATUS_FAILED
+    pending = dispatch.get_delivery(fresh)
+    assert pending['status'] == dispatch.STATUS_PENDING and pending['attempts'] == 1
+
+def test_failed_message_is_retried_with_backoff_until_max_attempts():
+    delivery_id = dispatch.enqueue('tg', 'test', _payload())
+    conn = db.get_connection()
+    for attempt in range(1, dispatch.MAX_ATTEMPTS + 1):
+        conn.execute('UPDATE notification_deliveries SET next_attempt_at = 0 WHERE id = ?', (delivery_id,))
+        rows, _ = dispatch._claim_batch(CONFIG)
+        assert rows[0]['attempts'] == attempt
+        dispatch._finish_batch(rows, False, 'down')
+        if attempt < dispatch.MAX_ATTEMPTS:
+            row = conn.execute('SELECT next_attempt_at FROM notification_deliveries WHERE id = ?', (delivery_id,)).fetchone()
+            assert row['next_attempt_at'] > time.time()
+            assert dispatch._claim_batch(CONFIG)[0] == []
+    assert dispatch.get_delivery(delivery_id)['status'] == dispatch.STATUS_FAILED
+
+def test_channel_results_follow_each_message(monkeypatch):
+    results = []
+    monkeypatch.setattr(dispatch.notifications, 'record_channel_result',
+                        lambda record_id, channel, status, message=None: results.append((record_id, status)))
+    first = dispatch.enqueue('tg', 'test', _payload(), record_id=1)
+    db.get_connection().execute(
+        'UPDATE notification_deliveries SET attempts = ? WHERE id = ?', (dispatch.MAX_ATTEMPTS - 1, first)
+    )
+    dispatch.enqueue('tg', 'test', _payload(), record_id=2)
+    results.clear()
+    dispatch._finish_batch(dispatch._claim_batch(CONFIG)[0], False, 'down')
+    assert results == [(1, dispatch.STATUS_FAILED), (2, dispatch.STATUS_PENDING)]
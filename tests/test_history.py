@@ -0,0 +1,69 @@
+# tests/test_history.py
+import pytest
+from app import db, history
+from app.alerts import instance_key
+
+DAY, HOUR = history.RESOLUTION_DAY, history.RESOLUTION_HOUR
+D = 19676 * DAY          # 整天的起点
+KEY = instance_key('default')
+
+@pytest.fixture(autouse=True)
+def clean_history(monkeypatch):
+    # 测试使用固定的历史时间，不运行按当前时间清理的后台任务
+    monkeypatch.setattr(history, '_maybe_schedule_prune', lambda: None)
+    conn = history._conn()
+    for table in ('history_storages', 'check_points', 'check_rollups', 'status_changes'):
+        conn.execute(f'DELETE FROM {table}')
+
+def _check(ts, ok, latency=10.0):
+    history.record_check({'instances': [{'name': 'default', 'success': ok, 'elapsed_ms': latency}], 'storages': []}, ts=ts)
+
+def test_rollup_ranges_pick_resolution_by_length():
+    start = D + 5 * HOUR + 1800
+    assert history._rollup_ranges(start, start + DAY) == [(history.RESOLUTION_MINUTE, start, start + DAY)]
+    assert history._rollup_ranges(start, start + 5 * DAY) == [(HOUR, D + 5 * HOUR, start + 5 * DAY)]
+    assert history._rollup_ranges(start, start + 10 * DAY) == [
+        (HOUR, D + 5 * HOUR, D + DAY), (DAY, D + DAY, D + 10 * DAY), (HOUR, D + 10 * DAY, start + 10 * DAY)
+    ]
+
+def test_rollup_ranges_skip_empty_hour_part_for_aligned_start():
+    ranges = history._rollup_ranges(D, D + 10 * DAY + HOUR)
+    assert ranges[0] == (HOUR, D, D) and ranges[1] == (DAY, D, D + 10 * DAY)
+
+def test_uptime_over_ten_days_counts_each_check_once():
+    start = D + 5 * HOUR + 1800
+    end = start + 10 * DAY
+    _check(start - 2 * HOUR, False)          # 范围之前的小时，不计入
+    _check(start, True, latency=20.0)       # 范围起点
+    _check(D + DAY, False)                  # 小时汇总与天汇总的分界
+    _check(D + 5 * DAY + 12 * HOUR, True)   # 中间的整天
+    _check(D + 10 * DAY, True)              # 天汇总与末尾小时汇总的分界
+    _check(end - 1, True, latency=50.0)     # 范围终点之前
+    _check(end + HOUR, False)               # 范围之后，不计入
+    uptime, = history.get_uptime(KEY, start, end)
+    assert uptime == {'storage': KEY, 'uptime_pct': 80.0, 'checks': 5, 'avg_latency_ms': 20.0, 'max_latency_ms': 50.0}
+    assert history.get_uptime(None, start, end) == [uptime]
+
+def test_uptime_over_one_day_uses_minute_buckets():
+    start = D + 90
+    _check(D + 30, False)         # 起点之前的分钟，不计入
+    _check(D + 70, False)         # 与起点同一分钟，按分钟汇总粒度计入
+    _check(D + 120, True)
+    _check(start + DAY - 1, True)
+    _check(start + DAY + 60, False)
+    uptime, = history.get_uptime(KEY, start, start + DAY)
+    assert uptime['checks'] == 3 and uptime['uptime_pct'] == round(200 / 3, 3)
+
+def test_unknown_storage_has_no_uptime():
+    assert history.get_uptime('missing', D, D + DAY) == []
+
+def test_timeline_and_mttr_follow_status_changes():
+    for ts, ok in ((D, True), (D + 60, False), (D + 120, False), (D + 300, True), (D + 400, False)):
+        _check(ts, ok)
+    timeline = history.get_timeline(KEY, D + 30, D + 500)
+    assert [(s['ok'], s['start'], s['end']) for s in timeline] == [
+        (True, D + 30, D + 60), (False, D + 60, D + 300), (True, D + 300, D + 400), (False, D + 400, D + 500)
+    ]
+    assert history.get_mttr(KEY, D + 30, D + 500) == {
+        'incidents': 2, 'resolved': 1, 'mttr_seconds': 240.0, 'ongoing_since': D + 400
+    }
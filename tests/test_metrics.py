@@ -0,0 +1,28 @@
+# tests/test_metrics.py
+import pytest
+from prometheus_client import REGISTRY
+from app import db, metrics
+from app.storages import StorageRecord
+
+@pytest.fixture(autouse=True)
+def clean_statuses():
+    db.ensure_schema('metric_storage_statuses', metrics._STATUS_SCHEMA)
+    db.get_connection().execute('DELETE FROM metric_storage_statuses')
+    metrics.STORAGES_BY_STATUS.clear()
+
+def _storages(*statuses):
+    return [StorageRecord(f'/s{i}', 'default', 'Local', status) for i, status in enumerate(statuses)]
+
+def _count(status):
+    return REGISTRY.get_sample_value('alist_monitor_storages', {'status': status})
+
+def test_storage_counts_by_status():
+    metrics.observe_storage_statuses(_storages('work', 'work', 'error'))
+    assert _count('work') == 2 and _count('error') == 1
+
+def test_status_seen_by_another_worker_is_reset_to_zero():
+    metrics.observe_storage_statuses(_storages('work', 'error'))
+    # 模拟另一个 worker：进程内的指标从未见过 error
+    metrics.STORAGES_BY_STATUS.clear()
+    metrics.observe_storage_statuses(_storages('work'))
+    assert _count('work') == 1 and _count('error') == 0
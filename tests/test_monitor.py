@@ -0,0 +1,28 @@
+# tests/test_monitor.py
+from app import monitor
+
+class _FakeResponse:
+    status_code = 200
+    def raise_for_status(self):
+        pass
+    def json(self):
+        return {'ok': True, 'result': {}}
+
+class _FakeSession:
+    def __init__(self):
+        self.calls = []
+    def post(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        return _FakeResponse()
+
+def test_recovery_template_has_its_own_image_or_none():
+    templates = monitor.MESSAGE_TEMPLATES
+    assert templates['recovery']['picurl'] != templates['test']['picurl']
+
+def test_telegram_without_image_sends_text_message(monkeypatch):
+    session = _FakeSession()
+    monkeypatch.setattr(monitor, '_get_channel_session', lambda channel: session)
+    assert monitor._send_tg_notification('1:abc', 42, '恢复', '详情', None, api_base='http://tg')
+    (url, kwargs), = session.calls
+    assert url == 'http://tg/bot1:abc/sendMessage'
+    assert kwargs['json']['text'].startswith('<b>恢复</b>') and 'photo' not in kwargs['json']
@@ -0,0 +1,39 @@
+# tests/test_notifications.py
+import json
+import pytest
+from app import db, notifications
+
+@pytest.fixture
+def legacy_file(tmp_path, monkeypatch):
+    path = tmp_path / 'notifications.json'
+    monkeypatch.setattr(notifications, 'NOTIFICATIONS_PATH', str(path))
+    notifications._ensure_schema()
+    db.get_connection().execute('DELETE FROM notifications')
+    return path
+
+def _migrate():
+    with db.transaction() as conn:
+        notifications._migrate_json_file(conn)
+    rows = db.get_connection().execute('SELECT type, data FROM notifications ORDER BY id').fetchall()
+    return [(row['type'], json.loads(row['data'])) for row in rows]
+
+def test_legacy_records_are_imported_oldest_first(legacy_file):
+    legacy_file.write_text(json.dumps([
+        {'type': 'recovery', 'timestamp': '2024-01-02T00:00:00', 'title': 'new'},
+        {'type': 'anomaly', 'timestamp': '2024-01-01T00:00:00', 'title': 'old'},
+    ]), encoding='utf-8')
+    assert [r[1]['title'] for r in _migrate()] == ['old', 'new']
+    assert not legacy_file.exists()
+    assert legacy_file.with_name('notifications.json.migrated').exists()
+
+def test_malformed_records_are_skipped(legacy_file):
+    legacy_file.write_text(json.dumps(['oops', None, {'type': 'anomaly', 'title': 'ok'}, 3]), encoding='utf-8')
+    assert _migrate() == [('anomaly', {'type': 'anomaly', 'title': 'ok'})]
+    assert legacy_file.with_name('notifications.json.migrated').exists()
+
+@pytest.mark.parametrize('content', ['{not json', '{"type": "anomaly"}'])
+def test_unparsable_file_is_kept_as_corrupt(legacy_file, content):
+    legacy_file.write_text(content, encoding='utf-8')
+    assert _migrate() == []
+    assert legacy_file.with_name('notifications.json.corrupt').read_text(encoding='utf-8') == content
+    assert not legacy_file.with_name('notifications.json.migrated').exists()
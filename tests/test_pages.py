@@ -0,0 +1,19 @@
+# tests/test_pages.py
+from app import auth, pages
+
+def test_metrics_requires_authentication(client):
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer éé'}).status_code == 401
+
+def test_metrics_accepts_read_token_and_session(client):
+    token, _ = auth.issue_token('prometheus', auth.SCOPE_READ)
+    assert client.get('/metrics', headers={'Authorization': f'Bearer {token}'}).status_code == 200
+    with client.session_transaction() as sess:
+        sess['logged_in'] = True
+    assert client.get('/metrics').status_code == 200
+
+def test_metrics_accepts_configured_metrics_token(client, monkeypatch):
+    monkeypatch.setattr(pages, 'load_config', lambda: {'METRICS_TOKEN': 'scrape-secret'})
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-secreT'}).status_code == 401
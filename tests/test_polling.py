@@ -0,0 +1,63 @@
+# tests/test_polling.py
+import pytest
+from app import db, polling
+from app.storages import StorageRecord
+
+ADAPTIVE = {'ADAPTIVE_POLLING': True, 'ADAPTIVE_MIN_INTERVAL': 30, 'ADAPTIVE_BACKOFF_FACTOR': 2,
+            'ADAPTIVE_MAX_INTERVAL': 500, 'POLL_JITTER': 0}
+
+@pytest.fixture(autouse=True)
+def clean_schedule():
+    polling._ensure_schema()
+    conn = db.get_connection()
+    for table in ('poll_schedule', 'alist_request_budget'):
+        conn.execute(f'DELETE FROM {table}')
+
+def _result(ok=True, storages=()):
+    return {'success': True, 'status': '正常' if ok else '异常', 'instances': [{'name': 'default', 'success': True}],
+            'storages': list(storages)}
+
+def _status(version=1, interval=100):
+    return {'is_monitoring': True, 'interval': interval, 'version': version}
+
+def test_fixed_interval_without_adaptive_polling():
+    assert polling.compute_interval(100, _result(False), {}) == (100.0, polling.REASON_FIXED)
+
+def test_interval_grows_while_stable_and_resets_on_degradation():
+    delays = [polling.plan_next_check(_status(), _result(), ADAPTIVE) for _ in range(4)]
+    assert delays == [100.0, 200.0, 400.0, 500.0]
+    assert polling.plan_next_check(_status(), _result(False), ADAPTIVE) == 30.0
+    assert polling.get_schedule_info(_status())['reason'] == polling.REASON_DEGRADED
+    # 恢复后先回到基础间隔，再逐次放大
+    assert [polling.plan_next_check(_status(), _result(), ADAPTIVE) for _ in range(2)] == [100.0, 200.0]
+
+def test_restarted_monitor_starts_from_base_interval():
+    polling.plan_next_check(_status(), _result(), ADAPTIVE)
+    polling.plan_next_check(_status(), _result(), ADAPTIVE)
+    assert polling.plan_next_check(_status(version=2), _result(), ADAPTIVE) == 100.0
+
+def test_min_interval_never_exceeds_base():
+    assert polling.compute_interval(20, _result(False), ADAPTIVE) == (20.0, polling.REASON_DEGRADED)
+
+def test_storage_and_driver_overrides_cap_interval():
+    storages = [StorageRecord('/a', 'default', 'Local', 'work'), StorageRecord('/b', 'default', 'S3', 'work')]
+    config = dict(ADAPTIVE, STORAGE_INTERVALS={'/a': 80}, DRIVER_INTERVALS={'S3': 60, 'Local': 10})
+    assert polling.compute_interval(100, _result(storages=storages), config) == (60.0, polling.REASON_OVERRIDE)
+
+def test_request_budget_clamps_interval_from_below():
+    config = dict(ADAPTIVE, ALIST_REQUEST_BUDGET=2)
+    assert polling.compute_interval(100, _result(False), config, request_count=3) == (90.0, polling.REASON_BUDGET)
+    assert polling.compute_interval(100, _result(), config, request_count=1) == (100.0, polling.REASON_STABLE)
+
+def test_jitter_stays_within_bounds():
+    for _ in range(50):
+        assert 90 <= polling.apply_jitter(100, {'POLL_JITTER': 0.1}) <= 110
+
+def test_budget_wait_after_requests_are_spent():
+    config = {'ALIST_REQUEST_BUDGET': 6}
+    assert polling.budget_wait(2, config) == 0
+    polling.record_requests(5, config)
+    assert polling.budget_wait(2, config) == pytest.approx(10.0, abs=0.1)
+    # 一次检查需要的请求数超过整个预算时，只等待令牌桶装满
+    assert polling.budget_wait(20, config) == pytest.approx(50.0, abs=0.1)
+    assert polling.budget_wait(2, {}) == 0
@@ -0,0 +1,56 @@
+# tests/test_resilience.py
+import time
+import pytest
+from app import db, resilience
+
+@pytest.fixture(autouse=True)
+def clean_breakers():
+    resilience.circuit_state('init')
+    db.get_connection().execute('DELETE FROM circuit_breakers')
+
+def test_circuit_opens_after_threshold_and_closes_on_success():
+    for _ in range(2):
+        resilience.record_result('alist:a', False, threshold=3, cooldown=60, error='boom')
+    assert not resilience.circuit_state('alist:a')['open']
+    resilience.record_result('alist:a', False, threshold=3, cooldown=60, error='boom')
+    state = resilience.circuit_state('alist:a')
+    assert state['open'] and state['failures'] == 3 and state['last_error'] == 'boom'
+    assert state['retry_at'] > time.time()
+    resilience.record_result('alist:a', True, threshold=3, cooldown=60)
+    assert resilience.circuit_state('alist:a') == {'open': False, 'failures': 0, 'retry_at': None, 'last_error': None}
+
+def test_circuit_allows_probe_after_cooldown():
+    resilience.record_result('alist:a', False, threshold=1, cooldown=0.05)
+    assert resilience.circuit_state('alist:a')['open']
+    time.sleep(0.1)
+    assert not resilience.circuit_state('alist:a')['open']
+
+def test_open_circuits_filters_by_prefix():
+    resilience.record_result('notify:tg', False, threshold=1, cooldown=60)
+    resilience.record_result('notify:wecom', False, threshold=2, cooldown=60)
+    resilience.record_result('alist:a', False, threshold=1, cooldown=60)
+    assert set(resilience.open_circuits('notify:')) == {'notify:tg'}
+
+def test_remaining_raises_after_deadline():
+    assert resilience.remaining(time.monotonic() + 10) > 9
+    with pytest.raises(resilience.DeadlineExceeded):
+        resilience.remaining(time.monotonic() - 1)
+
+def test_retry_budget_is_shared_between_instances():
+    # 两个对象代表两个进程中的同名预算，共用数据库中的同一个桶
+    first = resilience.RetryBudget('test-shared', ratio=0.5, min_per_sec=0, max_tokens=2)
+    second = resilience.RetryBudget('test-shared', ratio=0.5, min_per_sec=0, max_tokens=2)
+    assert first.try_retry()
+    assert second.try_retry()
+    assert not first.try_retry()
+    assert not second.try_retry()
+
+def test_retry_budget_refills_from_requests():
+    budget = resilience.RetryBudget('test-refill', ratio=0.5, min_per_sec=0, max_tokens=1)
+    assert budget.try_retry()
+    assert not budget.try_retry()
+    other = resilience.RetryBudget('test-refill', ratio=0.5, min_per_sec=0, max_tokens=1)
+    other.record_request()
+    other.record_request()   # 满一个令牌时写入数据库
+    assert budget.try_retry()
+    assert budget.tokens == 0
@@ -0,0 +1,140 @@
+# tests/test_snapshot.py
+import json
+import itertools
+import time
+import threading
+import pytest
+from app import db, snapshot, storages
+from app.storages import StorageRecord
+
+_fetched_at = itertools.count(1)
+
+@pytest.fixture(autouse=True)
+def clean_snapshot():
+    db.ensure_schema('storage_snapshot', snapshot._SCHEMA)
+    conn = db.get_connection()
+    for table in ('storage_snapshot', 'storage_snapshot_version', 'storage_removals'):
+        conn.execute(f'DELETE FROM {table}')
+    snapshot._parsed_cache = (None, None)
+
+def _write(checked_at, *records):
+    data = {'success': True, 'message': 'ok', 'last_checked': checked_at,
+            'storages': [StorageRecord(name, 'default', 'Local', status) for name, status in records]}
+    snapshot._write_snapshot('fp', float(next(_fetched_at)), data)
+    return data
+
+def _names(records):
+    return [s.name for s in records]
+
+def test_first_snapshot_has_no_changes_since_its_version():
+    data = _write('t1', ('/a', 'work'), ('/b', 'work'))
+    assert data['version'] == 1
+    assert snapshot.changes_since(data, 1) == ([], [])
+
+def test_changes_since_reports_changed_added_and_removed_storages():
+    first = _write('t1', ('/a', 'work'), ('/b', 'work'), ('/c', 'work'))
+    second = _write('t2', ('/a', 'work'), ('/b', 'error'), ('/d', 'work'))
+    assert second['version'] == first['version'] + 1
+    changed, removed = snapshot.changes_since(second, first['version'])
+    assert _names(changed) == ['/b', '/d']
+    assert removed == [('default', '/c')]
+    assert snapshot.changes_since(second, second['version']) == ([], [])
+
+def test_unchanged_snapshot_keeps_version_and_change_times():
+    first = _write('t1', ('/a', 'work'))
+    second = _write('t2', ('/a', 'work'))
+    assert second['version'] == first['version']
+    assert storages.last_changed(second, second['storages'][0]) == 't1'
+
+def test_storage_removed_and_added_again_is_only_changed():
+    first = _write('t1', ('/a', 'work'), ('/b', 'work'))
+    _write('t2', ('/a', 'work'))
+    third = _write('t3', ('/a', 'work'), ('/b', 'work'))
+    changed, removed = snapshot.changes_since(third, first['version'])
+    assert _names(changed) == ['/b'] and removed == []
+
+def test_changes_since_needs_full_refresh_for_unknown_versions(monkeypatch):
+    data = _write('t1', ('/a', 'work'))
+    assert snapshot.changes_since(data, data['version'] + 1) is None
+    assert snapshot.changes_since(dict(data, version=None), 0) is None
+    monkeypatch.setattr(snapshot, 'MAX_DELTA_VERSIONS', 2)
+    for i, status in enumerate(['error', 'work', 'error', 'work']):
+        data = _write(f't{i + 2}', ('/a', status))
+    assert snapshot.changes_since(data, 1) is None
+    assert snapshot.changes_since(data, data['version'] - 1) is not None
+
+def test_delta_to_json_lists_changed_and_removed_storages():
+    first = _write('t1', ('/a', 'work'), ('/b', 'work'))
+    second = _write('t2', ('/a', 'error'))
+    body = json.loads(storages.delta_to_json(second, first['version'], *snapshot.changes_since(second, first['version'])))
+    assert body['since'] == first['version'] and body['full'] is False and body['version'] == second['version']
+    assert body['removed'] == [{'instance': 'default', 'name': '/b'}]
+    assert body['storages'] == [{'name': '/a', 'instance': 'default', 'driver': 'Local', 'status': 'error',
+                                 'last_changed': 't2'}]
+    assert 'change_times' not in body
+
+def test_result_to_json_includes_every_storage():
+    _write('t1', ('/a', 'work'), ('/b', 'work'))
+    data = _write('t2', ('/a', 'work'), ('/b', 'error'))
+    body = json.loads(storages.result_to_json(data))
+    assert [(s['name'], s['last_changed']) for s in body['storages']] == [('/a', 't1'), ('/b', 't2')]
+    assert body['last_checked'] == 't2'
+
+def _forced_callers(monkeypatch, before_fetch):
+    """两个线程同时强制刷新：第一个线程请求 Alist，第二个线程加入进行中的请求"""
+    calls, results = [], {}
+    fetching, release = threading.Event(), threading.Event()
+    acquire = snapshot._try_acquire_lease
+
+    def delayed_acquire():
+        before_fetch.wait()
+        return acquire()
+
+    def fetch():
+        calls.append(1)
+        fetching.set()
+        release.wait()
+        return {'success': True, 'last_checked': 't', 'storages': []}
+
+    monkeypatch.setattr(snapshot, '_try_acquire_lease', delayed_acquire)
+    def call(name):
+        results[name] = snapshot.get_snapshot(fetch, 'fp', force=True)
+    leader = threading.Thread(target=call, args=('leader',))
+    leader.start()
+    return leader, call, fetching, release, calls, results
+
+def test_forced_caller_joining_before_fetch_started_is_not_cached(monkeypatch):
+    before_fetch = threading.Event()
+    leader, call, fetching, release, calls, results = _forced_callers(monkeypatch, before_fetch)
+    waiter = threading.Thread(target=call, args=('waiter',))
+    waiter.start()
+    time.sleep(0.05)  # 第二个请求在 Alist 请求开始之前到达
+    before_fetch.set()
+    fetching.wait(5)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    assert len(calls) == 1
+    assert results['leader'][2] is False and results['waiter'][2] is False
+
+def test_forced_caller_joining_running_fetch_is_cached(monkeypatch):
+    before_fetch = threading.Event()
+    before_fetch.set()
+    leader, call, fetching, release, calls, results = _forced_callers(monkeypatch, before_fetch)
+    fetching.wait(5)
+    time.sleep(0.01)
+    waiter = threading.Thread(target=call, args=('waiter',))
+    waiter.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    assert len(calls) == 1
+    assert results['leader'][2] is False and results['waiter'][2] is True
+
+def test_wrap_result_json_nests_the_full_result():
+    data = _write('t1', ('/a', 'work'))
+    body = json.loads(storages.wrap_result_json({'success': True, 'message': '检查完成'}, 'data', data))
+    assert body['success'] is True and body['message'] == '检查完成'
+    assert body['data'] == json.loads(storages.result_to_json(data))
+    assert json.loads(storages.wrap_result_json({}, 'data', data)) == {'data': body['data']}
@@ -0,0 +1,69 @@
+# tests/test_state.py
+import pytest
+from app import db, state
+
+@pytest.fixture(autouse=True)
+def reset_state(monkeypatch):
+    # 不启动后台写入线程，由测试直接调用 flush()
+    monkeypatch.setattr(state, '_ensure_flusher', lambda: None)
+    state._pending.clear()
+    state.save_monitor_status(state.DEFAULT_STATUS)
+    yield
+    state._pending.clear()
+
+def _stored_count():
+    return db.get_connection().execute('SELECT check_count FROM monitor_state WHERE id = 1').fetchone()[0]
+
+def test_save_replaces_status_and_bumps_version():
+    before = state.load_monitor_status()['version']
+    state.save_monitor_status({'is_monitoring': True, 'start_time': 't', 'interval': '60', 'check_count': 3})
+    status = state.load_monitor_status()
+    assert status == {'is_monitoring': True, 'start_time': 't', 'check_count': 3, 'interval': 60,
+                      'version': before + 1}
+
+def test_compare_and_set_applies_only_when_expected_matches():
+    version = state.load_monitor_status()['version']
+    assert state.compare_and_set_monitor_status({'is_monitoring': False, 'interval': None, 'version': version},
+                                                {'is_monitoring': True, 'interval': 30})
+    status = state.load_monitor_status()
+    assert status['is_monitoring'] and status['interval'] == 30 and status['version'] == version + 1
+    # 读取之后已被修改 (version 过期) 或字段不一致时不做修改
+    assert not state.compare_and_set_monitor_status({'version': version}, {'interval': 60})
+    assert not state.compare_and_set_monitor_status({'is_monitoring': False}, {'interval': 60})
+    assert state.load_monitor_status()['interval'] == 30
+
+def test_compare_and_set_rejects_unknown_fields():
+    with pytest.raises(ValueError):
+        state.compare_and_set_monitor_status({'bogus': 1}, {'interval': 60})
+
+def test_increment_is_written_behind_and_merged_with_other_writers():
+    version = state.load_monitor_status()['version']
+    assert state.increment_check_count(version) == 1
+    assert state.increment_check_count(version, 2) == 3
+    assert state.load_monitor_status()['check_count'] == 3
+    assert _stored_count() == 0
+    # 其它进程在此期间写入的累加不会被覆盖
+    db.get_connection().execute('UPDATE monitor_state SET check_count = check_count + 5 WHERE id = 1')
+    state.flush()
+    assert _stored_count() == 8 and state.load_monitor_status()['check_count'] == 8
+
+def test_increment_after_reset_is_discarded():
+    version = state.load_monitor_status()['version']
+    state.increment_check_count(version, 4)
+    state.save_monitor_status(state.DEFAULT_STATUS)
+    assert state.increment_check_count(version) is None
+    state.flush()
+    assert state.load_monitor_status()['check_count'] == 0
+
+def test_failed_flush_keeps_pending_increments(monkeypatch):
+    version = state.load_monitor_status()['version']
+    state.increment_check_count(version, 2)
+    def broken():
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(state.db, 'transaction', broken)
+    with pytest.raises(RuntimeError):
+        state.flush()
+    monkeypatch.undo()
+    monkeypatch.setattr(state, '_ensure_flusher', lambda: None)
+    state.flush()
+    assert _stored_count() == 2